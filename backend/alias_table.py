@@ -0,0 +1,59 @@
+import random
+from array import array
+from typing import Sequence
+
+
+class AliasTable:
+    '''
+    Weighted random choice among a fixed set of card types in O(1) per draw (Vose's alias method).
+    Each slot of the table holds a type, the chance of keeping it and the type to take otherwise,
+    so a draw is one random number: its integer part picks the slot, its fraction decides between the two.
+    Tables are immutable once built and shared by every pile drawing from the same weights.
+    '''
+    types: tuple[str, ...]
+    weights: tuple[float, ...]
+    index: dict[str, int] # type name to its position in types
+    prob: array # array('d'), the chance each slot keeps its own type
+    alias: array # array('H'), the type each slot falls back to
+
+    def __init__(self, types: Sequence[str], weights: Sequence[float] | None = None):
+        if not types:
+            raise ValueError("an alias table needs at least one type")
+        if weights is None:
+            weights = [1] * len(types)
+        if len(weights) != len(types) or any(w <= 0 for w in weights):
+            raise ValueError("an alias table needs a positive weight for every type")
+        self.types = tuple(types)
+        self.weights = tuple(weights)
+        self.index = {name: i for i, name in enumerate(self.types)}
+
+        n, total = len(types), sum(weights)
+        scaled = [w * n / total for w in weights]
+        self.prob = array('d', [1.0] * n)
+        self.alias = array('H', range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] += scaled[s] - 1
+            (small if scaled[l] < 1 else large).append(l)
+        # whatever is left is 1 up to rounding and keeps its own type
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def probability(self, name: str) -> float:
+        '''the chance of drawing name'''
+        return self.weights[self.index[name]] / sum(self.weights)
+
+    def sample(self, rng: random.Random, k: int) -> array:
+        '''k random type indices as an array('H'), the whole batch drawn at once'''
+        n, prob, alias, draw = len(self.types), self.prob, self.alias, rng.random
+        picks = array('H')
+        for _ in range(k):
+            u = draw() * n
+            i = int(u)
+            picks.append(i if u - i < prob[i] else alias[i])
+        return picks
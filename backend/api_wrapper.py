@@ -1,6 +1,6 @@
 from enum import Enum
 from typing import List, Optional, Dict, Any, Literal, Union
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 import socketio as sio_lib
 import asyncio
 
@@ -81,6 +81,25 @@ class PlayerInfo(BaseModel):
     num_items: int
     health: int
 
+class LegalActions(BaseModel):
+    actions: list[PlayerActionChoice] = [] # for ACTION
+    combat: list[PlayerCombatChoice] = [] # for COMBAT, against any of monsters
+    monsters: list[int] = [] # board indices
+    items: list[int] = [] # hand positions for ITEM_CHOICE
+    players: list[str] = [] # for PLAYER_CHOICE
+
+class ChoiceOdds(BaseModel):
+    success: float # chance of killing or sparing the monster, or of getting away from it
+    coins: float # expected coins gained
+    stars: float # expected stars captured
+    health: float # expected change of health, never positive
+
+class CombatOdds(BaseModel):
+    monster: int # index on the board
+    fight: ChoiceOdds # with every item in hand that targets monsters
+    spare: ChoiceOdds
+    flee: ChoiceOdds
+
 
 # Client Request Models (Client → Server)
 
@@ -110,6 +129,33 @@ class ItemChoiceRequest(BaseModel):
 class PlayerChoiceRequest(BaseModel):
     player: str
 
+class CompoundStep(BaseModel):
+    '''one request of a compound request: an action, a combat choice against target, a player, or the items selected for a fight'''
+    action: Optional[PlayerActionChoice] = None
+    combat: Optional[PlayerCombatChoice] = None
+    target: Optional[int] = None
+    items: Optional[list[int]] = None # hand positions, every other item is unselected
+    player: Optional[str] = None
+
+    @model_validator(mode='after')
+    def validate_one_request(self):
+        if sum(request is not None for request in (self.action, self.combat, self.items, self.player)) != 1:
+            raise ValueError('a step makes exactly one of action, combat, items or player')
+        if self.combat is not None and self.target is None:
+            raise ValueError('a combat step needs a target')
+        return self
+
+MAX_COMPOUND_STEPS = 16
+
+class CompoundRequest(BaseModel):
+    steps: list[CompoundStep] = Field(min_length=1, max_length=MAX_COMPOUND_STEPS)
+
+class OddsRequest(BaseModel):
+    monster: Optional[int] = None # index on the board, the selected monster by default
+
+class ResyncRequest(BaseModel):
+    sections: list[Literal["players", "board"]] = ["players", "board"]
+
 
 # Cosmetic Event Types
 
@@ -149,9 +195,138 @@ class Animation(BaseModel):
     source: Location
     destination:  Optional[Location]
 
+# Encoding
+
+def _encode(model: BaseModel | dict) -> dict:
+    """Returns the wire form of a model, dicts are taken to be encoded already (see the *_json status getters)"""
+    return model if isinstance(model, dict) else model.model_dump(mode='json')
+
+# Delta encoding
+
+def _keyed_delta(prev: list[dict], cur: list[dict], key: str) -> dict:
+    """
+    Diffs two lists of entities keyed by key.
+    Returns the changed fields of each new or changed entity, the removed keys,
+    and the new key order if it differs from the previous one.
+    """
+    prev_by_key = {entity[key]: entity for entity in prev}
+    changed = {}
+    for entity in cur:
+        old = prev_by_key.get(entity[key])
+        if old is None:
+            changed[entity[key]] = entity
+        elif old != entity:
+            changed[entity[key]] = {field: value for field, value in entity.items() if old.get(field) != value}
+
+    delta: dict[str, Any] = {}
+    if changed:
+        delta["changed"] = changed
+    cur_keys = [entity[key] for entity in cur]
+    removed = prev_by_key.keys() - set(cur_keys)
+    if removed:
+        delta["removed"] = list(removed)
+    if cur_keys != [entity[key] for entity in prev]:
+        delta["order"] = cur_keys
+    return delta
+
+def _players_delta(prev: list[dict], cur: list[dict]) -> dict:
+    return _keyed_delta(prev, cur, "name")
+
+def _board_delta(prev: dict, cur: dict) -> dict:
+    delta: dict[str, Any] = {}
+    fields = {field: value for field, value in cur.items() if field != "monsters" and prev.get(field) != value}
+    if fields:
+        delta["fields"] = fields
+    monsters = _keyed_delta(prev["monsters"], cur["monsters"], "id")
+    if monsters:
+        delta["monsters"] = monsters
+    return delta
+
+DELTA_SECTIONS = {
+    "players": _players_delta,
+    "board": _board_delta,
+}
+
+class GameNotFound(LookupError):
+    """Raised by requests for a game the server does not have (anymore), event handlers drop the request."""
+
 class FsfApi():
-    def __init__(self, server: sio_lib.AsyncServer):
+    """
+    Typed wrapper around the socket server.
+    State updates (players, turn, board, hand) are not emitted right away, they are collected per recipient
+    and flushed once per event loop tick as a single STATE_PATCH carrying an increasing state version.
+
+    Players and board sections are sent as {"seq", "base", "delta"} against the last section sent to the same
+    recipient, or as {"seq", "full"} the first time. A client whose seq does not match base sends a RESYNC request
+    and receives the full section again. With delta=False every update is sent full.
+    """
+    state_version: int
+    delta: bool
+    _pending_patches: dict[str, dict[str, Any]]
+    _flush_scheduled: bool
+    _sent_sections: dict[str, dict[str, tuple[int, Any]]] # recipient -> section -> (seq, last full payload)
+
+    def __init__(self, server: sio_lib.AsyncServer, delta: bool = True):
         self.server = server
+        self.state_version = 0
+        self.delta = delta
+        self._pending_patches = {}
+        self._flush_scheduled = False
+        self._sent_sections = {}
+
+    def _encode_section(self, to: str, section: str, payload: Any) -> Any | None:
+        """Wraps a players/board payload in its sequenced envelope, returns None when nothing changed."""
+        sent = self._sent_sections.setdefault(to, {})
+        if section not in sent:
+            sent[section] = (1, payload)
+            return {"seq": 1, "full": payload}
+
+        seq, prev = sent[section]
+        if not self.delta:
+            sent[section] = (seq + 1, payload)
+            return {"seq": seq + 1, "full": payload}
+        delta = DELTA_SECTIONS[section](prev, payload)
+        if not delta:
+            return None
+        sent[section] = (seq + 1, payload)
+        return {"seq": seq + 1, "base": seq, "delta": delta}
+
+    def _queue_patch(self, to: str, section: str, payload: Any):
+        """Queues a state section for a recipient, a later update to the same section replaces the earlier one."""
+        self._pending_patches.setdefault(to, {})[section] = payload
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush_patches)
+
+    def flush_patches(self):
+        """Emits one STATE_PATCH per recipient with every section queued since the last flush."""
+        pending, self._pending_patches = self._pending_patches, {}
+        self._flush_scheduled = False
+        for to, sections in pending.items():
+            for section in DELTA_SECTIONS.keys() & sections.keys():
+                encoded = self._encode_section(to, section, sections[section])
+                if encoded is None:
+                    del sections[section]
+                else:
+                    sections[section] = encoded
+            if not sections:
+                continue
+            self.state_version += 1
+            asyncio.create_task(self.server.emit("STATE_PATCH", {"version": self.state_version, **sections}, to=to))
+
+    def emit_resync(self, to: str, source: str, sections: list[str]):
+        """Emit the last players/board sections sent to source (usually the game room) in full, to a client that missed a delta."""
+        sent = self._sent_sections.get(source, {})
+        patch = {section: {"seq": sent[section][0], "full": sent[section][1]} for section in sections if section in sent}
+        if not patch:
+            return
+        self.state_version += 1
+        asyncio.create_task(self.server.emit("STATE_PATCH", {"version": self.state_version, **patch}, to=to))
+
+    def forget(self, to: str):
+        """Drops the sections sent and queued to a recipient that is gone, such as the room of a removed game."""
+        self._sent_sections.pop(to, None)
+        self._pending_patches.pop(to, None)
         
 
     def event_handler(self, request_model=None):
@@ -167,20 +342,23 @@ class FsfApi():
                         return
                 else:
                     request_data = data
-                return await handler_func(request_data, sid)
+                try:
+                    return await handler_func(request_data, sid)
+                except GameNotFound as e:
+                    print(f"Dropped {event_name} request, game {e} not found")
 
             wrapper.__name__ = event_name
             self.server.on(event_name, wrapper)
             return wrapper
         return decorator
 
-    def emit_init_response(self, to: str, game_name: str, game_owner: str, max_players: int, players: List[PlayerInfo], messages: List[Message], status: GameStatus, active_player: Optional[str] = None):
+    def emit_init_response(self, to: str, game_name: str, game_owner: str, max_players: int, players: List[PlayerInfo | dict], messages: List[Message], status: GameStatus, active_player: Optional[str] = None):
         """Emit INIT event to initialize game state for a joining player."""
         init_data = {
             "game_name": game_name,
             "game_owner": game_owner,
             "max_players": max_players,
-            "players": [player.model_dump() for player in players],
+            "players": [_encode(player) for player in players],
             "messages": [message.model_dump() for message in messages],
             "status": status,
             "active_player": active_player,
@@ -192,28 +370,36 @@ class FsfApi():
         """Emit START_GAME event to signal game start."""
         asyncio.create_task(self.server.emit("START_GAME", first_player, to=to))
 
-    def emit_players_event(self, to: str, players: List[PlayerInfo], include_self: bool = True):
-        """Emit PLAYERS event to broadcast updated player information."""
-        event_data = [player.model_dump(mode='json') for player in players]
-        asyncio.create_task(self.server.emit("PLAYERS", event_data, to=to, skip_sid=None))
+    def emit_players_event(self, to: str, players: List[PlayerInfo | dict], include_self: bool = True):
+        """Queue players section to broadcast updated player information."""
+        event_data = [_encode(player) for player in players]
+        self._queue_patch(to, "players", event_data)
 
     def emit_chat_event(self, to: str, message: Message, include_self: bool = True):
         """Emit CHAT event to broadcast a chat message."""
         asyncio.create_task(self.server.emit("CHAT", message.model_dump(mode='json'), to=to, skip_sid=None))
 
-    def emit_turn_event(self, to: str, active: str, phase: TurnPhase):
-        """Emit CHANGE_TURN event to signal active player change."""
-        asyncio.create_task(self.server.emit("CHANGE_TURN", {"active": active, "phase": phase.name}, to=to))
+    def emit_turn_event(self, to: str, active: str, phase: TurnPhase, legal: LegalActions | dict | None = None):
+        """Queue turn section to signal active player change, with the requests the active player may make."""
+        turn = {"active": active, "phase": phase.name}
+        if legal is not None:
+            turn["legal"] = _encode(legal)
+        self._queue_patch(to, "turn", turn)
 
-    def emit_board_event(self, to: str, deck_size: int, shop_size: int, monsters : List[MonsterInfo] = [], selected_monster: int = None, items : list[ItemInfo] = []):
-        item_i = [item.model_dump(mode='json') for item in items] if items else []
-        mon_i = [mon.model_dump(mode='json') for mon in monsters] if monsters else []
-        asyncio.create_task(self.server.emit("BOARD", {"deck_size": deck_size, "shop_size": shop_size, "monsters": mon_i, "selected_monster": selected_monster, "items": item_i}, to=to))
+    def emit_board_event(self, to: str, deck_size: int, shop_size: int, monsters : List[MonsterInfo | dict] = [], selected_monster: int = None, items : list[ItemInfo | dict] = []):
+        item_i = [_encode(item) for item in items] if items else []
+        mon_i = [_encode(mon) for mon in monsters] if monsters else []
+        self._queue_patch(to, "board", {"deck_size": deck_size, "shop_size": shop_size, "monsters": mon_i, "selected_monster": selected_monster, "items": item_i})
 
-    def emit_hand_event(self, to: str, items: List[ItemInfo], selected_items: List[bool] = None):
-        item_i = [item.model_dump(mode='json') for item in items] if items else []
+    def emit_hand_event(self, to: str, items: List[ItemInfo | dict], selected_items: List[bool] = None):
+        item_i = [_encode(item) for item in items] if items else []
         
-        asyncio.create_task(self.server.emit("ITEMS", {"items": item_i, "selected_items": selected_items}, to=to))
+        self._queue_patch(to, "hand", {"items": item_i, "selected_items": selected_items})
+
+
+    def emit_odds_event(self, to: str, odds: CombatOdds | dict):
+        """Emit ODDS event with the combat odds a player asked for, only to that player."""
+        asyncio.create_task(self.server.emit("ODDS", _encode(odds), to=to))
 
 
     #Animation/Cosmetic events
@@ -78,11 +78,13 @@ class AppLogger:
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         AppLogger._shared_file_handler.setFormatter(file_formatter)
+        logging.getLogger('app_logger').setLevel(logging.DEBUG)
         AppLogger._log_file_setup = True
 
     def _setup_instance_logger(self):
-        self._logger = logging.getLogger(f'app_logger_{self.name}')
-        self._logger.setLevel(logging.DEBUG)
+        # the level comes from the shared parent, setLevel on every instance would clear the level cache
+        # of all loggers each time, which makes creating one logger per game quadratic
+        self._logger = logging.getLogger(f'app_logger.{self.name}')
         self._logger.propagate = False
 
         if AppLogger._shared_file_handler not in self._logger.handlers:
@@ -125,6 +127,28 @@ class AppLogger:
         self._log_with_console('critical', message, console)
 
 
+class NullLogger:
+    '''
+    Drop-in for AppLogger that discards everything, for headless runs like simulations
+    '''
+    name = 'null'
+
+    def debug(self, message, console=True):
+        pass
+
+    def info(self, message, console=True):
+        pass
+
+    def warning(self, message, console=True):
+        pass
+
+    def error(self, message, console=True):
+        pass
+
+    def critical(self, message, console=True):
+        pass
+
+
 if __name__ == "__main__":
     foo_logger = AppLogger(name='foo', color='blue')
     bar_logger = AppLogger(name='bar', color='red')
@@ -0,0 +1,62 @@
+"""
+GameState clones per second, the budget of search bots (MCTS, expectimax) that branch a game over every decision.
+
+Plays random games to a spread of mid game positions, then clones them with GameState.clone
+and with copy.deepcopy, and clones them again playing one random action on each branch.
+
+Run from backend/:
+    python -m benchmarks.bench_clone --games 200 --players 4 --steps 40
+"""
+import copy
+import time
+import random
+import argparse
+from gamestate import GameState
+from simulator import new_game, random_policy
+
+
+def positions(games: int, players: int, steps: int, seed: int) -> list[GameState]:
+    rng = random.Random(seed)
+    built = []
+    for g in range(games):
+        game = new_game(f'game_{g}', players, seed=seed + g)
+        for _ in range(rng.randrange(steps)):
+            random_policy(game, game.get_active_player(), rng)
+        built.append(game)
+    return built
+
+def rate(games: list[GameState], branch, repeat: int) -> float:
+    '''branches per second over every game, repeat times each'''
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for game in games:
+            branch(game)
+    return repeat * len(games) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=40, help="random actions played at most before branching")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    games = positions(args.games, args.players, args.steps, args.seed)
+    in_combat = sum(game._combat_substate is not None for game in games)
+    rng = random.Random(args.seed)
+
+    def play(game: GameState):
+        branch = game.clone()
+        random_policy(branch, branch.get_active_player(), rng)
+
+    print(f'{len(games)} positions, {args.players} players, {in_combat} in combat')
+    clone = rate(games, GameState.clone, args.repeat)
+    deep = rate(games, copy.deepcopy, max(1, args.repeat // 10))
+    print(f'  clone            {clone:10.0f}/s')
+    print(f'  copy.deepcopy    {deep:10.0f}/s  ({clone / deep:.0f}x slower)')
+    print(f'  clone and play   {rate(games, play, args.repeat):10.0f}/s')
+
+
+if __name__ == "__main__":
+    main()
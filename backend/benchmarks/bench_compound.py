@@ -0,0 +1,67 @@
+"""
+Server work and wire traffic of one fight, played as separate requests or as one compound request.
+
+Each fight selects a monster, starts fighting it, selects items one at a time and fights, in a fresh game
+per fight. Separate requests each get their own snapshots, differential update and tick, the way
+game_manager handles them, while the compound request goes through GameState.play_steps in one.
+
+Run from backend/:
+    python -m benchmarks.bench_compound --fights 2000 --players 4 --items 3
+"""
+import time
+import asyncio
+import argparse
+from api_wrapper import FsfApi, CompoundStep, PlayerActionChoice, PlayerCombatChoice
+from card_library import ITEM_TEMPLATES
+from gamestate import GameState, Item
+from simulator import new_game
+from benchmarks.bench_wire import WireCounter, section_versions, emit_changed
+
+
+def in_combat(fight: int, players: int, items: int) -> GameState:
+    game = new_game(f'game_{fight}', players, seed=fight)
+    game.players["p0"].items = [Item(ITEM_TEMPLATES["dev_item"]) for _ in range(items)]
+    game.player_action("p0", PlayerActionChoice.COMBAT)
+    return game
+
+def fight_requests(items: int) -> list:
+    requests = [lambda game: game.player_select_monster("p0", 0, PlayerCombatChoice.SELECT),
+                lambda game: game.player_select_monster("p0", 0, PlayerCombatChoice.FIGHT)]
+    requests += [lambda game, i=i: game.player_select_item("p0", i) for i in range(items)]
+    return requests + [lambda game: game.player_select_monster("p0", 0, PlayerCombatChoice.FIGHT)]
+
+def fight_steps(items: int) -> list[CompoundStep]:
+    return [CompoundStep(combat=PlayerCombatChoice.SELECT, target=0), CompoundStep(combat=PlayerCombatChoice.FIGHT, target=0),
+            CompoundStep(items=list(range(items))), CompoundStep(combat=PlayerCombatChoice.FIGHT, target=0)]
+
+async def play(compound: bool, fights: int, players: int, items: int) -> tuple[float, int, int]:
+    games = [in_combat(f, players, items) for f in range(fights)]
+    server = WireCounter({game._id: players for game in games})
+    api = FsfApi(server)
+    requests = [lambda game: game.play_steps("p0", fight_steps(items))] if compound else fight_requests(items)
+    start = time.perf_counter()
+    for game in games:
+        for request in requests:
+            before = section_versions(game)
+            request(game)
+            emit_changed(api, game._id, game, before, section_versions(game))
+            for _ in range(3): # one request per tick, and the tick its patch is flushed in
+                await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(0.01)
+    return elapsed, server.bytes, server.frames
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fights", type=int, default=2000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--items", type=int, default=3)
+    args = parser.parse_args()
+
+    for label, compound in (("separate", False), ("compound", True)):
+        elapsed, sent, frames = asyncio.run(play(compound, args.fights, args.players, args.items))
+        print(f'{label:>8}: {elapsed / args.fights * 1e6:8.1f}us/fight  {sent / args.fights:8.1f} bytes/fight  {frames / args.fights:6.2f} frames/fight')
+
+
+if __name__ == "__main__":
+    main()
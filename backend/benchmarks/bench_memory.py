@@ -0,0 +1,134 @@
+"""
+Bytes of memory per live game, including the players, their items, drawn monsters and cached wire encodings.
+
+Builds games through GameState, plays random actions in each, encodes their status the way
+game_manager does for every update, and measures the heap growth with tracemalloc.
+Each entity is compared with a baseline built the old way, as a plain object that copies every
+static field of its card into its own __dict__, and the game total is estimated with the baselines.
+
+Run from backend/:
+    python -m benchmarks.bench_memory --games 2000 --players 4 --steps 40
+"""
+import gc
+import argparse
+import random
+import tracemalloc
+from collections import Counter
+from app_logging import NullLogger
+from gamestate import GameState, Item, Monster, Player
+from card_library import ITEM_TEMPLATES, MONSTER_TEMPLATES, ItemTemplate, MonsterTemplate
+from simulator import random_policy
+
+
+# entities as they were before the flyweight templates and __slots__
+class DictItem:
+    def __init__(self, template: ItemTemplate, id: int):
+        self.name = template.name
+        self.id = id
+        self.text = template.text
+        self.target_type = template.target_type
+        self.effect = template.effect
+        self.params = None # shared with the library entry
+
+class DictMonster:
+    def __init__(self, template: MonsterTemplate, id: int):
+        self.version = id
+        self.name = template.name
+        self.stars = template.stars
+        self.visible = False
+        self.health = template.health
+        self.spare = template.spare
+        self.flee_coins = template.flee_coins
+        self.spare_coins = template.spare_coins
+        self.fight_coins = template.fight_coins
+        self.max_health = template.health
+        self.id = id
+
+class DictPlayer:
+    def __init__(self, name: str, sid: str):
+        self.name = name
+        self.sid = sid
+        self.lobby_ready = False
+        self.coins = 0
+        self.items = []
+        self.captured_stars = []
+        self.health = 4
+        self.max_health = 4
+        self.version = 0
+        self.hand_version = 0
+
+
+def build_games(games: int, players: int, steps: int, seed: int) -> list[GameState]:
+    rng = random.Random(seed)
+    built = []
+    for g in range(games):
+        game = GameState(f'game_{g}', f'game_{g}', "p0", players, logger=NullLogger(), seed=seed + g)
+        for p in range(players):
+            game.add_player(f'p{p}', f'sid_{g}_{p}')
+        game.start()
+        for _ in range(steps):
+            random_policy(game, game.get_active_player(), rng)
+        game.get_status_players(encoded=True)
+        game.get_status_board(encoded=True)
+        for name in game.players:
+            game.players[name].get_status_hand(encoded=True)
+        built.append(game)
+    return built
+
+def count_entities(games: list[GameState]) -> Counter:
+    counts = Counter()
+    for game in games:
+        for player in game.players.values():
+            counts[Player] += 1
+            counts[Item] += len(player.items)
+        if game._combat_substate is not None:
+            counts[Monster] += len(game._combat_substate.monsters)
+    return counts
+
+def entity_bytes(build, n: int = 10000) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    entities = [build(i) for i in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del entities
+    return (after - before) / n
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=40, help="random actions played in each game")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    build_games(1, args.players, args.steps, args.seed) # warm up the library, caches and interned names
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    games = build_games(args.games, args.players, args.steps, args.seed)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    per_game = (after - before) / len(games)
+    log_entries = sum(len(game.action_log) for game in games) / len(games)
+    entities = count_entities(games)
+    print(f'{len(games)} games, {args.players} players, {args.steps} actions each')
+    item, monster = next(iter(ITEM_TEMPLATES)), next(iter(MONSTER_TEMPLATES))
+    sizes = {
+        Player: (entity_bytes(lambda i: DictPlayer(f'p{i}', f'sid{i}')), entity_bytes(lambda i: Player(f'p{i}', f'sid{i}'))),
+        Item: (entity_bytes(lambda i: DictItem(ITEM_TEMPLATES[item], i)), entity_bytes(lambda i: Item.construct_from_id(item))),
+        Monster: (entity_bytes(lambda i: DictMonster(MONSTER_TEMPLATES[monster], i)), entity_bytes(lambda i: Monster.construct_from_id(monster))),
+    }
+    saved = sum(entities[cls] * (before - after) for cls, (before, after) in sizes.items()) / len(games)
+    print(f'{"":24} {"before":>8} {"after":>8}')
+    print(f'{"bytes/game":<24} {per_game + saved:8.0f} {per_game:8.0f}  (before estimated, {log_entries:.1f} action log entries/game)')
+    for cls in (Player, Item, Monster):
+        before, after = sizes[cls]
+        print(f'  {cls.__name__:<8} {entities[cls] / len(games):5.1f}/game {before:8.0f} {after:8.0f}')
+
+
+if __name__ == "__main__":
+    main()
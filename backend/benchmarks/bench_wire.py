@@ -0,0 +1,100 @@
+"""
+Bytes on the wire per turn for game state updates, full sections vs delta encoded sections.
+
+Plays random games through GameState, emits the changed sections through FsfApi the same way
+game_manager's differential update does, and measures every STATE_PATCH as socket.io would encode it.
+
+Run from backend/:
+    python -m benchmarks.bench_wire --games 50 --turns 40 --players 4
+"""
+import argparse
+import asyncio
+import json
+import random
+from api_wrapper import FsfApi
+from app_logging import NullLogger
+from gamestate import GameState
+from simulator import random_policy
+
+
+class WireCounter:
+    """Stands in for the socket server and counts encoded bytes per delivered frame"""
+    def __init__(self, room_sizes: dict[str, int]):
+        self.room_sizes = room_sizes
+        self.bytes = 0
+        self.frames = 0
+
+    def on(self, event, handler):
+        pass
+
+    async def emit(self, event, data=None, to=None, skip_sid=None):
+        receivers = self.room_sizes.get(to, 1)
+        self.frames += receivers
+        self.bytes += receivers * len(json.dumps([event, data], separators=(',', ':')))
+
+
+def section_versions(game: GameState):
+    return (
+        game.get_players_version(),
+        game.get_turn_version(),
+        game.get_board_version(),
+        {name: game.get_hand_version(name) for name in game.players},
+    )
+
+def emit_changed(api: FsfApi, game_id: str, game: GameState, before, after):
+    if before[0] != after[0]:
+        api.emit_players_event(game_id, game.get_status_players(encoded=True))
+    if before[1] != after[1]:
+        active = game.get_active_player()
+        api.emit_turn_event(game_id, active=active, phase=game.turn_phase, legal=game.legal_actions(active, encoded=True))
+    if before[2] != after[2]:
+        api.emit_board_event(game_id, **game.get_status_board(encoded=True))
+    for name, version in after[3].items():
+        if before[3].get(name) != version:
+            player = game.players[name]
+            api.emit_hand_event(player.sid, player.get_status_hand(encoded=True), game.get_selected_fight_items(name).copy())
+
+async def play(delta: bool, games: int, turns: int, players: int, seed: int) -> tuple[int, int, int]:
+    rng = random.Random(seed)
+    room_sizes = {f'game_{g}': players for g in range(games)}
+    server = WireCounter(room_sizes)
+    api = FsfApi(server, delta=delta)
+    total_turns = 0
+    for g in range(games):
+        game_id = f'game_{g}'
+        game = GameState(game_id, game_id, "p0", players, logger=NullLogger(), seed=seed + g)
+        for p in range(players):
+            game.add_player(f'p{p}', f'{game_id}_sid{p}')
+        game.start()
+        started = 0
+        steps = 0
+        while started < turns:
+            steps += 1
+            if steps > turns * 100:
+                raise RuntimeError(f'{game_id} stopped advancing turns in phase {game.turn_phase.name}')
+            active_turn = game._active_player
+            before = section_versions(game)
+            random_policy(game, game.get_active_player(), rng)
+            emit_changed(api, game_id, game, before, section_versions(game))
+            await asyncio.sleep(0) # one action per tick, like one socket event per tick
+            if game._active_player != active_turn:
+                started += 1
+        total_turns += started
+    await asyncio.sleep(0.01)
+    return server.bytes, server.frames, total_turns
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for label, delta in (("full", False), ("delta", True)):
+        sent, frames, turns = asyncio.run(play(delta, args.games, args.turns, args.players, args.seed))
+        print(f'{label:>6}: {sent / turns:9.1f} bytes/turn  {frames / turns:6.2f} frames/turn  ({turns} turns)')
+
+
+if __name__ == "__main__":
+    main()
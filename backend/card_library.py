@@ -0,0 +1,336 @@
+"""
+Static card data from library.yaml, held once per card type in immutable templates.
+Every Item and Monster of a type shares its template (flyweight) and only holds its own id and mutable state.
+
+library.yaml is validated once and compiled into a marshal artifact next to it, which is what gets loaded
+on import. The artifact remembers the mtime and size of the yaml it was built from and is rebuilt
+lazily whenever they change, so editing the library needs no extra step. Docker images build it up front.
+
+Every card has a rarity (common unless it says otherwise) and the rarities section gives each one a weight.
+A ruleset is a recipe for the monster deck and the item shop of a game, each either "*" for every card
+weighted by rarity, a list of card names weighted by rarity, or a mapping of card names to their own weights.
+Each ruleset is compiled once into alias tables that every game playing it draws from. A library without
+a "default" ruleset gets one with every card.
+
+    python card_library.py                      # validates library.yaml and rebuilds the artifact
+    python card_library.py --time               # import time of the yaml against the artifact
+    python card_library.py --time --cards 5000  # the same for a generated library of that many cards
+"""
+import os
+import sys
+import time
+import struct
+import marshal
+import inspect
+import argparse
+import tempfile
+import functools
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Literal, Mapping
+import yaml
+import api_wrapper
+from alias_table import AliasTable
+from item_effects import EFFECT_REGISTRY, CONDITION_REGISTRY, ALL, IF, Effect, compile_effect
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError: # PyYAML built without libyaml
+    from yaml import SafeLoader
+
+
+LIBRARY_PATH = os.path.join(os.path.dirname(__file__), 'library.yaml')
+ARTIFACT_PATH = os.environ.get("CARD_LIBRARY_ARTIFACT", os.path.join(os.path.dirname(__file__), '.library.bin'))
+
+MAGIC = b"FSFL"
+FORMAT_VERSION = 3
+_HEADER = struct.Struct("<4sHqq") # magic, format version, source mtime_ns, source size
+MONSTER_FIELDS = ("stars", "health", "spare", "flee_coins", "spare_coins", "fight_coins")
+DEFAULT_RARITY = "common"
+DEFAULT_RULESET = "default"
+
+
+@dataclass(frozen=True, slots=True)
+class ItemTemplate:
+    name: str
+    text: str
+    target_type: api_wrapper.ItemTarget
+    effect: Effect | None # compiled once, see item_effects
+    rarity: str
+    info: api_wrapper.ItemInfo # with id -1, shared so never mutate it
+    info_json: Mapping[str, Any] # info encoded for the wire
+
+    def __deepcopy__(self, memo) -> ItemTemplate:
+        return self # immutable and shared, copies of a game keep sharing it
+
+    @staticmethod
+    def from_compiled(name: str, data: tuple) -> ItemTemplate:
+        text, spec, rarity = data
+        effect = None if spec is None else compile_effect(spec)
+        target = api_wrapper.ItemTarget.NONE if effect is None else effect.target_type
+        info = api_wrapper.ItemInfo(id=-1, name=name, text=text, target_type=target)
+        return ItemTemplate(name, text, target, effect, rarity, info, MappingProxyType(info.model_dump(mode='json')))
+
+
+@dataclass(frozen=True, slots=True)
+class MonsterTemplate:
+    name: str
+    stars: int
+    health: int
+    spare: int
+    flee_coins: int
+    spare_coins: int
+    fight_coins: int
+    rarity: str
+    info: api_wrapper.MonsterInfo # face up with id -1, shared so never mutate it
+    hidden_info: api_wrapper.MonsterInfo # face down
+    info_json: Mapping[str, Any] # info encoded for the wire
+    hidden_info_json: Mapping[str, Any]
+
+    def __deepcopy__(self, memo) -> MonsterTemplate:
+        return self
+
+    @staticmethod
+    def from_compiled(name: str, data: tuple) -> MonsterTemplate:
+        stars, health, spare, flee_coins, spare_coins, fight_coins, rarity = data
+        info = api_wrapper.MonsterInfo(id=-1, name=name, stars=stars, max_health=health, health=health, spare=spare,
+                                       flee_coins=flee_coins, spare_coins=spare_coins, fight_coins=fight_coins)
+        hidden_info = api_wrapper.MonsterInfo(id=-1, stars=stars)
+        return MonsterTemplate(name, stars, health, spare, flee_coins, spare_coins, fight_coins, rarity, info, hidden_info,
+                               MappingProxyType(info.model_dump(mode='json')), MappingProxyType(hidden_info.model_dump(mode='json')))
+
+
+def compile_library(text: str) -> dict:
+    '''
+    validates the yaml source of a card library and compiles it to builtins marshal can store,
+    raising ValueError naming the first bad card
+    '''
+    data = yaml.load(text, SafeLoader) or {}
+    rarities = data.get("rarities") or {DEFAULT_RARITY: 1}
+    for rarity, weight in rarities.items():
+        _check_weight(weight, f'rarity "{rarity}"')
+
+    items, monsters = {}, {}
+    for name, item in (data.get("items") or {}).items():
+        if not isinstance(item, dict) or not isinstance(item.get("text"), str):
+            raise ValueError(f'item "{name}" needs a text')
+        spec = _effect_spec(name, item["effect"]) if "effect" in item else None
+        items[str(name)] = (item["text"], spec, _rarity(name, item, rarities))
+
+    for name, monster in (data.get("monsters") or {}).items():
+        if not isinstance(monster, dict):
+            raise ValueError(f'monster "{name}" is not a mapping')
+        missing = [field for field in MONSTER_FIELDS if not isinstance(monster.get(field), int)]
+        if missing:
+            raise ValueError(f'monster "{name}" needs integer {", ".join(missing)}')
+        if not 1 <= monster["stars"] <= 3: # the range MonsterInfo accepts
+            raise ValueError(f'monster "{name}" needs 1 to 3 stars')
+        if monster["health"] <= 0:
+            raise ValueError(f'monster "{name}" needs positive health')
+        monsters[str(name)] = (*(monster[field] for field in MONSTER_FIELDS), _rarity(name, monster, rarities))
+
+    recipes = data.get("rulesets") or {}
+    recipes.setdefault(DEFAULT_RULESET, {})
+    rulesets = {}
+    for name, recipe in recipes.items():
+        if not isinstance(recipe, dict):
+            raise ValueError(f'ruleset "{name}" is not a mapping')
+        rulesets[str(name)] = {
+            "items": _compile_recipe(name, "items", recipe.get("items", "*"), items, rarities),
+            "monsters": _compile_recipe(name, "monsters", recipe.get("monsters", "*"), monsters, rarities),
+        }
+
+    return {"items": items, "monsters": monsters, "rarities": rarities, "rulesets": rulesets,
+            "characters": data.get("characters") or {}}
+
+def _effect_spec(name: str, effect: Any) -> tuple:
+    '''validates the effect of item name into the spec item_effects.compile_effect takes'''
+    if isinstance(effect, dict) and ALL in effect:
+        parts = effect[ALL]
+        if not isinstance(parts, list) or not parts:
+            raise ValueError(f'item "{name}" needs a list of effects under "{ALL}"')
+        spec = (ALL, tuple(_effect_spec(name, part) for part in parts))
+    elif isinstance(effect, dict) and IF in effect:
+        condition = effect[IF]
+        if not isinstance(condition, dict) or len(condition) != 1 or next(iter(condition)) not in CONDITION_REGISTRY:
+            raise ValueError(f'item "{name}" has a bad condition {condition!r}, expected one of {list(CONDITION_REGISTRY)} with a value')
+        if "then" not in effect:
+            raise ValueError(f'item "{name}" has a condition without "then"')
+        (test, value), = condition.items()
+        otherwise = effect.get("else")
+        spec = (IF, test, value, _effect_spec(name, effect["then"]), None if otherwise is None else _effect_spec(name, otherwise))
+    else:
+        effect_id = effect.get("id") if isinstance(effect, dict) else None
+        if effect_id not in EFFECT_REGISTRY:
+            raise ValueError(f'item "{name}" has unknown effect "{effect_id}", expected one of {list(EFFECT_REGISTRY)}')
+        params = dict(effect.get("params") or {})
+        _, function, _ = EFFECT_REGISTRY[effect_id]
+        try:
+            inspect.signature(function).bind(None, **params)
+        except TypeError as e:
+            raise ValueError(f'item "{name}" has bad params for effect "{effect_id}": {e}') from None
+        return (effect_id, params)
+    if len({compile_effect(part).target_type for part in _branches(spec)}) != 1:
+        raise ValueError(f'item "{name}" combines effects with different targets')
+    return spec
+
+def _branches(spec: tuple) -> tuple:
+    '''the effects a composite or conditional spec is made of'''
+    if spec[0] == ALL:
+        return spec[1]
+    return tuple(part for part in spec[3:] if part is not None)
+
+def _check_weight(weight: Any, what: str):
+    if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0:
+        raise ValueError(f'{what} needs a positive weight, got {weight!r}')
+
+def _rarity(name: str, card: dict, rarities: dict) -> str:
+    rarity = card.get("rarity", DEFAULT_RARITY)
+    if rarity not in rarities:
+        raise ValueError(f'"{name}" has unknown rarity "{rarity}", expected one of {list(rarities)}')
+    return rarity
+
+def _compile_recipe(ruleset: str, kind: str, recipe: Any, cards: dict[str, tuple], rarities: dict) -> tuple[list, list]:
+    '''the card names and weights one half of a ruleset draws from'''
+    if recipe == "*":
+        recipe = list(cards)
+    if isinstance(recipe, list):
+        weights = dict.fromkeys(recipe)
+    elif isinstance(recipe, dict):
+        weights = recipe
+        for card, weight in weights.items():
+            _check_weight(weight, f'{kind} "{card}" in ruleset "{ruleset}"')
+    else:
+        raise ValueError(f'ruleset "{ruleset}" needs "*", a list or a mapping of {kind}')
+    unknown = [str(card) for card in weights if card not in cards]
+    if unknown:
+        raise ValueError(f'ruleset "{ruleset}" has unknown {kind} {", ".join(unknown)}')
+    if not weights and cards:
+        raise ValueError(f'ruleset "{ruleset}" has no {kind}')
+    names = list(weights)
+    return names, [rarities[cards[card][-1]] if weight is None else weight for card, weight in weights.items()]
+
+def build_artifact(source: str = LIBRARY_PATH, artifact: str = ARTIFACT_PATH) -> dict:
+    '''compiles source and writes it to artifact atomically, returns the compiled library'''
+    stat = os.stat(source)
+    with open(source, encoding="utf-8") as f:
+        compiled = compile_library(f.read())
+    data = _HEADER.pack(MAGIC, FORMAT_VERSION, stat.st_mtime_ns, stat.st_size) + marshal.dumps(compiled, 4)
+    directory = os.path.dirname(artifact) or "."
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".library.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, artifact)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return compiled
+
+def read_artifact(source: str = LIBRARY_PATH, artifact: str = ARTIFACT_PATH) -> dict | None:
+    '''the compiled library in artifact if it was built from the current source by this format version, else None'''
+    try:
+        with open(artifact, "rb") as f:
+            data = f.read()
+        stat = os.stat(source)
+    except OSError:
+        return None
+    if len(data) < _HEADER.size:
+        return None
+    if _HEADER.unpack_from(data) != (MAGIC, FORMAT_VERSION, stat.st_mtime_ns, stat.st_size):
+        return None
+    return marshal.loads(memoryview(data)[_HEADER.size:])
+
+def load_library(source: str = LIBRARY_PATH, artifact: str = ARTIFACT_PATH) -> dict:
+    '''the compiled library, rebuilding the artifact first if source changed since it was built'''
+    compiled = read_artifact(source, artifact)
+    if compiled is not None:
+        return compiled
+    try:
+        return build_artifact(source, artifact)
+    except OSError: # read only install, compile without caching
+        with open(source, encoding="utf-8") as f:
+            return compile_library(f.read())
+
+
+_library = load_library()
+ITEM_TEMPLATES: dict[str, ItemTemplate] = {name: ItemTemplate.from_compiled(name, data) for name, data in _library["items"].items()}
+MONSTER_TEMPLATES: dict[str, MonsterTemplate] = {name: MonsterTemplate.from_compiled(name, data) for name, data in _library["monsters"].items()}
+CHARACTERS: dict[str, dict] = _library["characters"]
+RARITIES: dict[str, float] = _library["rarities"]
+
+
+@dataclass(frozen=True, slots=True)
+class Ruleset:
+    name: str
+    monsters: AliasTable # what the monster deck draws
+    items: AliasTable # what the item shop draws
+
+RULESETS: dict[str, Ruleset] = {
+    name: Ruleset(name, AliasTable(*recipe["monsters"]), AliasTable(*recipe["items"]))
+    for name, recipe in _library["rulesets"].items()
+}
+del _library
+
+
+@functools.lru_cache(maxsize=256)
+def card_table(kind: Literal["items", "monsters"], names: tuple[str, ...]) -> AliasTable:
+    '''alias table over names weighted by rarity, shared by every game restricted to exactly these cards'''
+    templates = ITEM_TEMPLATES if kind == "items" else MONSTER_TEMPLATES
+    return AliasTable(names, [RARITIES[templates[name].rarity] for name in names])
+
+
+def _generate_library(cards: int) -> str:
+    '''yaml source of a library with cards items and cards monsters, for timing'''
+    rarities = {"common": 10, "uncommon": 4, "rare": 1}
+    items = {f'item_{i}': {"text": f'deals {i % 9 + 1} damage', "effect": {"id": "DIRECT_DAMAGE", "params": {"amount": i % 9 + 1}},
+                           "rarity": list(rarities)[i % 3]} for i in range(cards)}
+    monsters = {f'monster_{i}': {"stars": i % 3 + 1, "health": i % 5 + 1, "spare": i % 6 + 1, "flee_coins": 1, "spare_coins": 2, "fight_coins": 3,
+                                 "rarity": list(rarities)[i % 3]} for i in range(cards)}
+    rulesets = {"default": {}, "one_star": {"monsters": [name for name, monster in monsters.items() if monster["stars"] == 1]}}
+    return yaml.safe_dump({"rarities": rarities, "items": items, "monsters": monsters, "rulesets": rulesets})
+
+def _time_import(source: str, artifact: str):
+    start = time.perf_counter()
+    with open(source, encoding="utf-8") as f:
+        yaml.load(f.read(), yaml.Loader)
+    parsed = time.perf_counter()
+    build_artifact(source, artifact)
+    built = time.perf_counter()
+    compiled = read_artifact(source, artifact)
+    loaded = time.perf_counter()
+    items = [ItemTemplate.from_compiled(name, data) for name, data in compiled["items"].items()]
+    monsters = [MonsterTemplate.from_compiled(name, data) for name, data in compiled["monsters"].items()]
+    tables = [AliasTable(*recipe[kind]) for recipe in compiled["rulesets"].values() for kind in ("items", "monsters")]
+    templated = time.perf_counter()
+    print(f'{len(items)} items, {len(monsters)} monsters')
+    print(f'  yaml.Loader parse    {(parsed - start) * 1000:8.1f}ms  (what every import used to do)')
+    print(f'  validate and build   {(built - parsed) * 1000:8.1f}ms  (once per library change)')
+    print(f'  artifact load        {(loaded - built) * 1000:8.1f}ms')
+    print(f'  templates and tables {(templated - loaded) * 1000:8.1f}ms  ({len(tables)} alias tables)')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--time", action="store_true", help="time loading the library instead of building it")
+    parser.add_argument("--cards", type=int, default=0, help="with --time, use a generated library of this many items and monsters")
+    args = parser.parse_args()
+
+    if not args.time:
+        try:
+            compiled = build_artifact()
+        except ValueError as e:
+            sys.exit(f'{LIBRARY_PATH}: {e}')
+        print(f'built {ARTIFACT_PATH}: {len(compiled["items"])} items, {len(compiled["monsters"])} monsters')
+    elif args.cards:
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "library.yaml")
+            with open(source, "w", encoding="utf-8") as f:
+                f.write(_generate_library(args.cards))
+            _time_import(source, os.path.join(directory, "library.bin"))
+    else:
+        _time_import(LIBRARY_PATH, ARTIFACT_PATH)
+
+
+if __name__ == "__main__":
+    main()
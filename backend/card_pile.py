@@ -0,0 +1,69 @@
+import random
+from array import array
+from typing import Callable
+from alias_table import AliasTable
+
+
+class CardPile[T]:
+    '''
+    A face down pile of random cards, stored as an array of indices into an alias table of card types with a cursor.
+    Cards only become objects when they are drawn, and a pile without enough cards left
+    refills itself with a fresh set, sampled from the table's weights, on the draw that needs them.
+    '''
+    table: AliasTable # card types and their weights, the pile stores indices into its types
+    size: int # cards in a full pile
+    _build: Callable[[str], T]
+    _rng: random.Random
+    _cards: array
+    _cursor: int # next card to draw
+
+    def __init__(self, table: AliasTable, build: Callable[[str], T], rng: random.Random, size: int = 40):
+        self.table = table
+        self.size = size
+        self._build = build
+        self._rng = rng
+        self._cards = array('H')
+        self._cursor = 0
+
+    def __len__(self) -> int:
+        '''cards left before the next refill'''
+        return len(self._cards) - self._cursor
+
+    def refill(self) -> None:
+        '''replaces the pile with size new random cards'''
+        self._cards = self.table.sample(self._rng, self.size)
+        self._cursor = 0
+
+    def draw(self, n: int = 1) -> list[T]:
+        '''draws the top n cards, refilling first if fewer than n are left'''
+        if len(self) < n:
+            self.refill()
+        start, types = self._cursor, self.table.types
+        self._cursor += n
+        return [self._build(types[i]) for i in self._cards[start:self._cursor]]
+
+    def pop(self) -> T:
+        '''draws the top card'''
+        return self.draw(1)[0]
+
+    def clone(self, rng: random.Random) -> CardPile[T]:
+        '''a copy drawing from rng, sharing the card array since piles only ever replace it'''
+        pile = object.__new__(CardPile)
+        pile.table = self.table
+        pile.size = self.size
+        pile._build = self._build
+        pile._rng = rng
+        pile._cards = self._cards
+        pile._cursor = self._cursor
+        return pile
+
+    def names(self) -> list[str]:
+        '''the type names of the cards left, top first'''
+        types = self.table.types
+        return [types[i] for i in self._cards[self._cursor:]]
+
+    def load(self, names: list[str]) -> None:
+        '''replaces the pile with the named cards, top first'''
+        index = self.table.index
+        self._cards = array('H', [index[name] for name in names])
+        self._cursor = 0
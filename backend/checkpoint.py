@@ -0,0 +1,266 @@
+"""
+Compact binary snapshots of GameState, so a game_manager restart does not end every live table.
+
+A checkpoint file is MAGIC, a format version and one marshal encoded list with a plain tuple per game.
+Items and monsters are stored by library name (drawn monsters with their health and visibility),
+players by name, so a restore builds fresh objects with fresh process local ids and versions.
+Restored players keep their seat with their old sid until they rejoin.
+
+    python checkpoint.py --games 10000    # times a full checkpoint and restore
+"""
+import gc
+import os
+import time
+import array
+import struct
+import marshal
+import asyncio
+import threading
+import argparse
+from contextlib import contextmanager
+import api_wrapper
+from app_logging import AppLogger, NullLogger
+from gamestate import GameState, Item, Monster, Player, next_version
+
+
+MAGIC = b"FSFC"
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<4sH")
+
+
+@contextmanager
+def _paused_gc():
+    # everything a dump or restore allocates stays alive, collecting cycles in between only costs time
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _dump_monster(monster: Monster) -> tuple:
+    return (monster.name, monster.health, monster.visible)
+
+def _dump_player(player: Player) -> tuple:
+    return (player.name, player.sid, player.lobby_ready, player.coins, player.health, player.max_health,
+            player.captured_stars[:], [item.name for item in player.items])
+
+def _dump_rng(game: GameState) -> bytes | None:
+    # lobbies have not drawn anything yet, the seed alone restores them
+    if game.status == api_wrapper.GameStatus.LOBBY:
+        return None
+    version, words, gauss = game._rng.getstate()
+    return array.array("I", words).tobytes()
+
+def _dump_combat(combat: GameState.CombatSubstate | None) -> tuple | None:
+    if combat is None:
+        return None
+    base = ([_dump_monster(m) for m in combat.monsters], combat.player.name, combat.state,
+            combat.selected_items[:], combat.selected_idx)
+    if isinstance(combat, GameState.LCombatSubstate):
+        return ("L", *base, combat.original_player, [p.name for p in combat.order])
+    return ("N", *base, [_dump_monster(m) for m in combat.leftover_queue])
+
+def dump_game(game: GameState) -> tuple:
+    '''the game as a tuple of builtins that marshal can encode'''
+    turn = None
+    if game.status != api_wrapper.GameStatus.LOBBY:
+        turn = (game._turn_order[:], game._active_player, game.turn_phase.value, game.deck.names(), game.shop.names(),
+                _dump_combat(game._combat_substate))
+    return (
+        game._id, game._name, game._owner, game._max_players, game._allowed_items, game._allowed_monsters, game.ruleset,
+        game.seed, _dump_rng(game), game.action_log[:], game.status.value,
+        [_dump_player(p) for p in game.players.values()],
+        [_dump_player(p) for p in game._left_players.values()],
+        turn,
+    )
+
+
+def _load_monster(data: tuple) -> Monster:
+    name, health, visible = data
+    monster = Monster.construct_from_id(name)
+    monster.health = health
+    monster.visible = visible
+    return monster
+
+def _load_player(data: tuple) -> Player:
+    name, sid, lobby_ready, coins, health, max_health, captured_stars, items = data
+    player = Player(name, sid)
+    player.lobby_ready = lobby_ready
+    player.coins = coins
+    player.health = health
+    player.max_health = max_health
+    player.captured_stars = captured_stars
+    player.items = [Item.construct_from_id(item) for item in items]
+    return player
+
+def _load_combat(data: tuple, players: dict[str, Player]) -> GameState.CombatSubstate:
+    kind, monsters, player, state, selected_items, selected_idx, *rest = data
+    monsters = [_load_monster(m) for m in monsters]
+    if kind == "L":
+        original_player, order = rest
+        combat = GameState.LCombatSubstate(monsters, players[original_player], [players[player]])
+        combat.order = [players[p] for p in order]
+    else:
+        combat = GameState.NCombatSubstate(monsters, players[player])
+        combat.leftover_queue = [_load_monster(m) for m in rest[0]]
+    combat.state = state
+    combat.selected_items = selected_items
+    combat.selected_idx = selected_idx
+    return combat
+
+def load_game(data: tuple, logger: AppLogger | NullLogger | None = None) -> GameState:
+    '''rebuilds a game from dump_game'''
+    (game_id, name, owner, max_players, allowed_items, allowed_monsters, ruleset,
+     seed, rng, action_log, status, players, left_players, turn) = data
+    game = GameState(game_id, name, owner, max_players, allowed_items=allowed_items, allowed_monsters=allowed_monsters,
+                     ruleset=ruleset, logger=logger, seed=seed)
+    if rng is not None:
+        game._rng.setstate((3, tuple(array.array("I", rng)), None))
+    game.action_log = action_log
+    game.status = api_wrapper.GameStatus(status)
+    game.players = {p[0]: _load_player(p) for p in players}
+    game._left_players = {p[0]: _load_player(p) for p in left_players}
+
+    if turn is not None:
+        turn_order, active_player, turn_phase, deck, shop, combat = turn
+        game._turn_order = turn_order
+        game._active_player = active_player
+        game.turn_phase = api_wrapper.TurnPhase(turn_phase)
+        game._pvp_sbs = None
+        game.deck.load(deck)
+        game.shop.load(shop)
+        # combat players can have left the game since
+        game._combat_substate = None if combat is None else _load_combat(combat, game.players | game._left_players)
+    game._roster_version = game._turn_version = game._board_version = next_version()
+    return game
+
+
+def dumps(games: list[tuple]) -> bytes:
+    '''encodes games dumped with dump_game'''
+    return _HEADER.pack(MAGIC, FORMAT_VERSION) + marshal.dumps(games, 4)
+
+def loads(data: bytes) -> list[tuple]:
+    '''decodes a checkpoint into dump_game tuples, raising ValueError if it is not one this version can read'''
+    if len(data) < _HEADER.size:
+        raise ValueError("checkpoint is truncated")
+    magic, version = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a game checkpoint")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"unsupported checkpoint format version {version}, expected {FORMAT_VERSION}")
+    return marshal.loads(memoryview(data)[_HEADER.size:])
+
+def restore(data: bytes, logger: AppLogger | NullLogger | None = None) -> list[GameState]:
+    '''rebuilds the games of a checkpoint, each with its own game logger unless one is given'''
+    with _paused_gc():
+        return [load_game(game, logger) for game in loads(data)]
+
+def write_file(path: str, data: bytes):
+    '''writes data to path atomically, a crash mid write leaves the previous checkpoint in place'''
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f'{path}.tmp'
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Checkpointer:
+    '''
+    Writes the games of a server to one checkpoint file.
+    Games are dumped on the event loop, where no action can run halfway through them,
+    and only when their state version moved since the last checkpoint. Encoding and writing happen on a thread.
+    '''
+    path: str
+    _dumped: dict[str, tuple[int, tuple]] # game id -> (state version, dump_game)
+    _generation: int # checkpoints taken
+    _written: int # generation of the checkpoint on disk
+    _file_lock: threading.Lock
+    _logger: AppLogger
+
+    def __init__(self, path: str):
+        self.path = path
+        self._dumped = {}
+        self._generation = 0
+        self._written = 0
+        self._file_lock = threading.Lock()
+        self._logger = AppLogger(name='checkpoint', color='gray')
+
+    def snapshot(self, games: dict[str, GameState]) -> list[tuple]:
+        '''dumps every game, reusing the dump of games that did not change'''
+        dumped = {}
+        with _paused_gc():
+            for game_id, game in games.items():
+                version = game.get_state_version()
+                cached = self._dumped.get(game_id)
+                if cached is None or cached[0] != version:
+                    cached = (version, dump_game(game))
+                dumped[game_id] = cached
+        self._dumped = dumped
+        return [data for _, data in dumped.values()]
+
+    async def save(self, games: dict[str, GameState]) -> None:
+        '''writes a checkpoint of games without blocking the event loop on encoding or disk'''
+        snapshot = self.snapshot(games)
+        self._generation += 1
+        start = time.perf_counter()
+        size = await asyncio.to_thread(self._write, self._generation, snapshot)
+        if size is not None:
+            self._logger.info(f'checkpointed {len(snapshot)} games ({size} bytes) in {(time.perf_counter() - start) * 1000:.1f}ms')
+
+    def _write(self, generation: int, snapshot: list[tuple]) -> int | None:
+        # a cancelled save keeps writing on its thread, it must not replace a newer checkpoint
+        data = dumps(snapshot)
+        with self._file_lock:
+            if generation < self._written:
+                return None
+            write_file(self.path, data)
+            self._written = generation
+        return len(data)
+
+    def load(self) -> list[GameState]:
+        '''reads the games of the last checkpoint, none if there is no checkpoint yet'''
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        return restore(data)
+
+
+def main():
+    from simulator import new_game, POLICIES
+    import random
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=30, help="random actions played in each game first")
+    args = parser.parse_args()
+
+    games = {}
+    for g in range(args.games):
+        game = new_game(f'g{g}', args.players, seed=g)
+        rng = random.Random(g)
+        for _ in range(args.steps):
+            player = game.get_active_player()
+            POLICIES["random"](game, player, rng)
+        games[game._id] = game
+
+    start = time.perf_counter()
+    data = dumps(Checkpointer("").snapshot(games))
+    dumped = time.perf_counter()
+    restored = restore(data, NullLogger())
+    loaded = time.perf_counter()
+    print(f'{len(restored)} games, {len(data) / len(restored):.0f} bytes/game')
+    print(f'checkpoint {(dumped - start) * 1000:.0f}ms, restore {(loaded - dumped) * 1000:.0f}ms')
+
+
+if __name__ == "__main__":
+    main()
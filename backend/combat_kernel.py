@@ -0,0 +1,272 @@
+"""
+Struct of arrays combat kernel for balance sweeps of library.yaml, resolving millions of combats at once in NumPy.
+
+A combat is a player with some health and a hand of items facing one freshly drawn monster, and either
+fighting it with every item in hand, sparing it or fleeing from it. resolve mirrors the arithmetic of
+GameState._state_combat_fight, CombatSubstate.spare_monster and GameState._deal_damage exactly, down to a
+failed spare costing a point of health in each of them, and validate plays sampled combats through
+GameState to check that it still does. Only items dealing fixed damage to monsters (DIRECT_DAMAGE and
+lists of it) can be vectorized, and they are the only items a fight accepts.
+
+    python combat_kernel.py --combats 5000000 --ruleset default --validate 2000
+"""
+import time
+import random
+import argparse
+from dataclasses import dataclass, field
+import numpy as np
+from alias_table import AliasTable
+from api_wrapper import ItemTarget, PlayerActionChoice, PlayerCombatChoice
+from app_logging import NullLogger
+from card_library import ITEM_TEMPLATES, MONSTER_TEMPLATES, RULESETS, DEFAULT_RULESET, Ruleset
+from gamestate import GameState, Item
+
+
+FIGHT, SPARE, FLEE = range(3)
+CHOICES = (PlayerCombatChoice.FIGHT, PlayerCombatChoice.SPARE, PlayerCombatChoice.FLEE)
+HAND_SIZE = 5 # the shop sells to hands of at most 4 items
+MAX_HEALTH = 4 # of a new Player
+ITEM_PRICE = 2 # of GameState._buy_item
+
+
+@dataclass(frozen=True, slots=True)
+class CardArrays:
+    '''the stats of a ruleset's cards as arrays, indexed like its alias tables'''
+    ruleset: str
+    monsters: AliasTable
+    items: AliasTable
+    stars: np.ndarray
+    health: np.ndarray
+    spare: np.ndarray
+    flee_coins: np.ndarray
+    spare_coins: np.ndarray
+    fight_coins: np.ndarray
+    damage: np.ndarray # of each item, and a 0 last so that empty hand slots (-1) deal nothing
+
+    @staticmethod
+    def from_ruleset(ruleset: Ruleset) -> CardArrays:
+        monsters = [MONSTER_TEMPLATES[name] for name in ruleset.monsters.types]
+        stat = lambda name: np.array([getattr(m, name) for m in monsters], dtype=np.int16)
+        damage = []
+        for name in ruleset.items.types:
+            effect = ITEM_TEMPLATES[name].effect
+            if effect is None or effect.apply is not None or effect.target_type != ItemTarget.MONSTER:
+                raise ValueError(f'item "{name}" does not deal fixed damage to monsters, the combat kernel cannot model it')
+            damage.append(effect.damage)
+        return CardArrays(ruleset.name, ruleset.monsters, ruleset.items, stat("stars"), stat("health"), stat("spare"),
+                          stat("flee_coins"), stat("spare_coins"), stat("fight_coins"), np.array(damage + [0], dtype=np.int32))
+
+
+@dataclass(slots=True)
+class CombatBatch:
+    monster: np.ndarray # index into CardArrays.monsters
+    health: np.ndarray # of the player before the combat
+    hand: np.ndarray # (HAND_SIZE, combats) indices into CardArrays.items, -1 for empty slots
+    choice: np.ndarray # FIGHT, SPARE or FLEE
+    roll: np.ndarray # of the spare, 1 to 6
+
+    def __len__(self) -> int:
+        return len(self.monster)
+
+
+@dataclass(slots=True)
+class Outcome:
+    won: np.ndarray # the monster was killed or spared
+    health: np.ndarray # of the player after the combat
+    coins: np.ndarray # gained
+    stars: np.ndarray # captured
+
+
+def sample_alias(table: AliasTable, rng: np.random.Generator, size: int | tuple) -> np.ndarray:
+    '''draws like AliasTable.sample from the same table, as int16 indices'''
+    n = len(table)
+    prob = np.frombuffer(table.prob, dtype=np.float64).astype(np.float32)
+    jump = np.frombuffer(table.alias, dtype=np.uint16).astype(np.int16) - np.arange(n, dtype=np.int16) # to the alias
+    u = rng.random(size, dtype=np.float32) * n
+    i = np.minimum(u.astype(np.int16), n - 1) # float32 can round up to n
+    u -= i
+    return i + jump[i] * (u >= prob[i])
+
+def sample(cards: CardArrays, combats: int, rng: np.random.Generator) -> CombatBatch:
+    '''combats against monsters drawn like the deck, with 0 to HAND_SIZE items drawn like the shop and a uniform choice'''
+    hand = sample_alias(cards.items, rng, (HAND_SIZE, combats))
+    held = rng.integers(0, HAND_SIZE + 1, combats, dtype=np.int8)
+    hand[np.arange(HAND_SIZE, dtype=np.int8)[:, None] >= held] = -1
+    return CombatBatch(
+        monster=sample_alias(cards.monsters, rng, combats),
+        health=rng.integers(1, MAX_HEALTH + 1, combats, dtype=np.int16),
+        hand=hand,
+        choice=rng.integers(0, 3, combats, dtype=np.int8),
+        roll=rng.integers(1, 7, combats, dtype=np.int8),
+    )
+
+def resolve(cards: CardArrays, batch: CombatBatch) -> Outcome:
+    '''the outcome of every combat in batch'''
+    m = batch.monster
+    damage = cards.damage[batch.hand].sum(axis=0)
+    fight, spare, flee = batch.choice == FIGHT, batch.choice == SPARE, batch.choice == FLEE
+    killed = fight & (damage >= cards.health[m])
+    spared = spare & (batch.roll >= cards.spare[m])
+    failed_spare = spare & ~spared
+
+    # spare_monster takes a point of health, then _deal_damage takes min(1, health) of what is left
+    health = batch.health - failed_spare
+    health = health - np.where((fight & ~killed) | failed_spare, np.minimum(1, health), 0)
+    coins = np.where(killed, cards.fight_coins[m], 0) + np.where(spared, cards.spare_coins[m], 0) + np.where(flee, cards.flee_coins[m], 0)
+    won = killed | spared
+    return Outcome(won=won, health=health, coins=coins, stars=np.where(won, cards.stars[m], 0))
+
+
+def play(cards: CardArrays, batch: CombatBatch, seed: int = 0) -> Outcome:
+    '''
+    plays every combat in batch through GameState, one game each, for validating resolve.
+    The spare rolls come from the games, so they are written back into batch
+    '''
+    outcome = Outcome(*(np.zeros(len(batch), dtype=dtype) for dtype in (bool, np.int16, np.int16, np.int16)))
+    for i in range(len(batch)):
+        game = GameState(f'kernel_{i}', "kernel", "p", 1, ruleset=cards.ruleset, logger=NullLogger(), seed=seed + i)
+        game.add_player("p", "sid")
+        game.start()
+        player = game.players["p"]
+        player.health = int(batch.health[i])
+        player.items = [Item.construct_from_id(cards.items.types[j]) for j in batch.hand[:, i] if j >= 0]
+        game.deck.load([cards.monsters.types[batch.monster[i]]] * 3)
+        game.player_action("p", PlayerActionChoice.COMBAT)
+        game.player_select_monster("p", 0, PlayerCombatChoice.SELECT)
+
+        choice = CHOICES[batch.choice[i]]
+        if choice == PlayerCombatChoice.SPARE:
+            probe = random.Random()
+            probe.setstate(game._rng.getstate())
+            batch.roll[i] = probe.randint(1, 6)
+        game.player_select_monster("p", 0, choice)
+        if choice == PlayerCombatChoice.FIGHT:
+            for j in range(len(player.items)):
+                game.player_select_item("p", j)
+            game.player_select_monster("p", 0, choice)
+
+        outcome.won[i] = bool(player.captured_stars)
+        outcome.health[i] = player.health
+        outcome.coins[i] = player.coins
+        outcome.stars[i] = sum(player.captured_stars)
+    return outcome
+
+def validate(cards: CardArrays, combats: int, seed: int = 0) -> int:
+    '''plays sampled combats through GameState and returns how many resolve got wrong'''
+    batch = sample(cards, combats, np.random.default_rng(seed))
+    expected = play(cards, batch, seed)
+    got = resolve(cards, batch)
+    wrong = np.zeros(combats, dtype=bool)
+    for name in Outcome.__slots__:
+        wrong |= getattr(expected, name) != getattr(got, name)
+    return int(wrong.sum())
+
+
+@dataclass
+class Tally:
+    '''per card sums over resolved batches, for the win rate and economy tables'''
+    cards: CardArrays
+    combats: int = 0
+    by_monster: dict[str, np.ndarray] = field(default_factory=dict)
+    by_item: dict[str, np.ndarray] = field(default_factory=dict)
+
+    def add(self, batch: CombatBatch, outcome: Outcome):
+        monsters, items = len(self.cards.monsters), len(self.cards.items)
+        self.combats += len(batch)
+        # one bin per choice and monster
+        key = batch.choice.astype(np.intp) * monsters + batch.monster
+        count = lambda weights=None: np.bincount(key, weights, minlength=3 * monsters).reshape(3, monsters)
+        self._accumulate(self.by_monster, {
+            "combats": count(),
+            "won": count(outcome.won),
+            "coins": count(outcome.coins),
+            "health": count(batch.health - outcome.health),
+        })
+
+        # every item in hand is used up in a fight, won or not. Empty slots (-1) go to bin 0
+        fights = batch.choice == FIGHT
+        won, coins = outcome.won[fights], outcome.coins[fights]
+        sums = {"used": 0, "won": 0, "coins": 0}
+        for slot in batch.hand[:, fights] + 1:
+            sums["used"] = sums["used"] + np.bincount(slot, minlength=items + 1)
+            sums["won"] = sums["won"] + np.bincount(slot, won, minlength=items + 1)
+            sums["coins"] = sums["coins"] + np.bincount(slot, coins, minlength=items + 1)
+        self._accumulate(self.by_item, {name: value[1:] for name, value in sums.items()})
+
+    @staticmethod
+    def _accumulate(into: dict[str, np.ndarray], sums: dict[str, np.ndarray]):
+        for key, value in sums.items():
+            into[key] = into[key] + value if key in into else value.astype(np.float64)
+
+    def monster_rows(self) -> list[dict]:
+        s = self.by_monster
+        combats = np.maximum(s["combats"], 1)
+        won, coins, health = s["won"] / combats, s["coins"] / combats, s["health"] / combats
+        return [{
+            "monster": name,
+            "drawn": s["combats"][:, i].sum() / self.combats,
+            "fight_win": won[FIGHT, i],
+            "spare_win": won[SPARE, i],
+            "fight_coins": coins[FIGHT, i],
+            "spare_coins": coins[SPARE, i],
+            "flee_coins": coins[FLEE, i],
+            "fight_health": health[FIGHT, i],
+            "spare_health": health[SPARE, i],
+        } for i, name in enumerate(self.cards.monsters.types)]
+
+    def item_rows(self) -> list[dict]:
+        s = self.by_item
+        used = np.maximum(s["used"], 1)
+        return [{
+            "item": name,
+            "used": int(s["used"][i]),
+            "win": s["won"][i] / used[i],
+            "coins": s["coins"][i] / used[i],
+            "return": s["coins"][i] / used[i] / ITEM_PRICE,
+        } for i, name in enumerate(self.cards.items.types)]
+
+
+def sweep(cards: CardArrays, combats: int, seed: int = 0, chunk: int = 1 << 20) -> tuple[Tally, float]:
+    '''samples and resolves combats in chunks, returns their tally and the seconds spent resolving'''
+    rng = np.random.default_rng(seed)
+    tally = Tally(cards)
+    resolving = 0.0
+    for start in range(0, combats, chunk):
+        batch = sample(cards, min(chunk, combats - start), rng)
+        begin = time.perf_counter()
+        outcome = resolve(cards, batch)
+        resolving += time.perf_counter() - begin
+        tally.add(batch, outcome)
+    return tally, resolving
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--combats", type=int, default=5_000_000)
+    parser.add_argument("--ruleset", default=DEFAULT_RULESET, choices=list(RULESETS))
+    parser.add_argument("--validate", type=int, default=1000, help="combats to play through GameState first, 0 to skip")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cards = CardArrays.from_ruleset(RULESETS[args.ruleset])
+    if args.validate:
+        wrong = validate(cards, args.validate, args.seed)
+        print(f'validated against GameState: {wrong} of {args.validate} combats differ')
+        if wrong:
+            raise SystemExit(1)
+
+    start = time.perf_counter()
+    tally, resolving = sweep(cards, args.combats, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f'{args.combats} combats in {elapsed:.2f}s ({args.combats / elapsed:,.0f}/s), resolving alone {args.combats / resolving:,.0f}/s')
+
+    print(f'\n{"monster":<20} {"drawn":>6} {"fight":>6} {"spare":>6}  {"coins fight/spare/flee":>22}  {"health lost fight/spare":>23}')
+    for row in tally.monster_rows():
+        print(f'{row["monster"]:<20} {row["drawn"]:6.1%} {row["fight_win"]:6.1%} {row["spare_win"]:6.1%}  '
+              f'{row["fight_coins"]:6.2f} {row["spare_coins"]:6.2f} {row["flee_coins"]:6.2f}    {row["fight_health"]:10.2f} {row["spare_health"]:10.2f}')
+    print(f'\n{"item":<20} {"used":>10} {"win":>6} {"coins/use":>9} {"return":>7}')
+    for row in tally.item_rows():
+        print(f'{row["item"]:<20} {row["used"]:10d} {row["win"]:6.1%} {row["coins"]:9.2f} {row["return"]:7.2f}')
+
+
+if __name__ == "__main__":
+    main()
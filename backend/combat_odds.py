@@ -0,0 +1,56 @@
+"""
+Exact odds of fighting, sparing or fleeing a monster, for players weighing their choice during combat.
+
+The odds only depend on the monster card and its health, the player's health, the items in hand
+as a multiset and whether it is leftover combat, so they are memoized on exactly that and asking
+again during the same decision is a cache lookup. The arithmetic is GameState's: a fight uses every
+item in hand that targets monsters and is lost if the monster survives it, a spare is won on a d6
+roll of at least the monster's spare, and fleeing leftover combat only passes the monster on.
+"""
+import functools
+import api_wrapper
+from card_library import ITEM_TEMPLATES, MONSTER_TEMPLATES
+from item_effects import apply_effects
+
+
+ODDS_CACHE_SIZE = 4096
+SPARE_DIE = 6
+
+
+class _ScratchMonster:
+    '''what item effects see of a monster while the odds are worked out'''
+    __slots__ = ("health",)
+
+    def __init__(self, health: int):
+        self.health = health
+
+
+@functools.lru_cache(maxsize=ODDS_CACHE_SIZE)
+def combat_odds(monster: str, monster_health: int, player_health: int, hand: tuple[str, ...], leftover: bool) -> api_wrapper.CombatOdds:
+    '''
+    odds against the named monster with hand, a sorted tuple of item names.
+    Shared by every query with the same arguments, monster is -1 and must never be mutated
+    '''
+    template = MONSTER_TEMPLATES[monster]
+
+    target = _ScratchMonster(monster_health)
+    items = [ITEM_TEMPLATES[name] for name in hand]
+    apply_effects([item.effect for item in items if item.effect is not None and item.target_type == api_wrapper.ItemTarget.MONSTER], target)
+    # a lost fight costs what _deal_damage takes, a failed spare a point in spare_monster and then that
+    kill = 1.0 if target.health <= 0 else 0.0
+    fight = api_wrapper.ChoiceOdds(success=kill, coins=kill * template.fight_coins, stars=kill * template.stars,
+                                   health=(1 - kill) * -min(1, player_health))
+
+    spared = min(max(SPARE_DIE + 1 - template.spare, 0), SPARE_DIE) / SPARE_DIE
+    after_spare = player_health - 1
+    after_spare -= min(1, after_spare)
+    spare = api_wrapper.ChoiceOdds(success=spared, coins=spared * template.spare_coins, stars=spared * template.stars,
+                                   health=(1 - spared) * (after_spare - player_health))
+
+    flee = api_wrapper.ChoiceOdds(success=1.0, coins=0.0 if leftover else float(template.flee_coins), stars=0.0, health=0.0)
+    return api_wrapper.CombatOdds(monster=-1, fight=fight, spare=spare, flee=flee)
+
+@functools.lru_cache(maxsize=ODDS_CACHE_SIZE)
+def combat_odds_json(monster: str, monster_health: int, player_health: int, hand: tuple[str, ...], leftover: bool) -> dict:
+    '''combat_odds encoded for the wire, shared in the same way'''
+    return combat_odds(monster, monster_health, player_health, hand, leftover).model_dump(mode='json')
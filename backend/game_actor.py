@@ -0,0 +1,67 @@
+import asyncio
+from typing import Any, Callable
+from gamestate import GameState
+from app_logging import AppLogger
+
+
+type GameRequest = Callable[[GameState], Any]
+
+
+class GameActor:
+    '''
+    Owns a single GameState and applies requests to it one at a time from a mailbox, on its own task.
+    Requests are plain functions of the game so each one runs to completion without yielding,
+    which makes locking unnecessary. Submitting waits while the mailbox is full (backpressure).
+    '''
+    game: GameState
+    _mailbox: asyncio.Queue[tuple[GameRequest, asyncio.Future]]
+    _task: asyncio.Task | None
+    _logger: AppLogger
+
+    def __init__(self, game: GameState, mailbox_size: int = 64):
+        self.game = game
+        self._mailbox = asyncio.Queue(maxsize=mailbox_size)
+        self._task = None
+        self._logger = AppLogger(name=f'actor_{game._name}', color='gray')
+
+    def start(self) -> None:
+        '''starts draining the mailbox, must be called from a running event loop'''
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        '''stops the actor, pending requests fail with CancelledError'''
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._mailbox.empty():
+            _, future = self._mailbox.get_nowait()
+            future.cancel()
+
+    async def submit(self, request: GameRequest) -> Any:
+        '''queues request and waits for its result, raising whatever the request raised'''
+        future = asyncio.get_running_loop().create_future()
+        await self._mailbox.put((request, future))
+        return await future
+
+    def backlog(self) -> int:
+        '''number of requests waiting in the mailbox'''
+        return self._mailbox.qsize()
+
+    async def _run(self):
+        while True:
+            request, future = await self._mailbox.get()
+            if future.cancelled():
+                continue
+            try:
+                result = request(self.game)
+            except Exception as e:
+                self._logger.error(f'request failed: {e!r}')
+                future.set_exception(e)
+            else:
+                future.set_result(result)
@@ -0,0 +1,372 @@
+import os
+import json
+import socket
+import asyncio
+import bisect
+import hashlib
+import itertools
+import argparse
+import multiprocessing
+import socketio
+import httpx
+from typing import Any
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from app_logging import AppLogger
+
+
+# Runs game_manager sharded across worker processes. A gateway process owns the Socket.IO server and the
+# /internal routes, assigns every game_id to a worker with consistent hashing and forwards the events of each
+# connection and the requests for each game to the worker owning it. Workers send their emits back to the gateway,
+# which reports the load of all of them to the lobby as one server.
+# multiprocessing queues stand in for the message broker, so a cluster can be run locally:
+#   python game_cluster.py --workers 4
+
+CLUSTER_WORKERS = int(os.environ.get("GAME_CLUSTER_WORKERS", "2"))
+FORWARD_TIMEOUT = 5.0
+# the gateway heartbeats in place of its workers, with the settings a single game server would use
+ROOMS_API_URL = os.environ.get("LOBBY_API_URL", "http://localhost:5000")
+SERVER_ID = os.environ.get("GAME_SERVER_ID", socket.gethostname())
+SERVER_ADDRESS = os.environ.get("GAME_SERVER_ADDRESS", f"http://{socket.gethostname()}:5001")
+SERVER_PUBLIC_ADDRESS = os.environ.get("GAME_SERVER_PUBLIC_ADDRESS")
+HEARTBEAT_INTERVAL = float(os.environ.get("GAME_HEARTBEAT_INTERVAL", "5"))
+
+logger = AppLogger(name='game_cluster', color='cyan')
+
+
+class HashRing:
+    '''
+    Consistent hash ring mapping keys to nodes. Each node is placed at several virtual points
+    so keys spread evenly, and adding or removing a node only moves the keys next to its points.
+    '''
+    _points: list[int]
+    _owners: dict[int, str]
+
+    def __init__(self, nodes: list[str] | None = None, replicas: int = 64):
+        self.replicas = replicas
+        self._points = []
+        self._owners = {}
+        for node in nodes or []:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+    def add(self, node: str) -> None:
+        for i in range(self.replicas):
+            point = self._hash(f'{node}#{i}')
+            if point in self._owners:
+                continue
+            self._owners[point] = node
+            bisect.insort(self._points, point)
+
+    def remove(self, node: str) -> None:
+        self._points = [point for point in self._points if self._owners[point] != node]
+        self._owners = {point: owner for point, owner in self._owners.items() if owner != node}
+
+    def nodes(self) -> set[str]:
+        return set(self._owners.values())
+
+    def node_for(self, key: str) -> str:
+        if not self._points:
+            raise LookupError("hash ring has no nodes")
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[self._points[index]]
+
+
+class ShardSocketServer:
+    '''
+    Stand-in for the Socket.IO server inside a worker, everything sent through it
+    is put on the outbox and performed by the gateway on the real server.
+    '''
+    def __init__(self, outbox: Any):
+        self.outbox = outbox
+
+    async def emit(self, event: str, data: Any = None, to: str | None = None, skip_sid: str | None = None):
+        self.outbox.put(("emit", event, data, to, skip_sid))
+
+    async def enter_room(self, sid: str, room: str):
+        self.outbox.put(("enter_room", sid, room))
+
+    async def leave_room(self, sid: str, room: str):
+        self.outbox.put(("leave_room", sid, room))
+
+    async def disconnect(self, sid: str):
+        self.outbox.put(("disconnect", sid))
+
+
+# Worker
+
+async def _serve_worker(shard: str, inbox: Any, outbox: Any):
+    # workers are not reachable by the lobby on their own, the gateway heartbeats for all of them
+    os.environ["GAME_HEARTBEAT_INTERVAL"] = "0"
+    # the hash ring sends every game to the same shard again, so each shard keeps its own checkpoint
+    if os.environ.get("GAME_CHECKPOINT_PATH"):
+        os.environ["GAME_CHECKPOINT_PATH"] = f'{os.environ["GAME_CHECKPOINT_PATH"]}.{shard}'
+    import game_manager
+
+
+    handlers = game_manager.use_socket_server(ShardSocketServer(outbox))
+    loop = asyncio.get_running_loop()
+    tasks: set[asyncio.Task] = set()
+
+    async def create(game_id: str, body: dict):
+        response = await game_manager.create_game(game_id, game_manager.CreateGameRequest(**body))
+        return 201, response if isinstance(response, JSONResponse) else {**response, "shard": shard}
+
+    async def load():
+        return 200, {"games": len(game_manager.games), "connections": len(game_manager.connections)}
+
+    calls = {
+        "create": create,
+        "delete": lambda game_id: game_manager.delete_game(game_id),
+        "odds": lambda game_id, player_name, monster: game_manager.get_combat_odds(game_id, player_name, monster),
+        "load": load,
+    }
+
+    async def call(request_id: int, name: str, args: list):
+        '''runs a route of game_manager and replies with its status and body'''
+        status = 200
+        try:
+            response = await calls[name](*args)
+            if isinstance(response, tuple):
+                status, response = response
+            if isinstance(response, JSONResponse):
+                status, response = response.status_code, json.loads(response.body)
+            outbox.put(("reply", request_id, status, response))
+        except Exception as e:
+            logger.error(f'{shard} failed "{name}" {args}: {e!r}')
+            outbox.put(("reply", request_id, 500, {"response": "Failure"}))
+
+    async def dispatch(event: str, sid: str, data: Any):
+        handler = handlers.get(event)
+        if handler is None:
+            logger.warning(f'{shard} has no handler for "{event}"')
+            return
+        if event == 'disconnect':
+            await handler(sid)
+        else:
+            await handler(sid, data)
+
+    async with game_manager.lifespan(game_manager.fast_app):
+        logger.info(f'{shard} ready')
+        while True:
+            message = await loop.run_in_executor(None, inbox.get)
+            if message is None:
+                break
+            kind, *args = message
+            if kind == "event":
+                task = asyncio.create_task(dispatch(*args))
+            elif kind == "call":
+                task = asyncio.create_task(call(*args))
+            else:
+                logger.warning(f'{shard} dropped unknown message "{kind}"')
+                continue
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+
+def run_worker(shard: str, inbox: Any, outbox: Any):
+    '''entry point of a worker process, runs until None is put on its inbox'''
+    asyncio.run(_serve_worker(shard, inbox, outbox))
+
+
+# Gateway
+
+class ShardRouter:
+    '''
+    Gateway side of the cluster: starts the workers, routes game ids through the hash ring
+    and performs the socket operations workers send back.
+    '''
+    ring: HashRing
+    routes: dict[str, str] # sid -> shard
+    _inboxes: dict[str, Any]
+    _processes: dict[str, Any]
+    _replies: dict[int, asyncio.Future]
+
+    def __init__(self, workers: int, context: Any = None):
+        self.context = context or multiprocessing.get_context("spawn")
+        self.shards = [f'shard{i}' for i in range(workers)]
+        self.ring = HashRing(self.shards)
+        self.routes = {}
+        self.outbox = self.context.Queue()
+        self._inboxes = {}
+        self._processes = {}
+        self._replies = {}
+        self._request_ids = itertools.count()
+        self._pump_task = None
+
+    def start(self, server: Any) -> None:
+        '''starts the worker processes and the outbox pump, must be called from a running event loop'''
+        self.server = server
+        for shard in self.shards:
+            inbox = self.context.Queue()
+            process = self.context.Process(target=run_worker, args=(shard, inbox, self.outbox), name=shard, daemon=True)
+            process.start()
+            self._inboxes[shard] = inbox
+            self._processes[shard] = process
+        self._pump_task = asyncio.create_task(self._pump())
+        logger.info(f'started {len(self.shards)} workers')
+
+    async def stop(self) -> None:
+        for inbox in self._inboxes.values():
+            inbox.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self._processes.values():
+            await loop.run_in_executor(None, process.join, FORWARD_TIMEOUT)
+        self.outbox.put(None)
+        if self._pump_task is not None:
+            await self._pump_task
+
+    def shard_for(self, game_id: str) -> str:
+        return self.ring.node_for(game_id)
+
+    def forward_event(self, event: str, sid: str, data: Any) -> None:
+        '''sends a client event to the worker owning the connection, JOIN (re)binds the connection to a worker'''
+        if event == "JOIN" and isinstance(data, dict) and "game_id" in data:
+            self.routes[sid] = self.shard_for(str(data["game_id"]))
+        shard = self.routes.get(sid)
+        if shard is None:
+            logger.warning(f'dropped "{event}" from connection that has not joined a game')
+            return
+        self._inboxes[shard].put(("event", event, sid, data))
+
+    def forward_disconnect(self, sid: str) -> None:
+        shard = self.routes.pop(sid, None)
+        if shard is not None:
+            self._inboxes[shard].put(("event", "disconnect", sid, None))
+
+    async def call(self, shard: str, name: str, *args) -> tuple[int, Any]:
+        '''runs a game_manager route on a worker and waits for its status and body'''
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._replies[request_id] = future
+        self._inboxes[shard].put(("call", request_id, name, list(args)))
+        try:
+            return await asyncio.wait_for(future, FORWARD_TIMEOUT)
+        finally:
+            self._replies.pop(request_id, None)
+
+    async def request(self, game_id: str, name: str, *args) -> tuple[int, Any]:
+        '''forwards a request about a game to the worker owning it'''
+        return await self.call(self.shard_for(game_id), name, game_id, *args)
+
+    async def load(self) -> dict:
+        '''the games and connections of all workers, loop_lag is how long the slowest worker took to answer'''
+        loop = asyncio.get_running_loop()
+
+        async def timed(shard: str):
+            start = loop.time()
+            _, body = await self.call(shard, "load")
+            return body, loop.time() - start
+
+        replies = await asyncio.gather(*(timed(shard) for shard in self.shards))
+        return {
+            "games": sum(body["games"] for body, _ in replies),
+            "connections": sum(body["connections"] for body, _ in replies),
+            "loop_lag": max(lag for _, lag in replies),
+        }
+
+    async def _pump(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await loop.run_in_executor(None, self.outbox.get)
+            if message is None:
+                return
+            try:
+                await self._perform(message)
+            except Exception as e:
+                logger.error(f'failed to perform {message[0]}: {e!r}')
+
+    async def _perform(self, message: tuple):
+        kind, *args = message
+        if kind == "emit":
+            event, data, to, skip_sid = args
+            await self.server.emit(event, data, to=to, skip_sid=skip_sid)
+        elif kind == "enter_room":
+            await self.server.enter_room(*args)
+        elif kind == "leave_room":
+            await self.server.leave_room(*args)
+        elif kind == "disconnect":
+            await self.server.disconnect(*args)
+        elif kind == "reply":
+            request_id, status, body = args
+            future = self._replies.get(request_id)
+            if future is not None and not future.done():
+                future.set_result((status, body))
+
+
+async def heartbeat_loop(router: ShardRouter, http_client: httpx.AsyncClient):
+    '''reports the summed load of the workers to the lobby, the same way a single game server does'''
+    while True:
+        try:
+            load = await router.load()
+            response = await http_client.put(f"{ROOMS_API_URL}/servers/{SERVER_ID}",
+                                             json={"address": SERVER_ADDRESS, "public_address": SERVER_PUBLIC_ADDRESS, **load})
+            if response.status_code != 200:
+                logger.warning(f'heartbeat rejected by lobby: {response.status_code}')
+        except (httpx.HTTPError, TimeoutError) as e:
+            logger.warning(f'heartbeat failed: {e!r}')
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+
+def create_gateway(workers: int = CLUSTER_WORKERS) -> tuple[Any, ShardRouter]:
+    '''builds the gateway ASGI app in front of workers shards'''
+    router = ShardRouter(workers)
+    sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        router.start(sio)
+        http_client = httpx.AsyncClient(timeout=FORWARD_TIMEOUT)
+        heartbeat = asyncio.create_task(heartbeat_loop(router, http_client)) if HEARTBEAT_INTERVAL > 0 else None
+        yield
+        if heartbeat is not None:
+            heartbeat.cancel()
+        await http_client.aclose()
+        await router.stop()
+
+    fast_app = FastAPI(lifespan=lifespan)
+
+    @sio.on('connect')
+    async def connect(sid, environ):
+        logger.info("client connected")
+
+    @sio.on('disconnect')
+    async def disconnect(sid, *args):
+        router.forward_disconnect(sid)
+
+    @sio.on('*')
+    async def forward(event, sid, data=None):
+        router.forward_event(event, sid, data)
+
+    @fast_app.post("/internal/{game_id}", status_code=201)
+    async def create_game(game_id: str, data: dict):
+        status, body = await router.request(game_id, "create", data)
+        return JSONResponse(status_code=status, content=body)
+
+    @fast_app.delete("/internal/{game_id}")
+    async def delete_game(game_id: str):
+        status, body = await router.request(game_id, "delete")
+        return JSONResponse(status_code=status, content=body)
+
+    @fast_app.get("/internal/{game_id}/odds/{player_name}")
+    async def get_combat_odds(game_id: str, player_name: str, monster: int | None = None):
+        status, body = await router.request(game_id, "odds", player_name, monster)
+        return JSONResponse(status_code=status, content=body)
+
+    return socketio.ASGIApp(sio, other_asgi_app=fast_app), router
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="runs game_manager sharded across worker processes")
+    parser.add_argument("--workers", type=int, default=CLUSTER_WORKERS)
+    parser.add_argument("--port", type=int, default=5001)
+    args = parser.parse_args()
+
+    app, _ = create_gateway(args.workers)
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=args.port)
@@ -0,0 +1,92 @@
+import json
+import bisect
+from typing import Optional
+from game_meta import GameMetadata
+import api_wrapper as api
+
+
+class GameListCache:
+    """
+    Pre-serialized listing of games for GET /games.
+    Every game is encoded once when it changes, a query joins the encoded games that match it,
+    and each distinct query is memoized until the next change. The version changes on every change
+    and is used as ETag. Pages are ordered by creation, the cursor is the position of the last game returned.
+    """
+    MAX_RESPONSES = 1024
+
+    version : int
+    _encoded : dict[str, bytes]
+    _games : dict[str, tuple[int, api.GameStatus, int]] # id -> position, status, open seats
+    _order : list[int] # positions of listed games, ascending
+    _by_position : dict[int, str]
+    _responses : dict[tuple, tuple[bytes, Optional[int]]]
+
+    def __init__(self):
+        self.version = 0
+        self._next_position = 0
+        self._encoded = {}
+        self._games = {}
+        self._order = []
+        self._by_position = {}
+        self._responses = {}
+
+    def etag(self) -> str:
+        return f'"{self.version}"'
+
+    def put(self, game : GameMetadata):
+        """adds or refreshes game"""
+        if game.id in self._games:
+            position = self._games[game.id][0]
+        else:
+            position = self._next_position
+            self._next_position += 1
+            self._order.append(position)
+            self._by_position[position] = game.id
+        self._games[game.id] = (position, game.status, game.max_players - game.num_players)
+        self._encoded[game.id] = json.dumps(game.to_dict(), separators=(",", ":")).encode()
+        self._changed()
+
+    def remove(self, game_id : str):
+        if game_id not in self._games:
+            return
+        position = self._games.pop(game_id)[0]
+        del self._encoded[game_id]
+        del self._by_position[position]
+        self._order.pop(bisect.bisect_left(self._order, position))
+        self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self._responses.clear()
+
+    def query(self, status : Optional[api.GameStatus] = None, open_seats : int = 0, cursor : Optional[int] = None, limit : Optional[int] = None) -> tuple[bytes, Optional[int]]:
+        """
+        Returns the JSON array of matching games after cursor, at most limit of them,
+        and the cursor of the next page or None if this is the last one
+        """
+        key = (status, open_seats, cursor, limit)
+        if key in self._responses:
+            return self._responses[key]
+
+        start = 0 if cursor is None else bisect.bisect_right(self._order, cursor)
+        page : list[bytes] = []
+        next_cursor = None
+        last = cursor
+        for position in self._order[start:]:
+            game_id = self._by_position[position]
+            _, game_status, seats = self._games[game_id]
+            if status is not None and game_status != status:
+                continue
+            if seats < open_seats:
+                continue
+            if limit is not None and len(page) == limit:
+                next_cursor = last
+                break
+            page.append(self._encoded[game_id])
+            last = position
+
+        response = (b"[" + b",".join(page) + b"]", next_cursor)
+        if len(self._responses) >= self.MAX_RESPONSES:
+            self._responses.clear()
+        self._responses[key] = response
+        return response
@@ -1,23 +1,46 @@
 import os
+import socket
 import asyncio
 import socketio
 import httpx
+from typing import Callable, Any
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
-from gamestate import GameState, Item, Monster
+from gamestate import GameState, Item, Monster, ITEM_REQUEST, PLAYER_REQUEST
+from game_actor import GameActor
 from game_events import *
 from test import get_local_ip
 from api_wrapper import *
 from app_logging import AppLogger
 from db_utils import init_db, teardown_db
+from checkpoint import Checkpointer
+from card_library import RULESETS, DEFAULT_RULESET
 from contextlib import asynccontextmanager
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global http_client, checkpointer
     await init_db()
     print("Database initialized")
+    http_client = httpx.AsyncClient(timeout=HTTP_TIMEOUT)
+    checkpoints = None
+    if CHECKPOINT_PATH:
+        checkpointer = Checkpointer(CHECKPOINT_PATH)
+        await restore_games()
+        if CHECKPOINT_INTERVAL > 0:
+            checkpoints = asyncio.create_task(checkpoint_loop())
+    heartbeat = asyncio.create_task(heartbeat_loop()) if HEARTBEAT_INTERVAL > 0 else None
     yield
+    if heartbeat is not None:
+        heartbeat.cancel()
+    if checkpoints is not None:
+        checkpoints.cancel()
+    if checkpointer is not None:
+        await checkpointer.save(games)
+        checkpointer = None
+    await http_client.aclose()
+    http_client = None
     await teardown_db()
     print("Database connections closed")
 
@@ -32,75 +55,117 @@ logger = AppLogger(name='game_server', color='blue')
 
 ROOMS_API_URL = os.environ.get("LOBBY_API_URL", "http://localhost:5000")
 SERVER_NAME = "SERVER123"
-
-connections : dict[str, tuple[str, str]] = {} # player_name, game_id
+# identity reported to the lobby, which places new games on the least loaded server
+SERVER_ID = os.environ.get("GAME_SERVER_ID", socket.gethostname())
+SERVER_ADDRESS = os.environ.get("GAME_SERVER_ADDRESS", f"http://{socket.gethostname()}:5001")
+SERVER_PUBLIC_ADDRESS = os.environ.get("GAME_SERVER_PUBLIC_ADDRESS") # socket address for clients, None for the default one
+HEARTBEAT_INTERVAL = float(os.environ.get("GAME_HEARTBEAT_INTERVAL", "5"))
+# lobby status changes within this many seconds are sent together in one bulk update
+LOBBY_UPDATE_DELAY = float(os.environ.get("LOBBY_UPDATE_DELAY", "0.25"))
+HTTP_TIMEOUT = 5.0
+
+CHECKPOINT_PATH = os.environ.get("GAME_CHECKPOINT_PATH") # games are not checkpointed without one
+CHECKPOINT_INTERVAL = float(os.environ.get("GAME_CHECKPOINT_INTERVAL", "10"))
+# "locks": handlers share each game under an asyncio.Lock, "actor": each game is owned by a GameActor task
+GAME_EXECUTION_MODE = os.environ.get("GAME_EXECUTION_MODE", "locks")
+ACTOR_MAILBOX_SIZE = int(os.environ.get("GAME_ACTOR_MAILBOX_SIZE", "64"))
+
+connections : dict[str, PlayerSession] = {} # sid -> session
 games : dict[str, GameState] = {}
 game_locks : dict[str, asyncio.Lock] = {}
+game_actors : dict[str, GameActor] = {}
 games_lock = asyncio.Lock()
 connections_lock = asyncio.Lock()
+http_client : httpx.AsyncClient | None = None # shared keep-alive pool to the lobby, open while the app runs
+lobby_pending : set[str] = set() # games whose lobby status changed since the last update
+lobby_flush_task : asyncio.Task | None = None
+checkpointer : Checkpointer | None = None
 
-class GameSnapshot:
-    """Captures a snapshot of game state for differential comparison"""
-    def __init__(self, game: GameState):
-        self.players = {name: player.get_status_public() for name, player in game.players.items()}
-        self.turn = game.get_active_player()
-        self.turn_phase = game.turn_phase
-        self.board = game.get_status_board()
-        self.player_hands = {name: player.get_status_hand() for name, player in game.players.items()}
-        self.player_selected_items = {name: game.get_selected_fight_items(name).copy() for name in game.players.keys()}
-
-def differential_update(game_id: str, before: GameSnapshot, after: GameSnapshot):
+class PlayerSession:
     """
-    Compares before and after snapshots and emits only the necessary updates
+    Binds a socket connection to the names of its game and player, so requests can be dispatched without lookups or locks.
+    The game and player objects are looked up per request, they can be replaced by a restore or a rejoin.
+    Invalidated when the connection closes or the player joins again from another connection.
     """
-    changed_players = False
+    sid: str
+    player_name: str
+    game_id: str
+    valid: bool
 
-    for player_name in after.players:
-        if not changed_players and player_name not in before.players or before.players[player_name] != after.players[player_name]:
-            changed_players = True
+    def __init__(self, sid: str, player_name: str, game_id: str):
+        self.sid = sid
+        self.player_name = player_name
+        self.game_id = game_id
+        self.valid = True
 
-    for player_name in before.players:
-        if not changed_players and player_name not in after.players:
-            changed_players = True
+    def invalidate(self):
+        self.valid = False
 
-    if changed_players:
-        asyncio.create_task(update_game_players(game_id))
-    if before.turn != after.turn or before.turn_phase != after.turn_phase:
-        asyncio.create_task(update_game_turn(game_id))
-    if before.board != after.board:
-        asyncio.create_task(update_game_board(game_id))
-    for player_name in after.player_hands:
-        if (player_name not in before.player_hands) or (before.player_hands[player_name] != after.player_hands[player_name]) or (before.player_selected_items[player_name] != after.player_selected_items[player_name]):
-            asyncio.create_task(update_game_player_hand(game_id, player_name))
+class GameSnapshot:
+    """Captures the section versions of a game for differential comparison"""
+    def __init__(self, game: GameState):
+        self.players = game.get_players_version()
+        self.turn = game.get_turn_version()
+        self.board = game.get_board_version()
+        self.player_hands = {name: game.get_hand_version(name) for name in game.players.keys()}
 
-def with_differential_update(handler_func):
+def differential_update(game_id: str, game: GameState, before: GameSnapshot, after: GameSnapshot):
     """
-    Decorator that wraps action handlers to perform differential updates
-    Usage: @with_differential_update on any handler function
-
-    Apply BEFORE @fsf_api.event_handler decorator:
-        @with_differential_update
-        @fsf_api.event_handler(SomeRequest)
-        def HANDLER(data, sid):
-            ...
+    Compares before and after snapshot versions and emits only the sections that changed.
+    Must be called while owning the game, payloads are built from its current state.
     """
-    async def wrapper(data, sid):
-        _, game_id = await player_from_sid(sid)
-
-        async with game_locks[game_id]:
-            before = GameSnapshot(games[game_id])
-
-        result = await handler_func(data, sid)
+    if before.players != after.players:
+        update_game_players(game_id, game)
+    if before.turn != after.turn:
+        update_game_turn(game_id, game)
+    if before.board != after.board:
+        update_game_board(game_id, game)
+    for player_name, hand_version in after.player_hands.items():
+        if before.player_hands.get(player_name) != hand_version:
+            update_game_player_hand(game, player_name)
 
-        async with game_locks[game_id]:
-            after = GameSnapshot(games[game_id])
+async def run_in_game(game_id: str, request: Callable[[GameState], Any]) -> Any:
+    """
+    Runs request against the game while owning it and returns its result.
+    In "locks" mode the game lock is held for the call, in "actor" mode it is queued on the game's actor.
+    Raises GameNotFound when there is no such game, or it was removed before the request ran.
+    """
+    if GAME_EXECUTION_MODE == "actor":
+        actor = game_actors.get(game_id)
+        if actor is None:
+            raise GameNotFound(game_id)
+        try:
+            return await actor.submit(request)
+        except asyncio.CancelledError:
+            # remove_game stopping the actor cancels its queued requests, not the caller
+            if game_actors.get(game_id) is actor or asyncio.current_task().cancelling():
+                raise
+            raise GameNotFound(game_id) from None
+
+    lock = game_locks.get(game_id)
+    if lock is None:
+        raise GameNotFound(game_id)
+    async with lock:
+        game = games.get(game_id)
+        if game is None:
+            raise GameNotFound(game_id)
+        return request(game)
 
-        differential_update(game_id, before, after)
+async def apply_game_action(game_id: str, action: Callable[[GameState], Any], legal: Callable[[GameState], bool] | None = None) -> Any:
+    """
+    Applies action to the game and emits the differential update for it in one step,
+    so no other request can run between the before and after snapshots.
+    When legal says the action is not, it is dropped before any snapshot and None is returned
+    """
+    def step(game: GameState):
+        if legal is not None and not legal(game):
+            return None
+        before = GameSnapshot(game)
+        result = action(game)
+        differential_update(game_id, game, before, GameSnapshot(game))
         return result
 
-    # Preserve function name for event_handler decorator
-    wrapper.__name__ = handler_func.__name__
-    return wrapper
+    return await run_in_game(game_id, step)
 
 @sio.on('connect')
 async def test_connect(sid, environ):
@@ -120,231 +185,271 @@ async def JOIN(request_data: JoinRequest, sid):
         logger.error(f'player: "{player_name}" tried to game that does not exist', console=True)
         return
 
-    lock = game_locks[game_id]
-    players_snapshot = []
-    new_join = True
-    async with lock:
-        game = games[game_id]
-
-        # full
-        if len(game.players) == game._max_players:
-            await sio.disconnect(sid)
-            logger.info(f'player: "{player_name}" tried to join full game', console=True)
-            return
+    def join(game: GameState):
+        # full, seated players can always reconnect
+        if player_name not in game.players and len(game.players) == game._max_players:
+            return None
 
         # player already in game
-        if player_name in game.players:
-            old_sid = game.players[player_name]
-            await sio.disconnect(old_sid)
-            async with connections_lock:
-                if old_sid in connections:
-                    del connections[old_sid]
-            new_join = False
-
-        async with connections_lock:
-            connections[sid] = (player_name, game_id)
+        old_sid = game.players[player_name].sid if player_name in game.players else None
         game.add_player(player_name=player_name, sid=sid)
-        players_snapshot = game.get_status_players()
+        session = PlayerSession(sid, player_name, game_id)
 
         init_package = {
             "game_name": game._name,
             "game_owner": game._owner,
             "max_players": game._max_players,
-            "players": players_snapshot,
+            "players": game.get_status_players(encoded=True),
             "messages": [Message(player_name = SERVER_NAME, text= "Welcome to the game")],
             "status": game.status.name,
             "active_player": game.get_active_player(),
         }
+        return old_sid, session, init_package
 
-        if new_join:
-            logger.info(f'player: "{player_name}" joined game "{game._name}"', console=True)
-        else:
-            logger.info(f'player: "{player_name}" rejoined game "{game._name}"', console=True)
+    joined = await run_in_game(game_id, join)
+    if joined is None:
+        await sio.disconnect(sid)
+        logger.info(f'player: "{player_name}" tried to join full game', console=True)
+        return
 
+    old_sid, session, init_package = joined
+    players_snapshot = init_package["players"]
+    new_join = old_sid is None
+    async with connections_lock:
+        if old_sid in connections:
+            connections.pop(old_sid).invalidate()
+        connections[sid] = session
+    if not new_join:
+        await sio.disconnect(old_sid)
+
+    if new_join:
+        logger.info(f'player: "{player_name}" joined game "{init_package["game_name"]}"', console=True)
+    else:
+        logger.info(f'player: "{player_name}" rejoined game "{init_package["game_name"]}"', console=True)
 
     await sio.enter_room(sid, game_id)
     if new_join:
         message = Message(player_name=SERVER_NAME, text=f'{player_name} joined.')
         fsf_api.emit_chat_event(game_id, message=message, include_self=False)
         fsf_api.emit_players_event(game_id, players_snapshot)
-        asyncio.create_task(update_lobby_service(game_id))
+        schedule_lobby_update(game_id)
         fsf_api.emit_init_response(sid, **init_package)
 
         
 
 @fsf_api.event_handler(LobbyReadyRequest)
 async def LOBBY_READY(request_data: LobbyReadyRequest, sid):
-    player_name, game_id = await player_from_sid(sid)
+    session = session_from_sid(sid)
+    if session is None:
+        return
+    player_name, game_id = session.player_name, session.game_id
 
     ready = request_data.ready
-    lock = game_locks[game_id]
-    async with lock:
-        player = games[game_id].players[player_name]
-        player.lobby_ready = ready
-        players_snapshot = games[game_id].get_status_players() 
-        logger.info(f'player "{player.name}" became {"ready" if ready else "unready"} in game "{games[game_id]._name}"', console=True)
+
+    def set_ready(game: GameState):
+        game.set_player_lobby_ready(player_name, ready)
+        return game.get_status_players(encoded=True), game._name
+
+    players_snapshot, game_name = await run_in_game(game_id, set_ready)
+    logger.info(f'player "{player_name}" became {"ready" if ready else "unready"} in game "{game_name}"', console=True)
     
     fsf_api.emit_players_event(game_id, players_snapshot)
 
 @fsf_api.event_handler(StartGameRequest)
 async def START_GAME(data: StartGameRequest, sid):
-    player_name, game_id = await player_from_sid(sid)
+    session = session_from_sid(sid)
+    if session is None:
+        return
+    player_name, game_id = session.player_name, session.game_id
 
-    async with game_locks[game_id]:
-        game_snapshot = games[game_id]
-    
-        if game_snapshot._owner != player_name:
-            logger.error(f'player {player_name} tried to start game: {game_snapshot._name} but they are not the owner.', console=True)
-            fsf_api.emit_chat_event(game_id, Message(player_name=SERVER_NAME, text=f'{player_name} tried to hack.'),include_self=False) 
-            return
+    game_name, owner, all_ready = await run_in_game(game_id, lambda game: (
+        game._name,
+        game._owner,
+        all([player.lobby_ready for player in game.players.values()]),
+    ))
 
-        if not all([player.lobby_ready for player in game_snapshot.players.values()]):
-            logger.info(f'player {player_name} tried to start game: {game_snapshot._name} but not all players are ready.', console=True)
-            fsf_api.emit_chat_event(game_id, Message(player_name=SERVER_NAME, text=f'Not all players are ready'),include_self=False) 
-            return
+    if owner != player_name:
+        logger.error(f'player {player_name} tried to start game: {game_name} but they are not the owner.', console=True)
+        fsf_api.emit_chat_event(game_id, Message(player_name=SERVER_NAME, text=f'{player_name} tried to hack.'),include_self=False) 
+        return
+
+    if not all_ready:
+        logger.info(f'player {player_name} tried to start game: {game_name} but not all players are ready.', console=True)
+        fsf_api.emit_chat_event(game_id, Message(player_name=SERVER_NAME, text=f'Not all players are ready'),include_self=False) 
+        return
     
-    logger.info(f'game "{game_snapshot._name}" starting')
+    logger.info(f'game "{game_name}" starting')
     fsf_api.emit_chat_event(game_id, Message(player_name=SERVER_NAME, text=f'Starting game...'),include_self=False)
     asyncio.create_task(start_game(game_id))
     
 
 @fsf_api.event_handler(ChatRequest)
 async def CHAT(data: ChatRequest, sid):
-    player_name, game_id = await player_from_sid(sid)
+    session = session_from_sid(sid)
+    if session is None:
+        return
+    player_name, game_id = session.player_name, session.game_id
     fsf_api.emit_chat_event(game_id, Message(player_name=player_name, text=data.text))
     logger.info(f'player "{player_name}" sent a message "{data.text}"')
 
      
 
 @fsf_api.event_handler(ActionRequest)
-@with_differential_update
 async def ACTION(data: ActionRequest, sid):
-    player_name, game_id = await player_from_sid(sid)
+    session = session_from_sid(sid)
+    if session is None:
+        return
+    player_name, game_id = session.player_name, session.game_id
     logger.info(f'recieved action request from game {player_name}')
-    async with game_locks[game_id]:
-        game = games[game_id]
-        game.player_action(player=player_name, action=data.choice)
+    await apply_game_action(game_id, lambda game: game.player_action(player=player_name, action=data.choice),
+                            legal=lambda game: game.is_legal(player_name, data.choice))
 
 
 @fsf_api.event_handler(CombatRequest)
-@with_differential_update
 async def COMBAT(data: CombatRequest, sid):
-    player_name, game_id = await player_from_sid(sid)
+    session = session_from_sid(sid)
+    if session is None:
+        return
+    player_name, game_id = session.player_name, session.game_id
     logger.info(f'recieved combat action from game {player_name}: {data}')
-    async with game_locks[game_id]:
-        game = games[game_id]
-        game.player_select_monster(player=player_name, choice=data.target, combat_action=data.combat)
+    await apply_game_action(game_id, lambda game: game.player_select_monster(player=player_name, choice=data.target, combat_action=data.combat),
+                            legal=lambda game: game.is_legal(player_name, data.combat, data.target))
 
 
 @fsf_api.event_handler(ItemChoiceRequest)
-@with_differential_update
 async def ITEM_CHOICE(data: ItemChoiceRequest, sid):
-    player_name, game_id = await player_from_sid(sid)
+    session = session_from_sid(sid)
+    if session is None:
+        return
+    player_name, game_id = session.player_name, session.game_id
     logger.info(f'recieved item selection from game {player_name}: {data}')
-    async with game_locks[game_id]:
-        game = games[game_id]
-        game.player_select_item(player=player_name, choice=data.item)
+    await apply_game_action(game_id, lambda game: game.player_select_item(player=player_name, choice=data.item),
+                            legal=lambda game: game.is_legal(player_name, ITEM_REQUEST, data.item))
 
 
 @fsf_api.event_handler(PlayerChoiceRequest)
-@with_differential_update
 async def PLAYER_CHOICE(data: PlayerChoiceRequest, sid):
-    player_name, game_id = await player_from_sid(sid)
+    session = session_from_sid(sid)
+    if session is None:
+        return
+    player_name, game_id = session.player_name, session.game_id
     logger.info(f'recieved player selection from game {player_name}')
-    async with game_locks[game_id]:
-        game = games[game_id]
-        game.player_select_player(player=player_name, choice=data.player)
+    await apply_game_action(game_id, lambda game: game.player_select_player(player=player_name, choice=data.player),
+                            legal=lambda game: game.is_legal(player_name, PLAYER_REQUEST, data.player))
     
 
-async def cleanup_disconnect(sid):
-    player_leave = False
-    player_name, game_id = "LOCK_WARNING", "LOCK_WARNING"
-    players_snapshot = []
+@fsf_api.event_handler(CompoundRequest)
+async def COMPOUND(data: CompoundRequest, sid):
+    session = session_from_sid(sid)
+    if session is None:
+        return
+    player_name, game_id = session.player_name, session.game_id
+    logger.info(f'recieved {len(data.steps)} step compound request from game {player_name}')
+    played = await apply_game_action(game_id, lambda game: game.play_steps(player_name, data.steps),
+                                     legal=lambda game: game.is_legal_step(player_name, data.steps[0]))
+    if played != len(data.steps):
+        logger.warning(f'player "{player_name}" sent a compound request with illegal step {played or 0}: {data.steps[played or 0]}')
+
+
+@fsf_api.event_handler(OddsRequest)
+async def ODDS(data: OddsRequest, sid):
+    session = session_from_sid(sid)
+    if session is None:
+        return
+    player_name, game_id = session.player_name, session.game_id
+    odds = await run_in_game(game_id, lambda game: game.get_combat_odds(player_name, data.monster, encoded=True))
+    if odds is None:
+        logger.warning(f'player "{player_name}" asked for odds without a monster to fight')
+        return
+    fsf_api.emit_odds_event(sid, odds)
+
+
+@fsf_api.event_handler(ResyncRequest)
+async def RESYNC(data: ResyncRequest, sid):
+    session = session_from_sid(sid)
+    if session is None:
+        return
+    player_name, game_id = session.player_name, session.game_id
+    logger.info(f'player "{player_name}" requested resync of {data.sections}')
+    fsf_api.emit_resync(sid, source=game_id, sections=data.sections)
     
+
+async def cleanup_disconnect(sid):
     async with connections_lock:
-        if sid in connections:
-            player_name, game_id = connections[sid]
-            del connections[sid]
-            player_leave = True
-        else: 
-            player_leave = False
+        session = connections.pop(sid, None)
     
-    if player_leave and game_id in games:
-        async with game_locks[game_id]:
-            game = games[game_id]
+    if session is not None:
+        session.invalidate()
+        fsf_api.forget(sid)
+
+    if session is not None and session.game_id in games:
+        player_name, game_id = session.player_name, session.game_id
+        def leave(game: GameState):
             if player_name in game.players:
                 game.remove_player(player_name)
-            players_snapshot = game.get_status_players()
-            game_name = game._name
-        asyncio.create_task(update_lobby_service(game_id))
+            return game.get_status_players(encoded=True), game._name
+
+        try:
+            players_snapshot, game_name = await run_in_game(game_id, leave)
+        except GameNotFound:
+            return
+        schedule_lobby_update(game_id)
         fsf_api.emit_chat_event(game_id, Message(player_name=SERVER_NAME, text=f'{player_name} left.'))
         fsf_api.emit_players_event(game_id, players_snapshot)
         logger.info(f'player "{player_name}" left game "{game_name}"')
 
 
 async def start_game(game_id):
-    async with game_locks[game_id]:
-        game = games[game_id]
+    def start(game: GameState):
         game.start()
-        first_player = game.get_active_player()
+        update_game_turn(game_id, game)
+        return game.get_active_player()
+
+    first_player = await run_in_game(game_id, start)
     fsf_api.emit_start_game_event(game_id, first_player)
 
-async def update_game_players(game_id: str):
-    async with game_locks[game_id]:
-        game = games[game_id]
-        game_name = game._name
-        player_snapshot = game.get_status_players()
-    
+def update_game_players(game_id: str, game: GameState):
+    player_snapshot = game.get_status_players(encoded=True)
     fsf_api.emit_players_event(game_id, players=player_snapshot)
-    logger.info(f'updating players in game {game_name}, {player_snapshot}')
+    logger.info(f'updating players in game {game._name}, {player_snapshot}')
 
-async def update_game_board(game_id: str):
-    async with game_locks[game_id]:
-        game = games[game_id]
-        game_name = game._name
-        board_snapshot = game.get_status_board()
-    
+def update_game_board(game_id: str, game: GameState):
+    board_snapshot = game.get_status_board(encoded=True)
     fsf_api.emit_board_event(game_id, **board_snapshot)
-    logger.info(f'updating board in game {game_name}, {board_snapshot}')
+    logger.info(f'updating board in game {game._name}, {board_snapshot}')
 
-async def update_game_player_hand(game_id: str, player: str):
-    async with game_locks[game_id]:
-        game = games[game_id]
-        game_name = game._name
-        player_sid = game.players[player].sid
-        hand_snapshot = game.players[player].get_status_hand()
-        selected_items = game.get_selected_fight_items(player)
-
-    
+def update_game_player_hand(game: GameState, player: str):
+    player_sid = game.players[player].sid
+    hand_snapshot = game.players[player].get_status_hand(encoded=True)
+    selected_items = game.get_selected_fight_items(player).copy()
     fsf_api.emit_hand_event(player_sid, hand_snapshot, selected_items)
-    logger.info(f'updating {player}\'s hand in game {game_name}, {hand_snapshot}, {selected_items}')
-
-async def update_game_turn(game_id: str):
-    async with game_locks[game_id]:
-        game = games[game_id]
-        game_name = game._name
-        active = game.get_active_player()
-        phase = game.turn_phase
-    
-    fsf_api.emit_turn_event(game_id, active=active, phase=phase)
-    logger.info(f'updating turn info in game {game_name}, {active} {phase}')
+    logger.info(f'updating {player}\'s hand in game {game._name}, {hand_snapshot}, {selected_items}')
+
+def update_game_turn(game_id: str, game: GameState):
+    active = game.get_active_player()
+    phase = game.turn_phase
+    legal = game.legal_actions(active, encoded=True) if active is not None else None
+    fsf_api.emit_turn_event(game_id, active=active, phase=phase, legal=legal)
+    logger.info(f'updating turn info in game {game._name}, {active} {phase}')
 
 async def on_coins_event(event: CoinsEvent):
     logger.info("sending coins animation")
     game_id = event.game_id
-    async with game_locks[game_id]:
-        game = games[game_id]
-        player_sid = game.players[event.player].sid
+    try:
+        player_sid = await run_in_game(game_id, lambda game: game.players[event.player].sid)
+    except GameNotFound:
+        return
     anim = Animation(content=CoinAnimContent(), source="coins", destination="player")
     fsf_api.emit_anim_event(to=player_sid, animation=anim)
 
 async def on_shop_event(event: ShopEvent):
     logger.info("sending item shop animation")
     game_id = event.game_id
-    async with game_locks[game_id]:
-        game = games[game_id]
-        destination_id = event.item_uid
-        player_sid = game.players[event.player_name].sid
+    destination_id = event.item_uid
+    try:
+        player_sid = await run_in_game(game_id, lambda game: game.players[event.player_name].sid)
+    except GameNotFound:
+        return
     item_info = Item.info_from_id(event.item_id)
     anim = Animation(content=ItemAnimContent(item=item_info, style="draw"), source="shop", destination=HandLocation(id=destination_id))
     fsf_api.emit_anim_event(to=player_sid, animation=anim)
@@ -363,60 +468,174 @@ class CreateGameRequest(BaseModel):
     name: str
     owner: str
     max_players: int
+    ruleset: str = DEFAULT_RULESET
 
 @fast_app.post("/internal/{game_id}", status_code=201)
 async def create_game(game_id, data: CreateGameRequest):
+    if data.ruleset not in RULESETS:
+        return JSONResponse({"error": f'Unknown ruleset "{data.ruleset}"'}, 400)
 
-    new_game = GameState(game_id, data.name, data.owner, data.max_players)
-
-    new_game._event_bus.subscribe(event_type="shop", callback=on_shop_event)
-    new_game._event_bus.subscribe(event_type="coins", callback=on_coins_event)
-    new_game._event_bus.subscribe(event_type="combat", callback=on_combat_event)
-
-    async with games_lock:
-        games[game_id] = new_game
-        game_locks[game_id] = asyncio.Lock()
+    new_game = GameState(game_id, data.name, data.owner, data.max_players, ruleset=data.ruleset)
+    await add_game(new_game)
 
     logger.info(f'"{new_game._owner}" created game: "{new_game._name}" with id: "{new_game._id}"')
     return {"response": "Success"}
 
-async def player_from_sid(sid: Any):
-    async with connections_lock:
-        if sid not in connections:
-            logger.warning("tried to decode invalid sid")
-            return
-        player_name, game_id = connections[sid]
+@fast_app.get("/internal/{game_id}/odds/{player_name}")
+async def get_combat_odds(game_id: str, player_name: str, monster: int | None = None):
+    try:
+        odds = await run_in_game(game_id, lambda game: game.get_combat_odds(player_name, monster, encoded=True))
+    except GameNotFound:
+        return JSONResponse({"error": "Game not found"}, 404)
+    if odds is None:
+        return JSONResponse({"error": "No monster to fight"}, 404)
+    return odds
+
+@fast_app.delete("/internal/{game_id}")
+async def delete_game(game_id: str):
+    if not await remove_game(game_id):
+        return JSONResponse({"error": "Game not found"}, 404)
+    logger.info(f'deleted game with id: "{game_id}"')
+    return {"response": "Success"}
+
+async def add_game(game: GameState):
+    """Hooks the game up to the server and starts serving it"""
+    game._event_bus.subscribe(event_type="shop", callback=on_shop_event)
+    game._event_bus.subscribe(event_type="coins", callback=on_coins_event)
+    game._event_bus.subscribe(event_type="combat", callback=on_combat_event)
 
     async with games_lock:
-        if game_id not in games:
-            raise IndexError("Game associated with sid does not exist or was deleted")
-        
-    async with game_locks[game_id]:
-        if player_name not in games[game_id].players:
-            raise IndexError("Player name associated with sid does not exist or was deleted")
+        games[game._id] = game
+        if GAME_EXECUTION_MODE == "actor":
+            game_actors[game._id] = GameActor(game, mailbox_size=ACTOR_MAILBOX_SIZE)
+            game_actors[game._id].start()
+        else:
+            game_locks[game._id] = asyncio.Lock()
 
-    return player_name, game_id
+async def remove_game(game_id: str) -> bool:
+    """Stops serving a game and drops everything kept for it, returns False if there is no such game"""
+    async with games_lock:
+        game = games.pop(game_id, None)
+        game_locks.pop(game_id, None)
+        actor = game_actors.pop(game_id, None)
+    if game is None:
+        return False
+    if actor is not None:
+        await actor.stop()
 
-async def update_lobby_service(id):
+    async with connections_lock:
+        for sid in [sid for sid, session in connections.items() if session.game_id == game_id]:
+            connections.pop(sid).invalidate()
+            fsf_api.forget(sid)
+    fsf_api.forget(game_id)
+    return True
 
-    if id not in game_locks or id not in games:
-        logger.error("tried to send update to lobby for game that does not exist", console=True)
-        return
+def use_socket_server(server: Any) -> dict[str, Callable]:
+    """
+    Sends all socket traffic of this module through server instead of the local Socket.IO server, used by cluster workers.
+    Returns the registered event handlers so the caller can dispatch incoming events to them.
+    """
+    global sio
+    handlers = dict(sio.handlers.get('/', {}))
+    sio = server
+    fsf_api.server = server
+    return handlers
+
+def session_from_sid(sid: str) -> PlayerSession | None:
+    """Returns the session of a connection in O(1) without taking any locks, None if it has none"""
+    session = connections.get(sid)
+    if session is None or not session.valid:
+        logger.warning("tried to decode invalid sid")
+        return None
+    return session
+
+
+def schedule_lobby_update(game_id: str):
+    """Marks the lobby status of game as changed, it is sent with all other changes after LOBBY_UPDATE_DELAY"""
+    global lobby_flush_task
+    lobby_pending.add(game_id)
+    if lobby_flush_task is None or lobby_flush_task.done():
+        lobby_flush_task = asyncio.create_task(flush_lobby_updates())
+
+async def flush_lobby_updates():
+    """Sends the current status of every changed game to the lobby in one bulk request, until none are left"""
+    while lobby_pending:
+        await asyncio.sleep(LOBBY_UPDATE_DELAY)
+        game_ids = list(lobby_pending)
+        lobby_pending.clear()
+
+        updates = []
+        for game_id in game_ids:
+            # the game can be removed while earlier ones are read
+            try:
+                status = await run_in_game(game_id, lambda game: game.get_status_lobby())
+            except GameNotFound:
+                logger.error("tried to send update to lobby for game that does not exist", console=True)
+                continue
+            updates.append({"id": game_id, **status})
+
+        if not updates:
+            continue
+        if http_client is None:
+            logger.error(f'no lobby connection, dropped {len(updates)} game updates')
+            continue
+        try:
+            response = await http_client.put(f"{ROOMS_API_URL}/games", json=updates)
+        except httpx.HTTPError as e:
+            logger.error(f'failed to update {len(updates)} games: {e!r}')
+            continue
+
+        if response.status_code != 200:
+            logger.error(f'failed to update {len(updates)} games: {response.status_code}')
+        else:
+            logger.info(f'updated games {updates}', console=True)
 
-    async with game_locks[id]:
-        status = games[id].get_status_lobby()
-        name = games[id]._name
 
-    async with httpx.AsyncClient() as client:
-        response = await client.put(
-            f"{ROOMS_API_URL}/games/{id}",
-            json=status,
-        )
+async def restore_games():
+    """Serves the games of the last checkpoint again, their players get their seats back when they rejoin"""
+    try:
+        restored = checkpointer.load()
+    except (OSError, ValueError, EOFError, TypeError, KeyError) as e:
+        logger.error(f'could not restore games from "{CHECKPOINT_PATH}": {e!r}', console=True)
+        return
+    for game in restored:
+        await add_game(game)
+        schedule_lobby_update(game._id)
+    if restored:
+        logger.info(f'restored {len(restored)} games from "{CHECKPOINT_PATH}"', console=True)
+
+async def checkpoint_loop():
+    """Checkpoints every game every CHECKPOINT_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(CHECKPOINT_INTERVAL)
+        try:
+            await checkpointer.save(games)
+        except OSError as e:
+            logger.error(f'checkpoint to "{CHECKPOINT_PATH}" failed: {e!r}')
+
+async def heartbeat_loop():
+    """Reports live games, connections and event loop lag to the lobby, lag is how late the loop wakes up from a sleep"""
+    loop = asyncio.get_running_loop()
+    loop_lag = 0.0
+    while http_client is not None:
+        load = {
+            "address": SERVER_ADDRESS,
+            "public_address": SERVER_PUBLIC_ADDRESS,
+            "games": len(games),
+            "connections": len(connections),
+            "loop_lag": loop_lag,
+        }
+        try:
+            response = await http_client.put(f"{ROOMS_API_URL}/servers/{SERVER_ID}", json=load)
+            if response.status_code != 200:
+                logger.warning(f'heartbeat rejected by lobby: {response.status_code}')
+        except httpx.HTTPError as e:
+            logger.warning(f'heartbeat failed: {e!r}')
+
+        start = loop.time()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        loop_lag = max(0.0, loop.time() - start - HEARTBEAT_INTERVAL)
 
-    if response.status_code != 200:
-        logger.error(f'failed to update game "{name}": {response.status_code}')
-    else:
-        logger.info(f'updated game "{name}" to {status}', console=True)
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 import uuid
+from typing import Optional
 import api_wrapper as api
 
 class GameMetadata:
@@ -10,19 +11,22 @@ class GameMetadata:
     owner : str
     num_players : int
     max_players : int
+    ruleset : str
     status : api.GameStatus
-    ws : str
+    ws : Optional[str] # socket address of the game server hosting it, None for the default one
 
 
 
 
-    def __init__(self, name : str, owner : str, max_players : int =4):
+    def __init__(self, name : str, owner : str, max_players : int =4, ruleset : str ="default"):
         self.id = str(uuid.uuid4())
         self.name = name
         self.owner = owner
         self.num_players = 0
         self.max_players = max_players
+        self.ruleset = ruleset
         self.status = api.GameStatus.LOBBY
+        self.ws = None
 
 
     def to_dict(self):
@@ -33,13 +37,16 @@ class GameMetadata:
             "status": self.status.name,
             "num_players": self.num_players,
             "max_players": self.max_players,
+            "ws": self.ws,
         }
     
+
     def to_setup(self):
         return {
             "name": self.name,
             "owner": self.owner,
             "max_players": self.max_players,
+            "ruleset": self.ruleset,
         }
 
     def add_player(self, player_name):
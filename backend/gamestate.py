@@ -1,4 +1,4 @@
-from typing import Literal, get_args, Callable, Any
+from typing import Literal, get_args, Callable, Any, Mapping
 import warnings
 from enum import Enum, auto
 import random
@@ -6,116 +6,212 @@ import os
 import api_wrapper
 from warnings import deprecated
 import yaml
-from item_effects import EFFECT_REGISTRY, ITEM_REGISTRY, MONSTER_REGISTRY
-from app_logging import AppLogger
+from card_library import ItemTemplate, MonsterTemplate, ITEM_TEMPLATES, MONSTER_TEMPLATES, RULESETS, DEFAULT_RULESET, card_table
+from card_pile import CardPile
+from combat_odds import combat_odds, combat_odds_json
+from item_effects import Effect, apply_effects
+from app_logging import AppLogger, NullLogger
 from game_events import *
 import uuid
+import functools
+
+_version_clock = 0
+
+def next_version() -> int:
+    '''returns a state version greater than every version handed out before it'''
+    global _version_clock
+    _version_clock += 1
+    return _version_clock
+
+def last_version() -> int:
+    '''returns the last version handed out, it only moves when some state changes'''
+    return _version_clock
+
+
+# action log opcodes, one per logged GameState method
+LOG_JOIN, LOG_LEAVE, LOG_READY, LOG_START, LOG_ACTION, LOG_ITEM, LOG_MONSTER, LOG_PLAYER = range(8)
+
+def logged_action(opcode: int):
+    '''
+    Appends calls of the decorated GameState method that changed the game to its action log,
+    as (opcode, *arguments) with enums stored by value. Game methods run without yielding,
+    so the game changed exactly when the version clock moved during the call.
+    '''
+    def decorator(method):
+        names = method.__code__.co_varnames[1:method.__code__.co_argcount]
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            before = last_version()
+            result = method(self, *args, **kwargs)
+            if last_version() != before:
+                values = args + tuple(kwargs[name] for name in names[len(args):])
+                self.action_log.append((opcode, *(v.value if isinstance(v, Enum) else v for v in values)))
+            return result
+        return wrapper
+    return decorator
+
+
+# requests besides the action and combat choices: player_select_item and player_select_player
+ITEM_REQUEST, PLAYER_REQUEST = "ITEM", "PLAYER"
+type TurnRequest = api_wrapper.PlayerActionChoice | api_wrapper.PlayerCombatChoice | Literal["ITEM", "PLAYER"]
+
+_A, _C = api_wrapper.PlayerActionChoice, api_wrapper.PlayerCombatChoice
+# The turn phase state machine: for each phase, the GameState handler taking each request it accepts.
+# Declared once and compiled into GameState._transitions, every other request is rejected before any work
+TURN_PHASES: dict[api_wrapper.TurnPhase, dict[str, tuple[TurnRequest, ...]]] = {
+    api_wrapper.TurnPhase.CHOOSING_ACTION: {"_state_choosing_action": (_A.COINS, _A.SHOP, _A.HEALTH, _A.COMBAT), "_state_ending_turn": (_A.END,)},
+    api_wrapper.TurnPhase.SHOPPING: {"_state_shopping": (_A.SHOP, _A.HEALTH), "_state_ending_turn": (_A.END,)},
+    api_wrapper.TurnPhase.FLED: {"_state_fled": (_A.SHOP, _A.HEALTH, _C.SELECT), "_state_ending_turn": (_A.END,)},
+    api_wrapper.TurnPhase.COMBAT_SELECT: {"_state_combat_select": (_C.SELECT,)},
+    api_wrapper.TurnPhase.COMBAT_ACTION: {"_state_combat_action": (_C.FIGHT, _C.SPARE, _C.FLEE)},
+    api_wrapper.TurnPhase.COMBAT_FIGHT: {"_state_combat_fight": (_C.FIGHT, ITEM_REQUEST)},
+    api_wrapper.TurnPhase.PVP: {"_state_pvp": (ITEM_REQUEST, PLAYER_REQUEST)},
+    api_wrapper.TurnPhase.TURN_ENDED: {},
+}
 
 
 class Item:
+    __slots__ = ("id", "template", "_status_json")
     id: int
-    name: str
-    text: str
-    target_type: api_wrapper.ItemTarget = api_wrapper.ItemTarget.NONE
-    effect: Callable[[Any], Any] = None
-    params: dict[str, Any] = None
+    template: ItemTemplate # static card data shared by every item of this type
+    _status_json: dict | None
 
     next_id = 0
 
 
-    def __init__(self, name: str = "", data: dict = None):
-        self.name = name
+    def __init__(self, template: ItemTemplate):
+        self.template = template
         self.id = Item.next_id
         Item.next_id += 1
-        if not data:
-            self.text = ""
-        else:
-            self.text = data["text"]
-            
-            if "effect" in data:
-                target, effect = EFFECT_REGISTRY[data["effect"]["id"]]
-                self.effect = effect
-                self.params = data["effect"]["params"]
-                self.target_type = target
+        self._status_json = None
+
+    @property
+    def name(self) -> str:
+        return self.template.name
+
+    @property
+    def text(self) -> str:
+        return self.template.text
+
+    @property
+    def target_type(self) -> api_wrapper.ItemTarget:
+        return self.template.target_type
+
+    @property
+    def effect(self) -> Effect | None:
+        return self.template.effect
     
     @staticmethod
     def construct_from_id(id: str) -> Item:
-        if id not in ITEM_REGISTRY.keys():
+        if id not in ITEM_TEMPLATES:
             raise KeyError(f"Item {id} does not exit")
-        cur_item: dict = ITEM_REGISTRY[id]
-        return Item(name=id, data=cur_item)
+        return Item(ITEM_TEMPLATES[id])
     
     @staticmethod
     def info_from_id(id: str) -> api_wrapper.ItemInfo:
-        if id not in ITEM_REGISTRY.keys():
+        '''the ItemInfo every item of this type shares, with id -1, never mutate it'''
+        if id not in ITEM_TEMPLATES:
             raise KeyError(f"Item {id} does not exit")
-        data: dict = ITEM_REGISTRY[id]
-        if "effect" in data:
-            target, _ = EFFECT_REGISTRY[data["effect"]["id"]]
-        else:
-            target = api_wrapper.ItemTarget.NONE
-            
-        return api_wrapper.ItemInfo(id=-1, name=id, text=data["text"], target_type=target)
+        return ITEM_TEMPLATES[id].info
 
 
-    def activate(self, target: Player | Monster | Item | None = None):
-        type_mapping = {
-            api_wrapper.ItemTarget.PLAYER: Player,
-            api_wrapper.ItemTarget.MONSTER: Monster,
-            api_wrapper.ItemTarget.ITEM: Item,
-            api_wrapper.ItemTarget.NONE: type(None)
-        }
-
-        if not isinstance(target, type_mapping[self.target_type]):
+    def check_target(self, target: Player | Monster | Item | None):
+        if not isinstance(target, _TARGET_CLASSES[self.template.target_type]):
             raise TypeError(
                 f"Item '{self.name}' requires target of type {self.target_type.value}, "
                 f"but got {type(target).__name__}"
             )
-        if self.effect:
-            self.effect(target, **self.params)
+
+    def activate(self, target: Player | Monster | Item | None = None):
+        self.check_target(target)
+        effect = self.template.effect
+        if effect is not None:
+            effect(target)
+            if isinstance(target, (Player, Monster)):
+                target.touch()
 
     def get_api_status(self):
         return api_wrapper.ItemInfo(id= self.id, name=self.name, text=self.text, target_type=self.target_type)
 
+    def get_api_status_json(self) -> dict:
+        '''returns get_api_status() encoded for the wire, items never change so this is encoded once'''
+        if self._status_json is None:
+            self._status_json = {**self.template.info_json, "id": self.id}
+        return self._status_json
+
 
 class Monster:
-    stars: int
-    name: str
+    __slots__ = ("id", "template", "health", "visible", "version", "_status_json", "_status_json_version")
+    id: int
+    template: MonsterTemplate # static card data shared by every monster of this type
     health: int
-    spare: int
     visible: bool
-    flee_coins: int
-    spare_coins: int
-    fight_coins: int
-    max_health: int
-    id: int
+    version: int
+    _status_json: dict | None
+    _status_json_version: int
 
     next_id = 0
 
-    def __init__(self, name: str = "", data: dict = None):
-        if not data:
-            return
-        req = ["stars", "health", "spare", "flee_coins", "fight_coins"]
-        if not all(field in data for field in req):
-            raise ValueError("Tried to initialize monster without all required fields")
-        self.name = name
-        self.stars = data["stars"]
+    def __init__(self, template: MonsterTemplate):
+        self.template = template
+        self.health = template.health
         self.visible = False
-        self.health = data["health"]
-        self.spare = data["spare"]
-        self.flee_coins = data["flee_coins"]
-        self.spare_coins = data["spare_coins"]
-        self.fight_coins = data["fight_coins"]
-        self.max_health = data["health"]
         self.id = Monster.next_id
         Monster.next_id += 1
+        self.version = next_version()
+        self._status_json = None
+        self._status_json_version = 0
+
+    @property
+    def name(self) -> str:
+        return self.template.name
+
+    @property
+    def stars(self) -> int:
+        return self.template.stars
+
+    @property
+    def max_health(self) -> int:
+        return self.template.health
+
+    @property
+    def spare(self) -> int:
+        return self.template.spare
+
+    @property
+    def flee_coins(self) -> int:
+        return self.template.flee_coins
+
+    @property
+    def spare_coins(self) -> int:
+        return self.template.spare_coins
+
+    @property
+    def fight_coins(self) -> int:
+        return self.template.fight_coins
 
     @staticmethod
     def construct_from_id(id: str) -> Monster:
-        if id not in MONSTER_REGISTRY.keys():
+        if id not in MONSTER_TEMPLATES:
             raise KeyError(f"monster {id} does not exit")
-        cur_mon: dict = MONSTER_REGISTRY[id]
-        return Monster(name=id, data=cur_mon)
+        return Monster(MONSTER_TEMPLATES[id])
+
+    def touch(self):
+        '''marks the monster as changed, call after mutating health or visibility'''
+        self.version = next_version()
+
+    def clone(self) -> Monster:
+        '''the same card with its own health and visibility'''
+        monster = object.__new__(Monster)
+        monster.id = self.id
+        monster.template = self.template
+        monster.health = self.health
+        monster.visible = self.visible
+        monster.version = self.version
+        monster._status_json = self._status_json
+        monster._status_json_version = self._status_json_version
+        return monster
 
     def get_api_status(self):
         if self.visible:
@@ -136,10 +232,21 @@ class Monster:
                 stars=self.stars
             )
 
+    def get_api_status_json(self) -> dict:
+        '''returns get_api_status() encoded for the wire, re-encoded only when the monster version changes'''
+        if self._status_json_version != self.version:
+            if self.visible:
+                self._status_json = {**self.template.info_json, "id": self.id, "health": self.health}
+            else:
+                self._status_json = {**self.template.hidden_info_json, "id": self.id}
+            self._status_json_version = self.version
+        return self._status_json
 
 
 
 class Player:
+    __slots__ = ("name", "lobby_ready", "sid", "coins", "items", "captured_stars", "health", "max_health",
+                 "version", "hand_version", "_public_json", "_public_json_version")
     name: str
     lobby_ready: bool
     sid: str
@@ -148,6 +255,10 @@ class Player:
     captured_stars: list[int]
     health: int
     max_health: int
+    version: int # bumped whenever public info changes
+    hand_version: int # bumped whenever items change
+    _public_json: dict | None
+    _public_json_version: int
 
     def __init__(self, name: str, sid: str):
         self.name = name
@@ -158,19 +269,62 @@ class Player:
         self.captured_stars = []
         self.health = 4
         self.max_health = 4
+        self.version = next_version()
+        self.hand_version = self.version
+        self._public_json = None
+        self._public_json_version = 0
+
+    def touch(self):
+        '''marks public info as changed, call after mutating coins, health, stars or ready'''
+        self.version = next_version()
+
+    def touch_hand(self):
+        '''marks the hand as changed, call after adding or removing items'''
+        self.hand_version = next_version()
+        self.version = self.hand_version
+
+    def clone(self) -> Player:
+        '''a copy with its own hand and stars, sharing the items since items never change'''
+        player = object.__new__(Player)
+        player.name = self.name
+        player.sid = self.sid
+        player.lobby_ready = self.lobby_ready
+        player.coins = self.coins
+        player.items = self.items[:]
+        player.captured_stars = self.captured_stars[:]
+        player.health = self.health
+        player.max_health = self.max_health
+        player.version = self.version
+        player.hand_version = self.hand_version
+        player._public_json = self._public_json
+        player._public_json_version = self._public_json_version
+        return player
 
     def use_item(self, item_pos: int, target: Player | Monster | Item | None = None):
         item = self.items.pop(item_pos)
+        self.touch_hand()
         item.activate(target=target)
 
     def use_items(self, items: list[int], target: Player | Monster | Item | None = None):
-        for i in items:
-            self.items[i].activate(target=target)
+        '''uses the items at these hand positions on target together, their effects resolved in one pass'''
+        used = [self.items[i] for i in items]
+        for item in used:
+            item.check_target(target) # before any effect, a bad batch changes nothing
+        effects = [item.template.effect for item in used if item.template.effect is not None]
+        if effects:
+            apply_effects(effects, target)
+            if isinstance(target, (Player, Monster)):
+                target.touch()
         for i in sorted(items, reverse=True):
             del self.items[i]
+        if items:
+            self.touch_hand()
 
 
-    def get_status_hand(self):
+    def get_status_hand(self, encoded: bool = False):
+        '''returns ItemInfo for every item in hand, or their cached wire form when encoded'''
+        if encoded:
+            return [item.get_api_status_json() for item in self.items]
         return [item.get_api_status() for item in self.items]
     
     def get_status_public(self):
@@ -183,6 +337,21 @@ class Player:
             health=self.health
         )
 
+    def get_status_public_json(self) -> dict:
+        '''returns get_status_public() encoded for the wire, re-encoded only when the player version changes'''
+        if self._public_json_version != self.version:
+            self._public_json = self.get_status_public().model_dump(mode='json')
+            self._public_json_version = self.version
+        return self._public_json
+
+
+# what an item may be used on, by its target type
+_TARGET_CLASSES: dict[api_wrapper.ItemTarget, type] = {
+    api_wrapper.ItemTarget.PLAYER: Player,
+    api_wrapper.ItemTarget.MONSTER: Monster,
+    api_wrapper.ItemTarget.ITEM: Item,
+    api_wrapper.ItemTarget.NONE: type(None),
+}
 
 
 class GameState:
@@ -196,11 +365,19 @@ class GameState:
     _max_players: int
     _allowed_items : list[str]
     _allowed_monsters: list[str]
-    _logger: AppLogger
+    ruleset: str # library ruleset the deck and shop draw from, unless restricted by the allowed lists
+    _logger: AppLogger | NullLogger
+    seed: int
+    _rng: random.Random # every random draw of the game, so it can be replayed from its seed
+    _rng_state: tuple[int, tuple] | None # board version and _rng.getstate() at that version, see clone
+    action_log: list[tuple] # accepted actions in order, see logged_action
 
 
     _turn_order: list[str]
     _event_bus = EventBus
+    _roster_version: int
+    _turn_version: int
+    _board_version: int
     players: dict[str, Player] #player_name -> Player
     _left_players: dict[str, Player]
     status: api_wrapper.GameStatus
@@ -210,16 +387,20 @@ class GameState:
     turn_phase: api_wrapper.TurnPhase
 
     #Board
-    deck: list[Monster]
-    shop: list[Item]
+    deck: CardPile[Monster]
+    shop: CardPile[Item]
     _combat_substate: CombatSubstate
 
     class CombatSubstate:
+        __slots__ = ("monsters", "selected_items", "state", "player", "selected_idx", "version", "selection_version", "turn_version")
         monsters: list[Monster]
         selected_items: list[bool]
         state: str # "selecting" | "deciding" | "fighting"
         player: Player
         selected_idx : int | None
+        version: int # monsters, selected monster and state
+        selection_version: int # selected items
+        turn_version: int # acting player
 
         def __init__(self, monsters: list[Monster], player: Player):
             self.monsters = monsters
@@ -227,13 +408,41 @@ class GameState:
             self.state = "selecting"
             self.selected_items = [False]*len(player.items)
             self.selected_idx = None
+            self.version = next_version()
+            self.selection_version = self.version
+            self.turn_version = self.version
+
+        def touch(self):
+            self.version = next_version()
+
+        def touch_selection(self):
+            self.selection_version = next_version()
+
+        def clone(self, players: dict[str, Player]) -> GameState.CombatSubstate:
+            '''a copy with its own monsters, fighting the players of the same name in players'''
+            combat = object.__new__(type(self))
+            combat.monsters = [m.clone() for m in self.monsters]
+            combat.selected_items = self.selected_items[:]
+            combat.state = self.state
+            combat.player = players[self.player.name]
+            combat.selected_idx = self.selected_idx
+            combat.version = self.version
+            combat.selection_version = self.selection_version
+            combat.turn_version = self.turn_version
+            return combat
+
+        def _set_player(self, player: Player):
+            self.player = player
+            self.selected_items = [False]*len(player.items)
+            self.turn_version = next_version()
+            self.selection_version = self.turn_version
 
         def kill_monster(self):
             pass
 
-        def spare_monster(self) -> tuple[int, bool]:
+        def spare_monster(self, rng: random.Random) -> tuple[int, bool]:
             mon : Monster = self.monsters[self.selected_idx]
-            roll = random.randint(1, 6)
+            roll = rng.randint(1, 6)
 
             if roll >= mon.spare:
                 self.player.captured_stars.append(mon.stars)
@@ -241,6 +450,8 @@ class GameState:
                 self.monsters.pop(0)        
             else:
                 self.player.health -= 1
+            self.player.touch()
+            self.touch()
             return (roll, roll >= mon.spare)
             
 
@@ -255,21 +466,30 @@ class GameState:
 
 
     class NCombatSubstate(CombatSubstate):
+        __slots__ = ("leftover_queue",)
         leftover_queue: list[Monster]
 
         def __init__(self, monsters, player):
             super().__init__(monsters, player)
             self.leftover_queue = []
 
+        def clone(self, players: dict[str, Player]) -> GameState.NCombatSubstate:
+            combat = super().clone(players)
+            combat.leftover_queue = [m.clone() for m in self.leftover_queue]
+            return combat
+
         def kill_monster(self):
             self.monsters.pop(self.selected_idx)
+            self.touch()
 
         def pass_monster(self) -> api_wrapper.TurnPhase:
             mon = self.monsters.pop(self.selected_idx)
             self.leftover_queue.append(mon)
             self.player.coins += mon.flee_coins
+            self.player.touch()
             self.selected_idx = None
             self.state = "selecting"
+            self.touch()
             return api_wrapper.TurnPhase.FLED   
             
         def select_monster(self, idx: int):
@@ -277,12 +497,15 @@ class GameState:
             self.state = "deciding"
             if not self.monsters[idx].visible:
                 self.monsters[idx].visible = True
+                self.monsters[idx].touch()
+            self.touch()
 
         def has_leftover_monsters(self) -> bool:
             """Check if any monsters are revealed but still alive"""
             return len(self.leftover_queue) > 0
         
     class LCombatSubstate(CombatSubstate):
+        __slots__ = ("original_player", "order")
         original_player: str
         order: list[Player]
 
@@ -293,25 +516,30 @@ class GameState:
             self.player = self.order[0]
             self.selected_items = [False]*len(player.items)
 
+        def clone(self, players: dict[str, Player]) -> GameState.LCombatSubstate:
+            combat = super().clone(players)
+            combat.original_player = self.original_player
+            combat.order = [players[p.name] for p in self.order]
+            return combat
+
         def kill_monster(self):
             self.monsters.pop(self.selected_idx)
             self.selected_idx = None
             self.state = "selecting"
-            self.player = self.order.pop(0)
-            self.selected_items = [False]*len(self.player.items)
+            self._set_player(self.order.pop(0))
+            self.touch()
 
-        def spare_monster(self) -> tuple[int, bool]:
+        def spare_monster(self, rng: random.Random) -> tuple[int, bool]:
             self.state = "selecting"
-            self.player = self.order.pop(0)
-            self.selected_items = [False]*len(self.player.items)
-            return super().spare_monster()
+            self._set_player(self.order.pop(0))
+            return super().spare_monster(rng)
             
 
         def pass_monster(self) -> api_wrapper.TurnPhase:
             self.selected_idx = None
             self.state = "selecting"
-            self.player = self.order.pop(0)
-            self.selected_items = [False]*len(self.player.items)
+            self._set_player(self.order.pop(0))
+            self.touch()
             if len(self.order) == 0:
                 return api_wrapper.TurnPhase.TURN_ENDED
             else:
@@ -320,32 +548,125 @@ class GameState:
         def select_monster(self, idx: int):
             self.selected_idx = idx
             self.state = "deciding"
+            self.touch()
 
         def is_finished(self):
             return len(self.order) == 0 or len(self.monsters) == 0
 
 
     class PvpSubState:
+        __slots__ = ("true_active", "target_items")
         true_active: str
         target_items: list[Item]
 
 
-    def __init__(self, id : str, name : str, owner : str, max_players: int, allowed_items: Literal["*"] | list[str] = "*", allowed_monsters: Literal["*"] | list[str] = "*"):
+    def __init__(self, id : str, name : str, owner : str, max_players: int, allowed_items: Literal["*"] | list[str] = "*", allowed_monsters: Literal["*"] | list[str] = "*", ruleset: str = DEFAULT_RULESET, logger: AppLogger | NullLogger | None = None, seed: int | None = None):
         self._id = id
         self._name = name
         self._owner = owner
         self._max_players = max_players
         self.players = {}
         self.status = api_wrapper.GameStatus.LOBBY
-        self._logger = AppLogger(name=f"game_{name}")
+        self._logger = logger if logger is not None else AppLogger(name=f"game_{name}")
+
         self._event_bus = EventBus()
         self._left_players = {}
 
         self._allowed_items = allowed_items
         self._allowed_monsters = allowed_monsters
+        if ruleset not in RULESETS:
+            raise ValueError(f'unknown ruleset "{ruleset}", expected one of {list(RULESETS)}')
+        self.ruleset = ruleset
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self._rng = random.Random(self.seed)
+        self._rng_state = None
+        self.action_log = []
+        monsters = RULESETS[ruleset].monsters if allowed_monsters == "*" else card_table("monsters", tuple(allowed_monsters))
+        items = RULESETS[ruleset].items if allowed_items == "*" else card_table("items", tuple(allowed_items))
+        self.deck = CardPile(monsters, Monster.construct_from_id, self._rng)
+        self.shop = CardPile(items, Item.construct_from_id, self._rng)
+
+        self._combat_substate = None
+        self._roster_version = next_version()
+        self._turn_version = self._roster_version
+        self._board_version = self._roster_version
 
 
+    def get_players_version(self) -> int:
+        '''returns a version that changes whenever the public players info changes'''
+        return max(self._roster_version, max((p.version for p in self.players.values()), default=0))
+
+    def get_turn_version(self) -> int:
+        '''returns a version that changes whenever the active player, turn phase or their legal actions change'''
+        if self._combat_substate:
+            return max(self._turn_version, self._combat_substate.turn_version, self._combat_substate.version)
+        return self._turn_version
+
+    def get_board_version(self) -> int:
+        '''returns a version that changes whenever the board status changes'''
+        combat = self._combat_substate
+        if not combat:
+            return self._board_version
+        return max(self._board_version, combat.version, max((m.version for m in combat.monsters), default=0))
+
+    def get_state_version(self) -> int:
+        '''returns a version that changes whenever anything in the game changes'''
+        return max(
+            self.get_players_version(),
+            self.get_turn_version(),
+            self.get_board_version(),
+            max((self.get_hand_version(name) for name in self.players), default=0),
+        )
 
+    def get_replay_header(self) -> dict:
+        '''returns what replay needs besides the action log to rebuild this game'''
+        return {
+            "id": self._id,
+            "name": self._name,
+            "owner": self._owner,
+            "max_players": self._max_players,
+            "allowed_items": self._allowed_items,
+            "allowed_monsters": self._allowed_monsters,
+            "ruleset": self.ruleset,
+            "seed": self.seed,
+        }
+
+    def clone(self) -> GameState:
+        '''
+        A copy of the game to play ahead on, for search bots branching over decisions. The clone has
+        its own players, hands, drawn monsters, combat, pile cursors and random generator, and shares
+        everything that never changes in place: card templates, items and the pile card arrays.
+        It logs nothing, has no event subscribers and its action log starts empty.
+        '''
+        game = object.__new__(GameState)
+        game.__dict__.update(self.__dict__)
+        game._logger = NullLogger()
+        game._event_bus = EventBus()
+        game.action_log = []
+        # getstate builds a 625 int tuple, a search clones the same position many times and every draw
+        # (piles, spare rolls) changes the board version, so reuse it until then. Skip seeding a generator just to replace its state
+        version = self.get_board_version()
+        if self._rng_state is None or self._rng_state[0] != version:
+            self._rng_state = game._rng_state = (version, self._rng.getstate())
+        game._rng = random.Random.__new__(random.Random)
+        game._rng.setstate(self._rng_state[1])
+        game.deck = self.deck.clone(game._rng)
+        game.shop = self.shop.clone(game._rng)
+        game.players = {name: p.clone() for name, p in self.players.items()}
+        game._left_players = {name: p.clone() for name, p in self._left_players.items()}
+        if self.status == api_wrapper.GameStatus.GAME:
+            game._turn_order = self._turn_order[:]
+        if self._combat_substate is not None:
+            # combat players can have left the game since
+            game._combat_substate = self._combat_substate.clone(game.players | game._left_players)
+        return game
+
+    def get_hand_version(self, player_name: str) -> int:
+        '''returns a version that changes whenever the player's hand or selected items change'''
+        player = self.players[player_name]
+        if self._combat_substate and self._combat_substate.player is player:
+            return max(player.hand_version, self._combat_substate.selection_version)
+        return player.hand_version
     
     def get_status_lobby(self):
         """
@@ -356,18 +677,26 @@ class GameState:
             "status": self.status.name
         }
     
-    def get_status_players(self):
+    def get_status_players(self, encoded: bool = False):
         """
         Returns api public players info in JSON format
+        With encoded=True players are the cached wire dicts instead of PlayerInfo models
         """
+        if encoded:
+            return [player.get_status_public_json() for player in self.players.values()]
         return [player.get_status_public() for player in self.players.values()]
 
-    def get_status_board(self):
+    def get_status_board(self, encoded: bool = False):
         """
         Returns api board status in JSON format
+        With encoded=True monsters are the cached wire dicts instead of MonsterInfo models
         """
         if self._combat_substate:
-            monsters = [mon.get_api_status() for mon in self._combat_substate.monsters]
+            if encoded:
+                monsters = [mon.get_api_status_json() for mon in self._combat_substate.monsters]
+            else:
+                monsters = [mon.get_api_status() for mon in self._combat_substate.monsters]
+
             selected_monster = self._combat_substate.selected_idx
         else:
             monsters = []
@@ -382,7 +711,12 @@ class GameState:
         }
         
     
+    @logged_action(LOG_JOIN)
     def add_player(self, player_name, sid) -> None:
+        if player_name in self.players: # still seated, reconnecting from a new socket or after a restore
+            self.players[player_name].sid = sid
+            self._logger.info(f'player {player_name} reconnected')
+            return
         if player_name in self._left_players:
             self.players[player_name] = self._left_players[player_name]
             del self._left_players[player_name]
@@ -393,23 +727,31 @@ class GameState:
             self._logger.info(f'player {player_name} joined game')
         if self.status == api_wrapper.GameStatus.GAME:
             self._turn_order.append(player_name)
+            self._turn_version = next_version()
+        self._roster_version = next_version()
 
+    @logged_action(LOG_LEAVE)
     def remove_player(self, player_name) -> None:
         if self.status == api_wrapper.GameStatus.GAME:
             if player_name == self.get_active_player(): #End turn if they're active
                 self._change_turn_phase(api_wrapper.TurnPhase.TURN_ENDED)
                 self._state_end_turn()
             self._turn_order.remove(player_name)
+            self._turn_version = next_version()
 
         self._left_players[player_name] = self.players[player_name]
         del self.players[player_name]
+        self._roster_version = next_version()
         self._logger.info(f'player {player_name} left game')
 
+    @logged_action(LOG_READY)
     def set_player_lobby_ready(self, player_name, ready) -> None:
         player = self.players[player_name]
         player.lobby_ready = ready
+        player.touch()
         self._logger.info(f'player {player_name} became {ready} in lobby')
 
+    @logged_action(LOG_START)
     def start(self) -> None:
         '''starts the game'''
         self._logger.info("GAME START")
@@ -418,10 +760,12 @@ class GameState:
         self._turn_order = order
         self._active_player = 0
         self.turn_phase = api_wrapper.TurnPhase.CHOOSING_ACTION
-        self._combat_substate = None
+        self._set_combat_substate(None)
         self._pvp_sbs = None
-        self.__init_shop()
-        self.__init_deck()
+        self.shop.refill()
+        self.deck.refill()
+        self._board_version = next_version()
+        self._turn_version = next_version()
 
     def _state_choosing_action(self, player: str, action: api_wrapper.PlayerActionChoice = None, item: int = None):
         if item != None:
@@ -432,6 +776,7 @@ class GameState:
             coins_event = CoinsEvent(game_id=self._id, player=player, amount=2)
             self._event_bus.emit(event=coins_event)
             player_obj.coins += coins_event.amount
+            player_obj.touch()
             self._change_turn_phase(api_wrapper.TurnPhase.TURN_ENDED)
             self._logger.info(f'player {player} took coins')
         elif action == api_wrapper.PlayerActionChoice.SHOP:
@@ -442,13 +787,11 @@ class GameState:
             if self._combat_substate:
                 self._logger.error("tried to start combat but combat substate already exists")
                 return
-            if len(self.deck) < 3:
-                self.__init_deck()
-            monster_results = [self.deck[i] for i in range(3)]
-            del self.deck[:3]
+            monster_results = self.deck.draw(3)
+            self._board_version = next_version()
             combat_event = CombatEvent(game_id=self._id, monster_ids=[mon.name for mon in monster_results], info=[mon.get_api_status() for mon in monster_results])
             self._event_bus.emit(combat_event)
-            self._combat_substate = self.NCombatSubstate(monsters=monster_results, player=player_obj)
+            self._set_combat_substate(self.NCombatSubstate(monsters=monster_results, player=player_obj))
             self._logger.info(f"combat started against {len(monster_results)} monsters")
             self._change_turn_phase(api_wrapper.TurnPhase.COMBAT_SELECT)
         else:
@@ -511,7 +854,7 @@ class GameState:
             self._combat_substate.state = "fighting"
             self._logger.info(f'player {player} chose to fight monster')
         elif combat_action == api_wrapper.PlayerCombatChoice.SPARE:
-            roll, success = self._combat_substate.spare_monster()
+            roll, success = self._combat_substate.spare_monster(self._rng)
             if success:
                 self._logger.info(f'{player_obj.name} spared (rolled {roll})')
             else:
@@ -540,6 +883,7 @@ class GameState:
             if item >= len(self._combat_substate.selected_items):
                 self._logger.error(f'invalid item selection, combat state {self._combat_substate.selected_items}, {self._combat_substate.player.name}, {self._combat_substate.__class__.__name__}')
             self._combat_substate.selected_items[item] = not self._combat_substate.selected_items[item]
+            self._combat_substate.touch_selection()
             self._logger.info(f'player {player} {"selected" if self._combat_substate.selected_items[item] else "unselected"} item {item}')
             return
         elif combat_action != api_wrapper.PlayerCombatChoice.FIGHT or self._combat_substate.selected_idx != monster_idx:
@@ -558,6 +902,7 @@ class GameState:
         if mon.health <= 0:
             player_obj.captured_stars.append(mon.stars)
             player_obj.coins += mon.fight_coins
+            player_obj.touch()
             self._logger.info(f'{player_obj.name} killed {mon.name}')
             self._combat_substate.kill_monster()
         else:   
@@ -586,6 +931,10 @@ class GameState:
         else:
             self._logger.warning(f'player {player} tried to take invalid post-flee action')
 
+    def _state_ending_turn(self, player: str, action: api_wrapper.PlayerActionChoice = None):
+        self._change_turn_phase(api_wrapper.TurnPhase.TURN_ENDED)
+        self._logger.info(f'player {player} ended turn')
+
     def _state_end_turn(self):
         if self.turn_phase != api_wrapper.TurnPhase.TURN_ENDED:
             self._logger.warning("tried to go to next turn but not in correct state")
@@ -603,7 +952,8 @@ class GameState:
         if len(player.items) > 4:
             self._logger.info(f'player {player.name} tried to buy an item but is holding too many')
             return    
-        item = self.shop.pop(0)        
+        item = self.shop.pop()
+        self._board_version = next_version()
         shop_event = ShopEvent(game_id=self._id, item_id=item.name, item_uid=item.id, player_name=player.name)
         player.coins -= 2
         self._event_bus.emit(shop_event)
@@ -613,6 +963,7 @@ class GameState:
             self._change_turn_phase(api_wrapper.TurnPhase.SHOPPING)
         #TODO Change
         player.items += [item]
+        player.touch_hand()
         self._logger.info(f'player {player.name} bought item(s) {item.name}')
 
     def _buy_health(self, player: Player):
@@ -630,6 +981,7 @@ class GameState:
         else: 
             self._change_turn_phase(api_wrapper.TurnPhase.SHOPPING)
         player.health += event.health_amount
+        player.touch()
         self._logger.info(f'player {player.name} bought health')
         
     def _deal_damage(self, player: Player, amount: int):
@@ -644,6 +996,7 @@ class GameState:
         player.health -= event.health_loss
         if event.star_index:
             del player.captured_stars[event.star_index]
+        player.touch()
         self._logger.info(f'player {player.name} lost {event.health_loss} health and star {event.star_index if event.star_index else "none" }')
 
 
@@ -662,18 +1015,18 @@ class GameState:
         if combat.has_leftover_monsters():
             self._change_turn_phase(api_wrapper.TurnPhase.COMBAT_SELECT)
             orig = combat.player.name
-            self._combat_substate = self.LCombatSubstate(monsters=combat.leftover_queue, 
+            self._set_combat_substate(self.LCombatSubstate(monsters=combat.leftover_queue, 
                                                             player=combat.player, 
-                                                            order=[self.players[p] for p in self._turn_order if p != orig])
+                                                            order=[self.players[p] for p in self._turn_order if p != orig]))
             self._logger.info(f'leftover monsters remain, entering leftover combat')
         else:
-            self._combat_substate = None
+            self._set_combat_substate(None)
             self._change_turn_phase(api_wrapper.TurnPhase.TURN_ENDED)
             self._state_end_turn()
 
     def __end_leftover_combat(self, combat: LCombatSubstate):
         if combat.is_finished():
-            self._combat_substate = None
+            self._set_combat_substate(None)
             self._change_turn_phase(api_wrapper.TurnPhase.TURN_ENDED)
             self._state_end_turn()
         else:
@@ -682,11 +1035,12 @@ class GameState:
 
         
 
-    def _state_pvp(self, player: str, action: api_wrapper.PlayerActionChoice = None, item_choice: int = None, player_target: str = None):
+    def _state_pvp(self, player: str, action: api_wrapper.PlayerActionChoice = None, item: int = None, player_target: str = None):
         pass
 
 
 
+    @logged_action(LOG_ACTION)
     def player_action(self, player: str, action: api_wrapper.PlayerActionChoice):
 
         if player not in self.players:
@@ -697,78 +1051,56 @@ class GameState:
             self._logger.warning(f'player {player} tried to take action out of turn')
             return
 
-        valid_states = {
-            api_wrapper.TurnPhase.CHOOSING_ACTION: self._state_choosing_action,
-            api_wrapper.TurnPhase.SHOPPING: self._state_shopping,
-            api_wrapper.TurnPhase.FLED: self._state_fled,
-        }
-
-        if self.turn_phase not in valid_states:
+        handler = self._transition(player, action)
+        if handler is None:
             self._logger.warning(f'tried to do action {action.name} while in state {self.turn_phase.name}')
-        
-        if action == api_wrapper.PlayerActionChoice.END:
-            self._change_turn_phase(api_wrapper.TurnPhase.TURN_ENDED)
-        else:
-            valid_states[self.turn_phase](player=player, action=action)
+            return
+        handler(self, player=player, action=action)
 
         if self.turn_phase == api_wrapper.TurnPhase.TURN_ENDED:
             self._state_end_turn()
 
+    @logged_action(LOG_ITEM)
     def player_select_item(self, player: str, choice: int):
         if player not in self.players:
             self._logger.error(f'unregistered player {player} tried to take an action')
             return
 
-        valid_states = {
-            api_wrapper.TurnPhase.CHOOSING_ACTION: self._state_choosing_action,
-            api_wrapper.TurnPhase.COMBAT_FIGHT: self._state_combat_fight,
-            api_wrapper.TurnPhase.PVP: self._state_pvp,
-        }
-
-        if self.turn_phase not in valid_states:
-            self._logger.warning(f'tried to use item while in state {self.turn_phase.name}')
+        handler = self._transition(player, ITEM_REQUEST, choice)
+        if handler is None:
+            self._logger.warning(f'tried to use item {choice} while in state {self.turn_phase.name}')
             return
-
-        # Call appropriate state handler with item parameter
-        valid_states[self.turn_phase](player=player, item=choice)
+        handler(self, player=player, item=choice)
 
         if self.turn_phase == api_wrapper.TurnPhase.TURN_ENDED:
             self._state_end_turn()
 
+    @logged_action(LOG_MONSTER)
     def player_select_monster(self, player: str, choice: int, combat_action: api_wrapper.PlayerCombatChoice):
         if player not in self.players:
             self._logger.error(f'unregistered player {player} tried to take an action')
             return
 
-        valid_states = {
-            api_wrapper.TurnPhase.PVP: self._state_pvp,
-            api_wrapper.TurnPhase.COMBAT_FIGHT: self._state_combat_fight,
-            api_wrapper.TurnPhase.COMBAT_ACTION: self._state_combat_action,
-            api_wrapper.TurnPhase.COMBAT_SELECT: self._state_combat_select,
-            api_wrapper.TurnPhase.FLED: self._state_fled,
-        }
-
-        if self.turn_phase not in valid_states:
-            self._logger.warning(f'tried to select monster while in state {self.turn_phase.name}')
+        handler = self._transition(player, combat_action, choice)
+        if handler is None:
+            self._logger.warning(f'tried to {combat_action.name if combat_action else "target"} monster {choice} while in state {self.turn_phase.name}')
             return
-
-        # Call appropriate state handler with monster_choice parameter
-        valid_states[self.turn_phase](player=player, monster_idx=choice, combat_action=combat_action)
+        handler(self, player=player, monster_idx=choice, combat_action=combat_action)
 
         if self.turn_phase == api_wrapper.TurnPhase.TURN_ENDED:
             self._state_end_turn()
 
+    @logged_action(LOG_PLAYER)
     def player_select_player(self, player: str, choice: str):
         if player not in self.players:
             self._logger.error(f'unregistered player {player} tried to take an action')
             return
         
-        valid_states = {
-            api_wrapper.TurnPhase.PVP: self._state_pvp,
-        }
-
-        if self.turn_phase not in valid_states:
+        handler = self._transition(player, PLAYER_REQUEST, choice)
+        if handler is None:
             self._logger.warning(f'tried to select {choice} while in state {self.turn_phase.name}')
+            return
+        handler(self, player=player, player_target=choice)
 
         if self.turn_phase == api_wrapper.TurnPhase.TURN_ENDED:
             self._state_end_turn()
@@ -778,15 +1110,22 @@ class GameState:
         curr = self._active_player
         new_player = (curr + 1)%len(self._turn_order)
         self._active_player = new_player
+        self._turn_version = next_version()
         self._logger.info(f'{self._turn_order[curr]} ended turn, started {self._turn_order[new_player]} turn')
         self._change_turn_phase(api_wrapper.TurnPhase.CHOOSING_ACTION)
 
     def _change_turn_phase(self, new_phase: api_wrapper.TurnPhase):
         if not self.turn_phase or self.turn_phase != new_phase:
             self.turn_phase = new_phase
+            self._turn_version = next_version()
             #self._event_bus.emit(Event(type=EventType.TURN))
         
 
+    def _set_combat_substate(self, combat: CombatSubstate | None):
+        self._combat_substate = combat
+        self._board_version = next_version()
+        self._turn_version = self._board_version
+
     def get_active_player(self) -> str | None:
         if self.status != api_wrapper.GameStatus.GAME:
             return None
@@ -798,6 +1137,110 @@ class GameState:
     def get_active_player_obj(self) -> Player:
         return self.players[self._turn_order[self._active_player]] if self.status == api_wrapper.GameStatus.GAME else None
     
+    def _transition(self, player: str, request: TurnRequest, target: int | str | None = None) -> Callable[..., None] | None:
+        '''the handler taking request from player in the current phase, None when it is not legal'''
+        handler = self._transitions.get((self.turn_phase, request))
+        if handler is None or player != self.get_active_player():
+            return None
+        if request == ITEM_REQUEST:
+            items = self._combat_substate.selected_items if self._combat_substate else self.players[player].items
+            return handler if isinstance(target, int) and 0 <= target < len(items) else None
+        if request == PLAYER_REQUEST:
+            return handler if target != player and target in self.players else None
+        if isinstance(request, api_wrapper.PlayerCombatChoice):
+            combat = self._combat_substate
+            if combat is None:
+                return None
+            if request == api_wrapper.PlayerCombatChoice.SELECT:
+                return handler if isinstance(target, int) and 0 <= target < len(combat.monsters) else None
+            return handler if combat.selected_idx is not None and target == combat.selected_idx else None
+        return handler
+
+    def is_legal(self, player: str, request: TurnRequest, target: int | str | None = None) -> bool:
+        '''
+        whether player may make request in the current phase, against the monster, hand position or player target.
+        Constant time, so requests can be turned away before any snapshot of the game is taken
+        '''
+        return self._transition(player, request, target) is not None
+
+    def is_legal_step(self, player: str, step: api_wrapper.CompoundStep) -> bool:
+        '''whether player may make the request of step now, see is_legal'''
+        if step.action is not None:
+            return self.is_legal(player, step.action)
+        if step.combat is not None:
+            return self.is_legal(player, step.combat, step.target)
+        if step.player is not None:
+            return self.is_legal(player, PLAYER_REQUEST, step.player)
+        return (self.turn_phase == api_wrapper.TurnPhase.COMBAT_FIGHT and player == self.get_active_player()
+                and all(self.is_legal(player, ITEM_REQUEST, item) for item in step.items))
+
+    def _play_step(self, player: str, step: api_wrapper.CompoundStep) -> bool:
+        if not self.is_legal_step(player, step):
+            return False
+        if step.action is not None:
+            self.player_action(player, step.action)
+        elif step.combat is not None:
+            self.player_select_monster(player, step.target, step.combat)
+        elif step.player is not None:
+            self.player_select_player(player, step.player)
+        else:
+            wanted = set(step.items)
+            for item, selected in enumerate(self._combat_substate.selected_items):
+                if selected != (item in wanted):
+                    self.player_select_item(player, item)
+        return True
+
+    def play_steps(self, player: str, steps: list[api_wrapper.CompoundStep]) -> int:
+        '''
+        makes the requests of a compound request in order, each checked like a request of its own,
+        stopping at the first one that is not legal by the time it comes up. Returns how many were made
+        '''
+        for played, step in enumerate(steps):
+            if not self._play_step(player, step):
+                return played
+        return len(steps)
+
+    def legal_actions(self, player: str, encoded: bool = False) -> api_wrapper.LegalActions | dict:
+        '''
+        every request player may make in the current phase, nothing when it is not their turn.
+        With encoded=True the wire dict
+        '''
+        actions, combat_choices, items, players = _PHASE_REQUESTS[self.turn_phase] if player == self.get_active_player() else _NO_REQUESTS
+        combat = self._combat_substate
+        monsters = []
+        if combat_choices and combat is not None:
+            if api_wrapper.PlayerCombatChoice.SELECT in combat_choices:
+                monsters = list(range(len(combat.monsters)))
+            elif combat.selected_idx is not None:
+                monsters = [combat.selected_idx]
+        if not monsters:
+            combat_choices = ()
+        hand = list(range(len(combat.selected_items if combat else self.players[player].items))) if items else []
+        targets = [name for name in self._turn_order if name != player] if players else []
+        if encoded:
+            return {"actions": [a.value for a in actions], "combat": [c.value for c in combat_choices],
+                    "monsters": monsters, "items": hand, "players": targets}
+        return api_wrapper.LegalActions(actions=list(actions), combat=list(combat_choices), monsters=monsters, items=hand, players=targets)
+
+    def get_combat_odds(self, player: str, monster: int | None = None, encoded: bool = False) -> api_wrapper.CombatOdds | dict | None:
+        '''
+        odds of player fighting, sparing or fleeing the monster at that board index (the selected one by default)
+        with their current hand, None without such a monster. With encoded=True the cached wire dict
+        '''
+        combat = self._combat_substate
+        if combat is None or player not in self.players:
+            return None
+        if monster is None:
+            monster = combat.selected_idx
+        if monster is None or not 0 <= monster < len(combat.monsters):
+            return None
+        mon, player_obj = combat.monsters[monster], self.players[player]
+        key = (mon.name, mon.health, player_obj.health, tuple(sorted(item.name for item in player_obj.items)),
+               isinstance(combat, self.LCombatSubstate))
+        if encoded:
+            return {**combat_odds_json(*key), "monster": monster}
+        return combat_odds(*key).model_copy(update={"monster": monster})
+
     def get_selected_fight_items(self, player: str) -> list[bool]:
         """returns selected items for player"""
         if (not self._combat_substate) or (player != self._combat_substate.player.name):
@@ -805,28 +1248,25 @@ class GameState:
         else:
             return self._combat_substate.selected_items
     
-    def __init_deck(self):
-        self.deck = [Monster()]*40
-        for i in range(40):
-            if self._allowed_monsters == "*":
-                mon_name = random.choice(list(MONSTER_REGISTRY.keys()))
-            else:
-                mon_name = random.choice(self._allowed_monsters)
-            self.deck[i] = Monster.construct_from_id(mon_name)
-        self._logger.info("intialized monster deck")
-        
-    def __init_shop(self):
-        self.shop = [Item()]*40
-        for i in range(40):
-            if self._allowed_items == "*":
-                item_name = random.choice(list(ITEM_REGISTRY.keys()))
-            else:
-                item_name = random.choice(self._allowed_items)
-            self.shop[i] = Item.construct_from_id(item_name)
-        self._logger.info("intialized item shop")
-
     def __del__(self):
         self._logger.critical("GAME CRASH")
+
+
+GameState._transitions = {
+    (phase, request): getattr(GameState, handler)
+    for phase, handlers in TURN_PHASES.items() for handler, requests in handlers.items() for request in requests
+}
+# per phase: the action and combat choices it accepts, and whether it takes items and players
+_PHASE_REQUESTS = {
+    phase: (
+        tuple(r for rs in handlers.values() for r in rs if isinstance(r, api_wrapper.PlayerActionChoice)),
+        tuple(r for rs in handlers.values() for r in rs if isinstance(r, api_wrapper.PlayerCombatChoice)),
+        any(ITEM_REQUEST in rs for rs in handlers.values()),
+        any(PLAYER_REQUEST in rs for rs in handlers.values()),
+    )
+    for phase, handlers in TURN_PHASES.items()
+}
+_NO_REQUESTS = ((), (), False, False)
     
 
     
@@ -1,7 +1,25 @@
-from typing import Protocol, Any
+"""
+Item effects and their compiled programs.
+
+An effect in library.yaml is a primitive from EFFECT_REGISTRY with its params, every effect of a list
+in order, or a choice between two effects on a condition from CONDITION_REGISTRY about the target:
+
+    effect: {id: DIRECT_DAMAGE, params: {amount: 2}}
+    effect:
+      all:
+        - {id: DIRECT_DAMAGE, params: {amount: 2}}
+        - if: {health_at_most: 3}
+          then: {id: DIRECT_DAMAGE, params: {amount: 9}}
+          else: {id: DIRECT_DAMAGE, params: {amount: 1}} # optional
+
+card_library validates these into specs of builtins for its artifact, and compile_effect turns a spec
+into an Effect with everything bound once at load time. Effects that only ever take a fixed amount
+of health off their target keep just that amount, so a batch of them resolves as one subtraction.
+"""
+import functools
+from dataclasses import dataclass
+from typing import Protocol, Any, Callable, Iterable
 from api_wrapper import ItemTarget
-import os
-import yaml
 
 class MonsterContext(Protocol):
     health: int
@@ -9,24 +27,79 @@ class MonsterContext(Protocol):
 def direct_damage(target: MonsterContext, amount: int) -> None:
     target.health -= amount
 
-    
+def health_at_most(target: MonsterContext, value: int) -> bool:
+    return target.health <= value
+
+def health_at_least(target: MonsterContext, value: int) -> bool:
+    return target.health >= value
+
+
+# id -> the targets it takes, the function and the param that is a fixed amount of damage (None if it is not that simple)
 EFFECT_REGISTRY = {
-    "DIRECT_DAMAGE": (ItemTarget.MONSTER, direct_damage),
+    "DIRECT_DAMAGE": (ItemTarget.MONSTER, direct_damage, "amount"),
+}
+CONDITION_REGISTRY = {
+    "health_at_most": health_at_most,
+    "health_at_least": health_at_least,
 }
 
-ITEM_REGISTRY = {}
+# spec kinds besides the primitive effect ids
+ALL, IF = "all", "if"
+
+
+@dataclass(frozen=True, slots=True)
+class Effect:
+    '''
+    the compiled program of an item effect, shared by every item of the type.
+    apply is None when the effect only takes damage health off its target
+    '''
+    target_type: ItemTarget
+    damage: int
+    apply: Callable[[Any], None] | None
 
-MONSTER_REGISTRY = {}
+    def __call__(self, target: Any):
+        if self.apply is None:
+            target.health -= self.damage
+        else:
+            self.apply(target)
 
-library_path = os.path.join(os.path.dirname(__file__), 'library.yaml')
-with open(library_path, 'r') as file:
-    try:
-        data: dict[str, dict[Any]] = yaml.load(file, yaml.Loader)
-        for name, item_data in data["items"].items():
-            ITEM_REGISTRY[name] = item_data
-        for name, monster_data in data["monsters"].items():
-            MONSTER_REGISTRY[name] = monster_data
+def apply_effects(effects: Iterable[Effect], target: Any):
+    '''applies effects to target in order, folding every run of fixed damage into one subtraction'''
+    damage = 0
+    for effect in effects:
+        if effect.apply is None:
+            damage += effect.damage
+            continue
+        if damage:
+            target.health -= damage
+            damage = 0
+        effect.apply(target)
+    if damage:
+        target.health -= damage
 
-    except yaml.YAMLError as exc:
-        print(exc)
+def _conditional(test: Callable[[Any, Any], bool], value: Any, then: Effect, otherwise: Effect | None, target: Any):
+    branch = then if test(target, value) else otherwise
+    if branch is not None:
+        branch(target)
 
+def compile_effect(spec: tuple) -> Effect:
+    '''
+    the program for a validated spec: (id, params), (ALL, (spec, ...)) or (IF, condition, value, then, otherwise),
+    otherwise being a spec or None
+    '''
+    kind = spec[0]
+    if kind == ALL:
+        parts = tuple(compile_effect(part) for part in spec[1])
+        if all(part.apply is None for part in parts):
+            return Effect(parts[0].target_type, sum(part.damage for part in parts), None)
+        return Effect(parts[0].target_type, 0, functools.partial(apply_effects, parts))
+    if kind == IF:
+        _, condition, value, then, otherwise = spec
+        then = compile_effect(then)
+        otherwise = None if otherwise is None else compile_effect(otherwise)
+        return Effect(then.target_type, 0, functools.partial(_conditional, CONDITION_REGISTRY[condition], value, then, otherwise))
+    target, effect, damage_param = EFFECT_REGISTRY[kind]
+    params = spec[1]
+    if damage_param is not None and params.keys() == {damage_param}:
+        return Effect(target, params[damage_param], None)
+    return Effect(target, 0, functools.partial(effect, **params))
@@ -0,0 +1,68 @@
+import json
+import asyncio
+from typing import Any, AsyncIterator, Callable, Optional
+
+
+class LobbyFeed:
+    """
+    Pushes lobby changes to server browsers as a Server-Sent Events stream.
+    A new subscriber gets a "snapshot" of all games, then only "create", "update" and "delete" events.
+    Every event is serialized once and shared by all subscribers, and the snapshot is cached between changes,
+    so idle subscribers cost one queue each. A subscriber too slow to keep up is closed and reconnects with a new snapshot.
+    """
+    KEEPALIVE = 15.0 # seconds between comments that keep idle connections open through proxies
+    QUEUE_SIZE = 256
+
+    _subscribers : set[asyncio.Queue]
+    _snapshot_frame : Optional[str]
+
+    def __init__(self, snapshot : Callable[[], list[dict]]):
+        self._snapshot = snapshot
+        self._subscribers = set()
+        self._snapshot_frame = None
+
+    @staticmethod
+    def frame(event : str, data : Any) -> str:
+        return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event : str, data : Any):
+        """sends event to every subscriber"""
+        self._snapshot_frame = None
+        if not self._subscribers:
+            return
+        frame = self.frame(event, data)
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # drop what it has not read and end its stream, it will come back for a snapshot
+                self._subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    def snapshot_frame(self) -> str:
+        if self._snapshot_frame is None:
+            self._snapshot_frame = self.frame("snapshot", self._snapshot())
+        return self._snapshot_frame
+
+    async def stream(self) -> AsyncIterator[str]:
+        """SSE stream of one subscriber, ends when the subscriber falls behind"""
+        queue : asyncio.Queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        self._subscribers.add(queue)
+        try:
+            yield self.snapshot_frame()
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), self.KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self._subscribers.discard(queue)
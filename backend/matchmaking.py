@@ -0,0 +1,171 @@
+import time
+import heapq
+import asyncio
+from typing import Awaitable, Callable, Optional
+from game_meta import GameMetadata
+import api_wrapper as api
+
+
+class SeatIndex:
+    """
+    Lobbies bucketed by free seats, so the fullest lobby with a free seat is found and claimed
+    in time independent of the number of games. A claimed seat is held as a reservation until
+    the game server reports the player joined, or the reservation expires. Expired seats are given
+    back on the next update or claim, whichever comes first.
+    """
+    RESERVATION_TTL = 30.0 # seconds a matched player has to join
+
+    _buckets : dict[int, dict[str, None]] # free seats -> ordered set of game ids
+    _free : dict[str, int]
+    _players : dict[str, int] # last reported player count
+    _open : dict[str, int] # seats not taken by players, as last reported
+    _reservations : dict[str, list[float]] # game id -> expiry of each held seat
+    _expiries : list[tuple[float, str]] # heap of (expiry, game id) of every reservation made
+
+    def __init__(self, clock=time.monotonic):
+        self._buckets = {}
+        self._free = {}
+        self._players = {}
+        self._open = {}
+        self._reservations = {}
+        self._expiries = []
+        self._clock = clock
+
+    def __len__(self):
+        return len(self._free)
+
+    def free_seats(self, game_id : str) -> int:
+        return self._free.get(game_id, 0)
+
+    def _place(self, game_id : str, free : int):
+        self._unplace(game_id)
+        if free > 0:
+            self._free[game_id] = free
+            self._buckets.setdefault(free, {})[game_id] = None
+
+    def _unplace(self, game_id : str):
+        free = self._free.pop(game_id, None)
+        if free is not None:
+            bucket = self._buckets[free]
+            del bucket[game_id]
+            if not bucket:
+                del self._buckets[free]
+
+    def _held(self, game_id : str) -> int:
+        now = self._clock()
+        held = [expiry for expiry in self._reservations.get(game_id, []) if expiry > now]
+        self._reservations[game_id] = held
+        return len(held)
+
+    def update(self, game : GameMetadata):
+        """reindexes game after its player count or status changed"""
+        if game.status != api.GameStatus.LOBBY:
+            self.remove(game.id)
+            return
+        # players that joined since the last report use up their reservations
+        joined = game.num_players - self._players.get(game.id, 0)
+        if joined > 0:
+            self._reservations[game.id] = sorted(self._reservations.get(game.id, []))[joined:]
+        self._players[game.id] = game.num_players
+        self._open[game.id] = game.max_players - game.num_players
+        self._place(game.id, self._open[game.id] - self._held(game.id))
+
+    def remove(self, game_id : str):
+        self._unplace(game_id)
+        self._players.pop(game_id, None)
+        self._open.pop(game_id, None)
+        self._reservations.pop(game_id, None)
+
+    def _expire(self):
+        """gives back the seats of expired reservations, entries of removed games or used up reservations are skipped"""
+        now = self._clock()
+        expired = set()
+        while self._expiries and self._expiries[0][0] <= now:
+            expired.add(heapq.heappop(self._expiries)[1])
+        for game_id in expired:
+            if game_id in self._open:
+                self._place(game_id, self._open[game_id] - self._held(game_id))
+
+    def claim(self) -> Optional[str]:
+        """reserves a seat in the fullest lobby that has one, returns its game id or None"""
+        self._expire()
+        for free in sorted(self._buckets):
+            game_id = next(iter(self._buckets[free]))
+            expiry = self._clock() + self.RESERVATION_TTL
+            self._reservations.setdefault(game_id, []).append(expiry)
+            heapq.heappush(self._expiries, (expiry, game_id))
+            self._place(game_id, free - 1)
+            return game_id
+        return None
+
+
+type CreateGame = Callable[[str], Awaitable[Optional[GameMetadata]]]
+
+class MatchQueue:
+    """
+    Players waiting for a quick match. Requests arriving within BATCH_WINDOW are placed together:
+    into free seats of existing lobbies first, then into new games created for the rest.
+    """
+    BATCH_WINDOW = 0.1 # seconds to collect players before placing them
+    BATCH_SIZE = 32 # place right away once this many are waiting
+
+    _waiting : list[tuple[str, asyncio.Future]]
+    _flush_task : Optional[asyncio.Task]
+    _sleeping : bool # the flush task is still waiting out its delay and has taken no one yet
+
+    def __init__(self, seats : SeatIndex, create_game : CreateGame, games : dict[str, GameMetadata]):
+        self.seats = seats
+        self.create_game = create_game
+        self.games = games
+        self._waiting = []
+        self._flush_task = None
+        self._sleeping = False
+
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    async def join(self, player_name : str) -> GameMetadata:
+        """waits until player_name has a seat, raises RuntimeError when no game could be created or whatever else placing failed with"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((player_name, future))
+        if len(self._waiting) >= self.BATCH_SIZE:
+            self._schedule(0)
+        else:
+            self._schedule(self.BATCH_WINDOW)
+        return await future
+
+    def _schedule(self, delay : float):
+        if self._flush_task is not None and not self._flush_task.done():
+            if delay > 0 or not self._sleeping:
+                return # a running flush picks up everyone waiting
+            self._flush_task.cancel() # a full batch does not wait out the window
+        self._sleeping = delay > 0
+        self._flush_task = asyncio.create_task(self._flush(delay))
+
+    async def _flush(self, delay : float):
+        await asyncio.sleep(delay)
+        self._sleeping = False
+        while self._waiting:
+            batch = self._waiting[:self.BATCH_SIZE]
+            del self._waiting[:self.BATCH_SIZE]
+            try:
+                await self._place(batch)
+            except Exception as exc:
+                # fail the rest of the batch instead of leaving them waiting forever
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    async def _place(self, batch : list[tuple[str, asyncio.Future]]):
+        for player_name, future in batch:
+            if future.done():
+                continue
+            game_id = self.seats.claim()
+            if game_id is None:
+                game = await self.create_game(player_name)
+                if game is None:
+                    future.set_exception(RuntimeError("could not create game"))
+                    continue
+                self.seats.update(game)
+                game_id = self.seats.claim()
+            future.set_result(self.games[game_id])
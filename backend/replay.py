@@ -0,0 +1,74 @@
+"""
+Rebuilds games from their replay header and action log (see GameState.get_replay_header and GameState.action_log).
+Every random draw of a game comes from its seeded generator, so applying the same accepted actions
+to a new game with the same seed reproduces it exactly, for crash recovery, bug reports and benchmark fixtures.
+
+    python replay.py record.json    # a JSON file {"header": {...}, "log": [[opcode, ...], ...]}
+"""
+import sys
+import json
+import time
+from typing import Iterable
+from api_wrapper import PlayerActionChoice, PlayerCombatChoice
+from app_logging import AppLogger, NullLogger
+from card_library import DEFAULT_RULESET
+from gamestate import GameState, LOG_JOIN, LOG_LEAVE, LOG_READY, LOG_START, LOG_ACTION, LOG_ITEM, LOG_MONSTER, LOG_PLAYER
+
+
+def apply_entry(game: GameState, entry: tuple | list):
+    '''applies one action log entry to game'''
+    opcode, *args = entry
+    if opcode == LOG_JOIN:
+        game.add_player(*args)
+    elif opcode == LOG_LEAVE:
+        game.remove_player(*args)
+    elif opcode == LOG_READY:
+        game.set_player_lobby_ready(*args)
+    elif opcode == LOG_START:
+        game.start()
+    elif opcode == LOG_ACTION:
+        game.player_action(args[0], PlayerActionChoice(args[1]))
+    elif opcode == LOG_ITEM:
+        game.player_select_item(*args)
+    elif opcode == LOG_MONSTER:
+        game.player_select_monster(args[0], args[1], PlayerCombatChoice(args[2]))
+    elif opcode == LOG_PLAYER:
+        game.player_select_player(*args)
+    else:
+        raise ValueError(f'unknown action log opcode {opcode}')
+
+def replay(header: dict, log: Iterable[tuple | list], logger: AppLogger | NullLogger | None = None) -> GameState:
+    '''builds a new game from header and applies every entry of log to it, silently unless a logger is given'''
+    game = GameState(
+        header["id"], header["name"], header["owner"], header["max_players"],
+        allowed_items=header["allowed_items"], allowed_monsters=header["allowed_monsters"], ruleset=header.get("ruleset", DEFAULT_RULESET),
+        logger=logger or NullLogger(), seed=header["seed"],
+    )
+    for entry in log:
+        apply_entry(game, entry)
+    return game
+
+def state_digest(game: GameState) -> tuple:
+    '''everything that decides how a game goes on, without the process wide item and monster ids'''
+    players = tuple(
+        (p.name, p.coins, p.health, p.max_health, p.lobby_ready, tuple(p.captured_stars), tuple(i.name for i in p.items))
+        for p in game.players.values()
+    )
+    board = (tuple(game.deck.names()), tuple(game.shop.names()))
+    combat = game._combat_substate
+    if combat is not None:
+        board += (type(combat).__name__, combat.state, combat.player.name, combat.selected_idx, tuple(combat.selected_items),
+                  tuple((m.name, m.health) for m in combat.monsters))
+    return (game.status, game.turn_phase if game.status.name == "GAME" else None, game.get_active_player(), players, board, game._rng.getstate())
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1]) as f:
+        record = json.load(f)
+    start = time.perf_counter()
+    game = replay(record["header"], record["log"])
+    elapsed = time.perf_counter() - start
+    print(f'replayed {len(record["log"])} actions in {elapsed * 1000:.1f}ms')
+    print(f'status {game.status.name}, active player {game.get_active_player()}')
+    for player in game.players.values():
+        print(f'  {player.name}: {player.health} health, {player.coins} coins, stars {player.captured_stars}, items {[i.name for i in player.items]}')
@@ -1,9 +1,14 @@
 import os
 from typing import Optional
 import httpx
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from game_meta import GameMetadata
+from card_library import RULESETS, DEFAULT_RULESET
+from server_registry import ServerRegistry
+from lobby_feed import LobbyFeed
+from game_list import GameListCache
+from matchmaking import SeatIndex, MatchQueue
 import api_wrapper as api
 from app_logging import AppLogger
 from pydantic import BaseModel
@@ -13,56 +18,141 @@ from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global http_client
     await init_db()
     print("Database initialized")
+    http_client = httpx.AsyncClient(timeout=5.0)
     yield
+    await http_client.aclose()
     await teardown_db()
     print("Database connections closed")
 
 
 app = FastAPI(lifespan=lifespan)
 games_api_url = os.environ.get("GAMES_API_URL", "http://localhost:5001")
+http_client : httpx.AsyncClient # shared keep-alive pool to the game servers, opened in lifespan
 
 
 # In-memory storage for games
 
 games : dict[str, GameMetadata] = {}
+games_list_cache = GameListCache()
+game_servers = ServerRegistry()
+lobby_feed = LobbyFeed(lambda: [game.to_dict() for game in games.values()])
+open_seats = SeatIndex()
 
 logger = AppLogger(name='lobby_server', color='cyan')
 
+
+def game_changed(game: GameMetadata, event: str):
+    """refreshes the listing, seat index and feed after game was created or updated"""
+    games_list_cache.put(game)
+    open_seats.update(game)
+    lobby_feed.publish(event, game.to_dict())
+
+def game_deleted(game_id: str):
+    games_list_cache.remove(game_id)
+    open_seats.remove(game_id)
+    lobby_feed.publish("delete", {"id": game_id})
+
+
 @app.get("/games", status_code=200)
-def get_games():
-    #Get all games
-    logger.info("Client requested all games", console=True)
-    games_list = [game.to_dict() for game in games.values()]
-    return JSONResponse(games_list)
+def get_games(
+    request: Request,
+    status: Optional[api.GameStatus] = None,
+    min_open_seats: int = Query(0, ge=0, alias="open_seats"),
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """Get games, optionally filtered by status and minimum open seats, and paged with limit and the X-Next-Cursor header"""
+    etag = games_list_cache.etag()
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    body, next_cursor = games_list_cache.query(status, min_open_seats, cursor, limit)
+    headers = {"ETag": etag}
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = str(next_cursor)
+    return Response(body, media_type="application/json", headers=headers)
 
 class CreateGameRequest(BaseModel):
     name: str
     owner: str
     max_players: int = 4
+    ruleset: str = DEFAULT_RULESET
 
 @app.post("/games")
 async def create_lobby(data: CreateGameRequest):
+    if data.ruleset not in RULESETS:
+        return JSONResponse({"error": f'Unknown ruleset "{data.ruleset}"'}, 400)
     #Create new game
-    #TODO make process aswell
+    game = await create_game(data.name, data.owner, data.max_players, data.ruleset)
+    if game is None:
+        return JSONResponse({"error": "Could not create game"}, 500)
+
+    return {"id": game.id, "ws": game.ws}
 
-    game = GameMetadata( name=data.name, owner=data.owner, max_players=data.max_players )
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f'{games_api_url}/internal/{game.id}',
+async def create_game(name: str, owner: str, max_players: int, ruleset: str = DEFAULT_RULESET) -> Optional[GameMetadata]:
+    """creates the game on a game server and lists it, None if no game server accepted it"""
+    game = GameMetadata( name=name, owner=owner, max_players=max_players, ruleset=ruleset )
+
+    # least loaded game server, or the configured one until servers report in
+    server = game_servers.pick()
+    address = server.address if server else games_api_url
+    try:
+        response = await http_client.post(
+            f'{address}/internal/{game.id}',
             json=game.to_setup(),
         )
+    except httpx.HTTPError:
+        response = None
+
+    if response is None or response.status_code != 201:
+        logger.error(f'Failed to connect to game server "{address}"', console=True)
+        if server:
+            game_servers.failed(server)
+        return None
+
+    if server:
+        game_servers.placed(server)
+        game.ws = server.public_address
+    games[game.id] = game
+    game_changed(game, "create")
 
-    if response.status_code != 201:
-        logger.error("Failed to connect to game server", console=True)
+    logger.info(f'New game: "{game.id}" on "{address}"', console=True)
+    return game
+
+
+class QuickMatchRequest(BaseModel):
+    player_name: str
+
+QUICK_MATCH_PLAYERS = 4
+match_queue = MatchQueue(
+    open_seats,
+    lambda player_name: create_game(f"{player_name}'s quick match", player_name, QUICK_MATCH_PLAYERS),
+    games,
+)
+
+@app.post("/quickmatch")
+async def quick_match(data: QuickMatchRequest):
+    """Find a seat in an open lobby, or a new game, for a player"""
+    try:
+        game = await match_queue.join(data.player_name)
+    except RuntimeError:
         return JSONResponse({"error": "Could not create game"}, 500)
-    
-    games[game.id] = game
 
-    logger.info(f'New game: "{game.id}"', console=True)
+    logger.info(f'Matched "{data.player_name}" into game "{game.name}"', console=True)
+    return {"id": game.id, "ws": game.ws}
+
 
-    return {"id": game.id}
+@app.get("/games/stream")
+def stream_games():
+    """Server-Sent Events feed of all games: a snapshot, then create, update and delete events"""
+    return StreamingResponse(
+        lobby_feed.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/games/{game_id}")
@@ -80,14 +170,15 @@ class GameUpdate(BaseModel):
     num_players: int
     status: str
 
-@app.put("/games/{game_id}")
-async def update_game(game_id, data: GameUpdate):
-    """Update player count and status of game, only used internally"""
+class BulkGameUpdate(GameUpdate):
+    id: str
+
+def apply_game_update(game_id, data: GameUpdate) -> bool:
     game = games.get(game_id)
 
     if not game:
         logger.error("Server requested game that does not exist", console=True)
-        return JSONResponse({"error": "game not found"}, status_code=404)
+        return False
 
     game.num_players = data.num_players
     game.status = api.GameStatus[data.status]
@@ -95,13 +186,53 @@ async def update_game(game_id, data: GameUpdate):
     if game.status == api.GameStatus.ENDED:
         logger.info(f'Deleting game: "{games[game.id].name}"', console=True)
         del games[game.id]
+        game_deleted(game.id)
     else:
         logger.info(f'Updated game: "{games[game.id].name}"', console=True)
+        game_changed(game, "update")
+
+
+    return True
+
+
+@app.put("/games/{game_id}")
+async def update_game(game_id, data: GameUpdate):
+    """Update player count and status of game, only used internally"""
+    if not apply_game_update(game_id, data):
+        return JSONResponse({"error": "game not found"}, status_code=404)
 
     return {"response": "ok"}
 
+@app.put("/games")
+async def update_games(data: list[BulkGameUpdate]):
+    """Update player count and status of many games at once, only used internally"""
+    missing = [update.id for update in data if not apply_game_update(update.id, update)]
+    return {"response": "ok", "missing": missing}
+
+
+class ServerHeartbeat(BaseModel):
+    address: str
+    public_address: Optional[str] = None
+    games: int
+    connections: int
+    loop_lag: float
+
+@app.put("/servers/{server_id}")
+def server_heartbeat(server_id, data: ServerHeartbeat):
+    """Register or refresh a game server and its load, only used internally"""
+    if server_id not in game_servers.servers:
+        logger.info(f'Game server "{server_id}" registered at "{data.address}"', console=True)
+    game_servers.heartbeat(server_id, data.address, data.games, data.connections, data.loop_lag, data.public_address)
+    return {"response": "ok"}
+
+@app.get("/servers")
+def get_servers():
+    """Known game servers with their last reported load"""
+    return [server.to_dict() | {"healthy": game_servers.is_healthy(server)} for server in game_servers.servers.values()]
+
 
 """@app.route("/games/<game_id>/join", methods=["POST"])
+
 #TODO remove, move to WS, reimplement if auth needed
 def join_game(game_id):
     game = games.get(game_id)
@@ -0,0 +1,92 @@
+import time
+from typing import Optional
+
+
+class GameServerInfo:
+    """
+    last reported load of a game server
+    """
+    id : str
+    address : str
+    public_address : Optional[str]
+    games : int
+    connections : int
+    loop_lag : float
+    last_seen : float
+    pending : int
+
+    def __init__(self, id : str, address : str):
+        self.id = id
+        self.address = address
+        self.public_address = None
+        self.games = 0
+        self.connections = 0
+        self.loop_lag = 0.0
+        self.last_seen = 0.0
+        self.pending = 0
+
+    def load(self) -> float:
+        # games placed since the last heartbeat count too, so a burst of creates is spread out
+        return (self.games + self.pending) + ServerRegistry.CONNECTION_WEIGHT * self.connections + ServerRegistry.LAG_WEIGHT * self.loop_lag
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "address": self.address,
+            "public_address": self.public_address,
+            "games": self.games,
+            "connections": self.connections,
+            "loop_lag": self.loop_lag,
+            "pending": self.pending,
+        }
+
+
+class ServerRegistry:
+    """
+    Game servers known to the lobby, kept up to date by their heartbeats.
+    A server is healthy while its heartbeats are recent and its event loop is not lagging.
+    """
+    HEARTBEAT_TIMEOUT = 15.0 # seconds without a heartbeat before a server is skipped
+    MAX_LOOP_LAG = 0.25 # seconds of event loop lag before a server gets no new games
+    CONNECTION_WEIGHT = 0.25 # one game weighs as much as four connections
+    LAG_WEIGHT = 40.0 # 25ms of lag weighs as much as one game
+
+    servers : dict[str, GameServerInfo]
+
+    def __init__(self, clock=time.monotonic):
+        self.servers = {}
+        self._clock = clock
+
+    def heartbeat(self, server_id : str, address : str, games : int, connections : int, loop_lag : float, public_address : Optional[str] = None) -> GameServerInfo:
+        server = self.servers.get(server_id)
+        if server is None or server.address != address:
+            server = GameServerInfo(server_id, address)
+            self.servers[server_id] = server
+        server.public_address = public_address
+        server.games = games
+        server.connections = connections
+        server.loop_lag = loop_lag
+        server.last_seen = self._clock()
+        server.pending = 0
+        return server
+
+    def is_healthy(self, server : GameServerInfo) -> bool:
+        return self._clock() - server.last_seen <= self.HEARTBEAT_TIMEOUT and server.loop_lag <= self.MAX_LOOP_LAG
+
+    def healthy(self) -> list[GameServerInfo]:
+        return [server for server in self.servers.values() if self.is_healthy(server)]
+
+    def pick(self) -> Optional[GameServerInfo]:
+        """least loaded healthy server, None if there is none"""
+        return min(self.healthy(), key=GameServerInfo.load, default=None)
+
+    def placed(self, server : GameServerInfo):
+        """records a game placed on server until its next heartbeat reports it"""
+        server.pending += 1
+
+    def failed(self, server : GameServerInfo):
+        """stops placing games on server until it sends a heartbeat again"""
+        server.last_seen = float('-inf')
+
+    def remove(self, server_id : str):
+        self.servers.pop(server_id, None)
@@ -0,0 +1,206 @@
+"""
+Headless game simulator: plays complete games through GameState with bot policies, spread across processes.
+No sockets and no logging, so it doubles as a throughput benchmark of the rules engine
+and as a balance tool for library.yaml.
+
+Games have no end condition yet, each game is played for a number of rounds and the players
+with the most captured stars win it (a shared first place is a draw).
+
+    python simulator.py --games 2000 --players 4 --rounds 20 --policies greedy random
+"""
+import time
+import random
+import argparse
+import statistics
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+from api_wrapper import PlayerActionChoice, PlayerCombatChoice, TurnPhase
+from app_logging import NullLogger
+from gamestate import GameState
+
+
+# A policy takes one phase appropriate action for the given player, who is the active one
+type Policy = Callable[[GameState, str, random.Random], None]
+
+def random_policy(game: GameState, player: str, rng: random.Random):
+    '''uniformly random among the actions valid in the current phase'''
+    phase = game.turn_phase
+    combat = game._combat_substate
+    if phase == TurnPhase.CHOOSING_ACTION:
+        game.player_action(player, rng.choice([PlayerActionChoice.COINS, PlayerActionChoice.SHOP, PlayerActionChoice.HEALTH, PlayerActionChoice.COMBAT]))
+    elif phase == TurnPhase.SHOPPING:
+        game.player_action(player, rng.choice([PlayerActionChoice.SHOP, PlayerActionChoice.END]))
+    elif phase == TurnPhase.FLED:
+        if combat.monsters and rng.random() < 0.5:
+            game.player_select_monster(player, rng.randrange(len(combat.monsters)), PlayerCombatChoice.SELECT)
+        else:
+            game.player_action(player, PlayerActionChoice.END)
+    elif phase == TurnPhase.COMBAT_SELECT:
+        game.player_select_monster(player, rng.randrange(len(combat.monsters)), PlayerCombatChoice.SELECT)
+    elif phase == TurnPhase.COMBAT_ACTION:
+        choices = [PlayerCombatChoice.SPARE, PlayerCombatChoice.FLEE]
+        if isinstance(combat, GameState.NCombatSubstate): # a failed fight never hands leftover combat on
+            choices.append(PlayerCombatChoice.FIGHT)
+        game.player_select_monster(player, combat.selected_idx, rng.choice(choices))
+    elif phase == TurnPhase.COMBAT_FIGHT:
+        for i in range(len(combat.selected_items)):
+            if rng.random() < 0.5:
+                game.player_select_item(player, i)
+        game.player_select_monster(player, combat.selected_idx, PlayerCombatChoice.FIGHT)
+
+def greedy_policy(game: GameState, player: str, rng: random.Random):
+    '''buys a few items, then fights the weakest monster with everything it holds'''
+    phase = game.turn_phase
+    combat = game._combat_substate
+    me = game.players[player]
+    if phase == TurnPhase.CHOOSING_ACTION:
+        if me.health <= 1 and me.coins >= 2:
+            game.player_action(player, PlayerActionChoice.HEALTH)
+        elif me.items and (len(me.items) >= 2 or me.coins < 2):
+            game.player_action(player, PlayerActionChoice.COMBAT)
+        elif me.coins >= 2:
+            game.player_action(player, PlayerActionChoice.SHOP)
+        else:
+            game.player_action(player, PlayerActionChoice.COINS)
+    elif phase == TurnPhase.SHOPPING:
+        game.player_action(player, PlayerActionChoice.SHOP if len(me.items) < 3 else PlayerActionChoice.END)
+    elif phase == TurnPhase.FLED:
+        game.player_action(player, PlayerActionChoice.END)
+    elif phase == TurnPhase.COMBAT_SELECT:
+        weakest = min(range(len(combat.monsters)), key=lambda i: combat.monsters[i].health)
+        game.player_select_monster(player, weakest, PlayerCombatChoice.SELECT)
+    elif phase == TurnPhase.COMBAT_ACTION:
+        if isinstance(combat, GameState.NCombatSubstate) and me.items:
+            choice = PlayerCombatChoice.FIGHT
+        elif me.health > 1:
+            choice = PlayerCombatChoice.SPARE
+        else:
+            choice = PlayerCombatChoice.FLEE
+        game.player_select_monster(player, combat.selected_idx, choice)
+    elif phase == TurnPhase.COMBAT_FIGHT:
+        for i, selected in enumerate(combat.selected_items):
+            if not selected:
+                game.player_select_item(player, i)
+        game.player_select_monster(player, combat.selected_idx, PlayerCombatChoice.FIGHT)
+
+POLICIES: dict[str, Policy] = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+}
+
+
+def new_game(game_id: str, players: int, seed: int | None = None) -> GameState:
+    game = GameState(game_id, game_id, "p0", players, logger=NullLogger(), seed=seed)
+    for p in range(players):
+        game.add_player(f'p{p}', f'{game_id}_sid{p}')
+    game.start()
+    return game
+
+def simulate_game(seed: int, policies: list[str], rounds: int) -> dict:
+    '''
+    Plays one game with one player per policy for rounds full rounds.
+    Returns its turns, steps, stars per seat and winning seats. stuck is set if it stopped advancing,
+    error names the exception if the engine raised one, both end the game early.
+    '''
+    rng = random.Random(seed)
+    game = new_game(f'sim_{seed}', len(policies), seed=seed)
+    bots = {f'p{p}': POLICIES[name] for p, name in enumerate(policies)}
+    turns = steps = 0
+    stuck = False
+    error = None
+    while turns < rounds * len(policies):
+        steps += 1
+        if steps > (turns + 1) * 100:
+            stuck = True
+            break
+        seat = game._active_player
+        player = game.get_active_player() # during leftover combat the other players act in turn
+        try:
+            bots[player](game, player, rng)
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            break
+        if game._active_player != seat:
+            turns += 1
+
+    stars = [sum(game.players[f'p{p}'].captured_stars) for p in range(len(policies))]
+    best = max(stars)
+    return {
+        "turns": turns,
+        "steps": steps,
+        "stars": stars,
+        "winners": [p for p, s in enumerate(stars) if s == best],
+        "stuck": stuck,
+        "error": error,
+    }
+
+def _simulate_chunk(seeds: list[int], policies: list[str], rounds: int) -> list[dict]:
+    return [simulate_game(seed, policies, rounds) for seed in seeds]
+
+def simulate(games: int, policies: list[str], rounds: int = 20, workers: int | None = None, seed: int = 0, chunk_size: int = 50) -> dict:
+    '''
+    Plays games across a pool of worker processes (in process with workers=1)
+    and returns throughput, turn counts and the outcome distribution
+    '''
+    for name in policies:
+        if name not in POLICIES:
+            raise ValueError(f'unknown policy "{name}", expected one of {list(POLICIES)}')
+    chunks = [list(range(seed + start, seed + min(start + chunk_size, games))) for start in range(0, games, chunk_size)]
+
+    start = time.perf_counter()
+    if workers == 1:
+        results = [r for chunk in chunks for r in _simulate_chunk(chunk, policies, rounds)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_simulate_chunk, chunk, policies, rounds) for chunk in chunks]
+            results = [r for future in futures for r in future.result()]
+    elapsed = time.perf_counter() - start
+
+    wins = Counter()
+    draws = 0
+    for result in results:
+        if len(result["winners"]) > 1:
+            draws += 1
+        else:
+            wins[result["winners"][0]] += 1
+    turns = [r["turns"] for r in results]
+    return {
+        "games": len(results),
+        "seconds": elapsed,
+        "games_per_second": len(results) / elapsed if elapsed else float('inf'),
+        "turns_mean": statistics.fmean(turns),
+        "turns_min": min(turns),
+        "turns_max": max(turns),
+        "steps_mean": statistics.fmean(r["steps"] for r in results),
+        "stuck": sum(r["stuck"] for r in results),
+        "errors": Counter(r["error"] for r in results if r["error"]),
+        "draws": draws,
+        "wins": {f'p{seat} ({policies[seat]})': wins[seat] for seat in range(len(policies))},
+        "stars_mean": [statistics.fmean(r["stars"][seat] for r in results) for seat in range(len(policies))],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--policies", nargs="+", default=["random"], choices=list(POLICIES), help="policy per seat, repeated to fill all seats")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the number of CPUs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    policies = [args.policies[p % len(args.policies)] for p in range(args.players)]
+    report = simulate(args.games, policies, args.rounds, args.workers, args.seed)
+
+    print(f'{report["games"]} games in {report["seconds"]:.2f}s, {report["games_per_second"]:.1f} games/s')
+    print(f'turns/game {report["turns_mean"]:.1f} (min {report["turns_min"]}, max {report["turns_max"]}), {report["steps_mean"]:.1f} actions/game, {report["stuck"]} stuck')
+    for error, count in report["errors"].most_common():
+        print(f'  {count} games ended by {error}')
+    print(f'draws {report["draws"]} ({report["draws"] / report["games"]:.1%})')
+    for seat, (label, count) in enumerate(report["wins"].items()):
+        print(f'  {label:<14} wins {count:6d} ({count / report["games"]:6.1%})  stars/game {report["stars_mean"][seat]:.2f}')
+
+
+if __name__ == "__main__":
+    main()
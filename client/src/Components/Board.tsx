@@ -79,7 +79,7 @@ function Board() {
           active={gameState.active_player === p.name}
         />
       ))}
-      {myTurn && (
+      {myTurn && (gameState.legal?.actions.includes("END") ?? true) && (
         <>
           <Button variant="primary" className={"next-turn-button"} onClick={() => api.requestSendAction("END")}>
             <h3>Next Turn</h3>
@@ -33,9 +33,9 @@ function CreateRoom() {
       setLoading(false);
       return;
     }
-    const data: { id: string } = await response.json();
+    const data: { id: string; ws: string | null } = await response.json();
     console.log("created game: " + data);
-    navigate(`/play/${data.id}/lobby`);
+    navigate(`/play/${data.id}/lobby${data.ws ? `?ws=${encodeURIComponent(data.ws)}` : ""}`);
   };
 
   const handleBack = () => {
@@ -1,4 +1,4 @@
-import { useParams, Outlet, useNavigate } from "react-router-dom";
+import { useParams, Outlet, useNavigate, useSearchParams } from "react-router-dom";
 import { usePlayerName } from "./NameContext";
 import { useState, createContext, useContext, useRef, useEffect, type RefObject } from "react";
 import { io } from "socket.io-client";
@@ -19,6 +19,7 @@ export interface GameState {
   status: api.GameStatus;
   active_player?: string;
   turn_phase?: api.TurnPhase;
+  legal?: api.LegalActions;
   items?: api.ItemInfo[];
   monsters?: api.MonsterInfo[];
   boardItems?: api.ItemInfo[];
@@ -65,11 +66,15 @@ function Game() {
   const playerName = usePlayerName();
   const [gameState, setGameState] = useState<GameState | undefined>(undefined);
   const navigate = useNavigate();
+  // socket address of the game server hosting this game, the default server when absent
+  const [searchParams] = useSearchParams();
+  const server = searchParams.get("ws");
   const apiRef = useRef<api.GameAPI>(undefined);
   const { animations, onAnimationEvent, removeAnimation, registerRef } = useBoardAnimations();
 
   useEffect(() => {
-    const socket = io({ transports: ["websocket", "polling"] });
+    const options = { transports: ["websocket", "polling"] };
+    const socket = server ? io(server, options) : io(options);
     apiRef.current = new api.GameAPI(socket);
 
     const cleanup: (() => void)[] = [];
@@ -157,11 +162,11 @@ function Game() {
     setGameState(initState);
     console.log("Retrieved game data from game service.");
     if (initState.status == "GAME") {
-      navigate(`/play/${gameId}/board`);
+      navigate({ pathname: `/play/${gameId}/board`, search: searchParams.toString() });
     }
   };
 
-  const handleTurnChange = (new_player: string, phase: api.TurnPhase) => {
+  const handleTurnChange = (new_player: string, phase: api.TurnPhase, legal?: api.LegalActions) => {
     console.log("New player turn: ", new_player);
     if (phase != gameState?.turn_phase) {
       console.log(`Entering new turn phase: ${phase}`);
@@ -172,6 +177,7 @@ function Game() {
         ...prevState,
         active_player: new_player,
         turn_phase: new_player == playerName ? phase : "TURN_ENDED",
+        legal: new_player == playerName ? legal : undefined,
       };
     });
   };
@@ -208,7 +214,7 @@ function Game() {
         turn_phase: firstName == playerName ? "CHOOSING_ACTION" : "TURN_ENDED",
       };
     });
-    navigate(`/play/${gameId}/board`);
+    navigate({ pathname: `/play/${gameId}/board`, search: searchParams.toString() });
   };
 
   const handleHandUpdate = (items: api.ItemInfo[], selectedItems: boolean[]) => {
@@ -4,12 +4,14 @@ import Button from "react-bootstrap/Button";
 import Alert from "react-bootstrap/Alert";
 import Form from "react-bootstrap/Form";
 import { useSetPlayerName, usePlayerName } from "./NameContext";
+import configData from "../config.json";
 
 function Homepage() {
   const navigate = useNavigate();
   const name = usePlayerName();
   const setPlayerName = useSetPlayerName();
   const [showAlert, setShowAlert] = useState(false);
+  const [isMatching, setMatching] = useState(false);
 
   const handleJoin = () => {
     if (name == "") {
@@ -27,6 +29,31 @@ function Homepage() {
     }
   };
 
+  const handleQuickMatch = async () => {
+    if (name == "") {
+      setShowAlert(true);
+      return;
+    }
+    setMatching(true);
+    const response = await fetch(`${configData.LOBBY_URL}/quickmatch`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({ player_name: name }),
+    });
+    setMatching(false);
+
+    if (!response.ok) {
+      const error = await response.json();
+      console.error("Quick match failed:", error);
+      alert(`Quick match failed: ${error.error || response.statusText}`);
+      return;
+    }
+    const data: { id: string; ws: string | null } = await response.json();
+    navigate(`/play/${data.id}/lobby${data.ws ? `?ws=${encodeURIComponent(data.ws)}` : ""}`);
+  };
+
   return (
     <>
       <h1>Fight Spare Flee</h1>
@@ -45,9 +72,12 @@ function Homepage() {
       <Button variant="primary" className="me-2" size="lg" onClick={handleJoin}>
         Join
       </Button>
-      <Button variant="primary" size="lg" onClick={handleHost}>
+      <Button variant="primary" className="me-2" size="lg" onClick={handleHost}>
         Host
       </Button>
+      <Button variant="success" size="lg" onClick={handleQuickMatch} disabled={isMatching}>
+        {isMatching ? "Matching..." : "Quick Match"}
+      </Button>
     </>
   );
 }
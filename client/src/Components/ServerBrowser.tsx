@@ -13,6 +13,7 @@ interface Room {
   status: GameStatus;
   num_players: number;
   max_players: number;
+  ws: string | null;
 }
 
 function ServerBrowser() {
@@ -22,8 +23,8 @@ function ServerBrowser() {
   const [rooms, setRooms] = useState<Room[]>([]);
   const [loading, setLoading] = useState(true);
 
-  const handleJoinRoom = async (roomId: string) => {
-    navigate(`/play/${roomId}/lobby`);
+  const handleJoinRoom = async (room: Room) => {
+    navigate(`/play/${room.id}/lobby${room.ws ? `?ws=${encodeURIComponent(room.ws)}` : ""}`);
   };
 
   const handleBack = () => {
@@ -50,7 +51,25 @@ function ServerBrowser() {
   };
 
   useEffect(() => {
-    fetchRooms();
+    // live feed: a snapshot of all rooms, then only the rooms that were created, changed or deleted
+    const feed = new EventSource(`${roomsAPI}/stream`);
+    feed.addEventListener("snapshot", (event) => {
+      setRooms(JSON.parse(event.data));
+      setLoading(false);
+    });
+    feed.addEventListener("create", (event) => {
+      const room: Room = JSON.parse(event.data);
+      setRooms((prev) => [...prev.filter((r) => r.id != room.id), room]);
+    });
+    feed.addEventListener("update", (event) => {
+      const room: Room = JSON.parse(event.data);
+      setRooms((prev) => prev.map((r) => (r.id == room.id ? room : r)));
+    });
+    feed.addEventListener("delete", (event) => {
+      const { id }: { id: string } = JSON.parse(event.data);
+      setRooms((prev) => prev.filter((r) => r.id != id));
+    });
+    return () => feed.close();
   }, []);
 
   const createRoomRow = (room: Room) => {
@@ -68,7 +87,7 @@ function ServerBrowser() {
           {room.num_players}/{room.max_players}
         </h3>
         <p className="m-auto">{room.owner}</p>
-        <Button onClick={() => handleJoinRoom(room.id)} variant="success" className="m-auto">
+        <Button onClick={() => handleJoinRoom(room)} variant="success" className="m-auto">
           Join
         </Button>
       </Stack>
@@ -82,9 +82,86 @@ export interface HandResponse {
   selected_items: boolean[];
 }
 
+// What the active player may request in the current phase, the server turns away anything else
+export interface LegalActions {
+  actions: PlayerActionChoice[];
+  combat: PlayerCombatChoice[];
+  monsters: number[];
+  items: number[];
+  players: string[];
+}
+
 export interface TurnResponse {
   active: string;
   phase: TurnPhase;
+  legal?: LegalActions;
+}
+
+// Players and board are sequenced, either full or a delta against the section with seq == base
+export interface SectionEnvelope<T, D> {
+  seq: number;
+  base?: number;
+  full?: T;
+  delta?: D;
+}
+
+export interface KeyedDelta<T> {
+  changed?: Record<string, Partial<T>>;
+  removed?: (string | number)[];
+  order?: (string | number)[];
+}
+
+export interface BoardDelta {
+  fields?: Partial<Omit<BoardResponse, "monsters">>;
+  monsters?: KeyedDelta<MonsterInfo>;
+}
+
+// Exact odds of each combat choice against one monster with the current hand, sent to the asking player only
+export interface ChoiceOdds {
+  success: number;
+  coins: number;
+  stars: number;
+  health: number;
+}
+
+export interface CombatOdds {
+  monster: number;
+  fight: ChoiceOdds;
+  spare: ChoiceOdds;
+  flee: ChoiceOdds;
+}
+
+// State updates are coalesced by the server into one patch per tick, only changed sections are present
+export interface StatePatch {
+  version: number;
+  players?: SectionEnvelope<PlayerInfo[], KeyedDelta<PlayerInfo>>;
+  turn?: TurnResponse;
+  board?: SectionEnvelope<BoardResponse, BoardDelta>;
+  hand?: HandResponse;
+}
+
+type PatchSection = "players" | "turn" | "board" | "hand";
+type SequencedSection = "players" | "board";
+const PATCH_SECTIONS: PatchSection[] = ["players", "turn", "board", "hand"];
+
+function applyKeyedDelta<T>(prev: T[], delta: KeyedDelta<T>, key: keyof T): T[] {
+  const byKey = new Map<string, T>(prev.map((entity) => [String(entity[key]), entity]));
+  for (const [k, fields] of Object.entries(delta.changed ?? {})) {
+    byKey.set(k, { ...byKey.get(k), ...fields } as T);
+  }
+  for (const k of delta.removed ?? []) {
+    byKey.delete(String(k));
+  }
+  const order = delta.order ? delta.order.map(String) : [...byKey.keys()];
+  return order.map((k) => byKey.get(k)).filter((entity): entity is T => entity !== undefined);
+}
+
+function applyBoardDelta(prev: BoardResponse, delta: BoardDelta): BoardResponse {
+  return {
+    ...prev,
+    ...delta.fields,
+    monsters: delta.monsters ? applyKeyedDelta(prev.monsters, delta.monsters, "id") : prev.monsters,
+  };
 }
 
 // Client -> Server Packages
@@ -120,6 +197,28 @@ export interface PlayerChoiceRequest {
   player: string;
 }
 
+// One request of a compound request, exactly one of action, combat (with target), items or player
+export interface CompoundStep {
+  action?: PlayerActionChoice;
+  combat?: PlayerCombatChoice;
+  target?: number;
+  items?: number[];
+  player?: string;
+}
+
+// Played in order in one go and sent back as one update, up to the first step that is not legal by then
+export interface CompoundRequest {
+  steps: CompoundStep[];
+}
+
+export interface OddsRequest {
+  monster?: number;
+}
+
+export interface ResyncRequest {
+  sections: SequencedSection[];
+}
+
 //Cosmetic Types
 
 export type SimpleLocation = "shop" | "deck" | "coins" | "health" | "player";
@@ -168,12 +267,114 @@ export interface Animation {
 
 export class GameAPI {
   socket: Socket;
+  stateVersion: number = 0;
+  private sequenced: Partial<Record<SequencedSection, { seq: number; data: any }>> = {};
+  private resyncPending = new Set<SequencedSection>();
+  private playerName?: string;
+  private turn?: TurnResponse;
+  private patchHandlers: Record<PatchSection, ((data: any) => void)[]> = {
+    players: [],
+    turn: [],
+    board: [],
+    hand: [],
+  };
+
   constructor(socket: Socket) {
     this.socket = socket;
+    this.socket.on("STATE_PATCH", (patch: StatePatch) => this.applyStatePatch(patch));
+  }
+
+  private applyStatePatch(patch: StatePatch) {
+    if (patch.version <= this.stateVersion) {
+      console.log(`dropping stale state patch ${patch.version}`);
+      return;
+    }
+    this.stateVersion = patch.version;
+    if (patch.turn) {
+      this.turn = patch.turn;
+    }
+    const resolved: Partial<Record<PatchSection, unknown>> = { turn: patch.turn, hand: patch.hand };
+    if (patch.players) {
+      resolved.players = this.resolveSection("players", patch.players, (prev, delta) =>
+        applyKeyedDelta(prev, delta, "name"),
+      );
+    }
+    if (patch.board) {
+      resolved.board = this.resolveSection("board", patch.board, applyBoardDelta);
+    }
+    for (const section of PATCH_SECTIONS) {
+      const data = resolved[section];
+      if (data !== undefined) {
+        this.patchHandlers[section].forEach((handler) => handler(data));
+      }
+    }
+  }
+
+  // Returns the up to date section, or undefined (and asks for a resync) if a delta was missed
+  private resolveSection<T, D>(
+    section: SequencedSection,
+    envelope: SectionEnvelope<T, D>,
+    apply: (prev: T, delta: D) => T,
+  ): T | undefined {
+    if (envelope.full !== undefined) {
+      this.sequenced[section] = { seq: envelope.seq, data: envelope.full };
+      this.resyncPending.delete(section);
+      return envelope.full;
+    }
+    const current = this.sequenced[section];
+    if (!current || current.seq !== envelope.base || envelope.delta === undefined) {
+      this.requestResync(section);
+      return undefined;
+    }
+    const data = apply(current.data, envelope.delta);
+    this.sequenced[section] = { seq: envelope.seq, data: data };
+    return data;
+  }
+
+  private onPatchSection<T>(section: PatchSection, handler: (data: T) => void, cleanup?: any[]) {
+    this.patchHandlers[section].push(handler);
+    cleanup?.push(() => {
+      this.patchHandlers[section] = this.patchHandlers[section].filter((h) => h !== handler);
+    });
+  }
+
+  // Legal actions of this player from the last turn update, undefined until one arrived
+  private myLegalActions(): LegalActions | undefined {
+    if (!this.turn?.legal) return undefined;
+    if (this.turn.active !== this.playerName) return { actions: [], combat: [], monsters: [], items: [], players: [] };
+    return this.turn.legal;
+  }
+
+  isLegalAction(choice: PlayerActionChoice): boolean {
+    return this.myLegalActions()?.actions.includes(choice) ?? true;
+  }
+
+  isLegalCombat(choice: PlayerCombatChoice, target: number): boolean {
+    const legal = this.myLegalActions();
+    return !legal || (legal.combat.includes(choice) && legal.monsters.includes(target));
+  }
+
+  isLegalItem(item: number): boolean {
+    return this.myLegalActions()?.items.includes(item) ?? true;
+  }
+
+  isLegalPlayer(player: string): boolean {
+    return this.myLegalActions()?.players.includes(player) ?? true;
+  }
+
+  // Forgets the versions and seqs of the last server, a new one (after a restart or failover) counts from scratch
+  private resetState() {
+    this.stateVersion = 0;
+    this.sequenced = {};
+    this.resyncPending.clear();
+    this.turn = undefined;
   }
 
   // Client → Server methods
   requestJoinGame(game_id: string, player_name: string) {
+    // joins are sent on every (re)connect, the server on the other end may not be the one patches came from so far
+    this.resetState();
+    this.playerName = player_name;
     const data: JoinRequest = { game_id: game_id, player_name: player_name };
     this.socket.emit("JOIN", data);
     console.log(`sending join request to server: ${player_name}, ${game_id}`);
@@ -197,29 +398,90 @@ export class GameAPI {
   }
 
   requestSendAction(choice: PlayerActionChoice) {
+    if (!this.isLegalAction(choice)) {
+      console.log(`not sending action ${choice}, it is not legal now`);
+      return;
+    }
     const req: ActionRequest = { choice: choice };
     this.socket.emit("ACTION", req);
     console.log(`sending action request to server ${choice}`);
   }
 
   requestSendCombat(choice: PlayerCombatChoice, target: number) {
+    if (!this.isLegalCombat(choice, target)) {
+      console.log(`not sending combat request ${choice}, ${target}, it is not legal now`);
+      return;
+    }
     const req: CombatRequest = { combat: choice, target: target };
     this.socket.emit("COMBAT", req);
     console.log(`sending combat request to server: ${choice}, ${target}`);
   }
 
   requestSendItemChoice(item: number) {
+    if (!this.isLegalItem(item)) {
+      console.log(`not sending item select ${item}, it is not legal now`);
+      return;
+    }
     const req: ItemChoiceRequest = { item: item };
     this.socket.emit("ITEM_CHOICE", req);
     console.log(`sending item select request to server ${item}`);
   }
 
+  requestResync(section: SequencedSection) {
+    if (this.resyncPending.has(section)) return;
+    this.resyncPending.add(section);
+    const req: ResyncRequest = { sections: [section] };
+    this.socket.emit("RESYNC", req);
+    console.log(`missed ${section} update, sending resync request to server`);
+  }
+
   requestSendPlayerChoice(target: string) {
+    if (!this.isLegalPlayer(target)) {
+      console.log(`not sending player select ${target}, it is not legal now`);
+      return;
+    }
     const req: PlayerChoiceRequest = { player: target };
     this.socket.emit("PLAYER_CHOICE", req);
     console.log(`sending player select request to server ${target}`);
   }
 
+  requestCompound(steps: CompoundStep[]) {
+    const first = steps[0];
+    if (!first) return;
+    const legal =
+      first.action !== undefined ? this.isLegalAction(first.action)
+      : first.combat !== undefined ? this.isLegalCombat(first.combat, first.target ?? -1)
+      : first.player !== undefined ? this.isLegalPlayer(first.player)
+      : (first.items ?? []).every((item) => this.isLegalItem(item));
+    if (!legal) {
+      console.log(`not sending compound request, its first step is not legal now`);
+      return;
+    }
+    const req: CompoundRequest = { steps: steps };
+    this.socket.emit("COMPOUND", req);
+    console.log(`sending ${steps.length} step compound request to server`);
+  }
+
+  // Selects the monster if that is still to do, fights it and uses the items at these hand positions, in one request
+  requestFight(monster: number, items: number[]) {
+    const steps: CompoundStep[] = [];
+    const phase = this.turn?.phase;
+    if (phase === "COMBAT_SELECT" || phase === "FLED") {
+      steps.push({ combat: "SELECT", target: monster });
+    }
+    if (phase !== "COMBAT_FIGHT") {
+      steps.push({ combat: "FIGHT", target: monster });
+    }
+    steps.push({ items: items }, { combat: "FIGHT", target: monster });
+    this.requestCompound(steps);
+  }
+
+  requestOdds(monster?: number) {
+    const req: OddsRequest = { monster: monster };
+    this.socket.emit("ODDS", req);
+    console.log(`sending odds request to server ${monster ?? "selected"}`);
+  }
+
   // Server → Client event listener
   onInit(handler: (data: InitResponse) => void, cleanup?: any[]) {
     this.socket.on("INIT", handler);
@@ -227,8 +489,7 @@ export class GameAPI {
   }
 
   onPlayers(handler: (players: PlayerInfo[]) => void, cleanup?: any[]) {
-    this.socket.on("PLAYERS", handler);
-    cleanup?.push(() => this.socket.off("PLAYERS", handler));
+    this.onPatchSection("players", handler, cleanup);
   }
 
   onChat(handler: (data: Message) => void, cleanup?: any[]) {
@@ -241,9 +502,8 @@ export class GameAPI {
     cleanup?.push(() => this.socket.off("START_GAME", handler));
   }
 
-  onTurn(handler: (active_player: string, TurnPhase: TurnPhase) => void, cleanup?: any[]) {
-    this.socket.on("CHANGE_TURN", (data: TurnResponse) => handler(data.active, data.phase));
-    cleanup?.push(() => this.socket.off("CHANGE_TURN", handler));
+  onTurn(handler: (active_player: string, TurnPhase: TurnPhase, legal?: LegalActions) => void, cleanup?: any[]) {
+    this.onPatchSection("turn", (data: TurnResponse) => handler(data.active, data.phase, data.legal), cleanup);
   }
 
   onBoard(
@@ -256,15 +516,20 @@ export class GameAPI {
     ) => void,
     cleanup?: any[],
   ) {
-    this.socket.on("BOARD", (data: BoardResponse) =>
-      handler(data.deck_size, data.shop_size, data.monsters, data.selected_monster, data.items),
+    this.onPatchSection(
+      "board",
+      (data: BoardResponse) => handler(data.deck_size, data.shop_size, data.monsters, data.selected_monster, data.items),
+      cleanup,
     );
-    cleanup?.push(() => this.socket.off("BOARD", handler));
   }
 
   onHandUpdate(handler: (items: ItemInfo[], selcted_items: boolean[]) => void, cleanup?: any[]) {
-    this.socket.on("ITEMS", (data: HandResponse) => handler(data.items, data.selected_items));
-    cleanup?.push(() => this.socket.off("ITEMS", handler));
+    this.onPatchSection("hand", (data: HandResponse) => handler(data.items, data.selected_items), cleanup);
+  }
+
+  onOdds(handler: (odds: CombatOdds) => void, cleanup?: any[]) {
+    this.socket.on("ODDS", handler);
+    cleanup?.push(() => this.socket.off("ODDS", handler));
   }
 
   onAnimationEvent(handler: (animationInfo: Animation) => void, cleanup?: any[]) {
@@ -0,0 +1,115 @@
+import os
+import dataclasses
+import pytest
+from card_library import ITEM_TEMPLATES, MONSTER_TEMPLATES, RULESETS, DEFAULT_RULESET, compile_library, read_artifact, load_library, card_table
+from gamestate import GameState, Item, Monster, Player
+
+
+@pytest.mark.unit
+def test_cards_share_their_template():
+    name = next(iter(MONSTER_TEMPLATES))
+    first, second = Monster.construct_from_id(name), Monster.construct_from_id(name)
+    assert first.template is second.template and first.id != second.id
+    first.health -= 1
+    assert second.health == second.max_health == MONSTER_TEMPLATES[name].health
+    assert first.stars == MONSTER_TEMPLATES[name].stars
+
+    name = next(iter(ITEM_TEMPLATES))
+    item = Item.construct_from_id(name)
+    assert item.template is ITEM_TEMPLATES[name] and item.text == ITEM_TEMPLATES[name].text
+
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        MONSTER_TEMPLATES[first.name].health = 100
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        item.effect.damage = 100
+    with pytest.raises(KeyError):
+        Item.construct_from_id("no such item")
+
+
+@pytest.mark.unit
+def test_entities_are_slotted():
+    for entity in (Item.construct_from_id(next(iter(ITEM_TEMPLATES))), Monster.construct_from_id(next(iter(MONSTER_TEMPLATES))),
+                   Player("bob", "aaa"), GameState.NCombatSubstate([], Player("bob", "aaa"))):
+        assert not hasattr(entity, "__dict__")
+
+
+@pytest.mark.unit
+def test_templates_encode_like_the_models():
+    item = Item.construct_from_id(next(iter(ITEM_TEMPLATES)))
+    assert item.get_api_status_json() == item.get_api_status().model_dump(mode='json')
+    assert Item.info_from_id(item.name) is item.template.info
+
+    monster = Monster.construct_from_id(next(iter(MONSTER_TEMPLATES)))
+    assert monster.get_api_status_json() == monster.get_api_status().model_dump(mode='json')
+    monster.visible = True
+    monster.health -= 1
+    monster.touch()
+    assert monster.get_api_status_json() == monster.get_api_status().model_dump(mode='json')
+
+
+@pytest.mark.unit
+def test_library_is_validated_and_cached(tmp_path):
+    with pytest.raises(ValueError, match="unknown effect"):
+        compile_library("items: {bad: {text: x, effect: {id: NOPE}}}")
+    with pytest.raises(ValueError, match="bad params"):
+        compile_library("items: {bad: {text: x, effect: {id: DIRECT_DAMAGE, params: {damage: 1}}}}")
+    with pytest.raises(ValueError, match="spare_coins"):
+        compile_library("monsters: {bad: {stars: 1, health: 1, spare: 1, flee_coins: 1, fight_coins: 1}}")
+    with pytest.raises(ValueError, match='"bad" needs 1 to 3 stars'):
+        compile_library("monsters: {bad: {stars: 4, health: 1, spare: 1, flee_coins: 1, spare_coins: 1, fight_coins: 1}}")
+
+    source, artifact = tmp_path / "library.yaml", str(tmp_path / "library.bin")
+    source.write_text("monsters: {a: {stars: 1, health: 2, spare: 3, flee_coins: 1, spare_coins: 2, fight_coins: 3}}")
+    assert read_artifact(str(source), artifact) is None
+    compiled = load_library(str(source), artifact)
+    assert compiled["monsters"] == {"a": (1, 2, 3, 1, 2, 3, "common")}
+    assert read_artifact(str(source), artifact) == compiled
+
+    # editing the yaml makes the artifact stale until the next load rebuilds it
+    source.write_text("monsters: {b: {stars: 1, health: 2, spare: 3, flee_coins: 1, spare_coins: 2, fight_coins: 3}}")
+    os.utime(source, ns=(0, 0))
+    assert read_artifact(str(source), artifact) is None
+    assert list(load_library(str(source), artifact)["monsters"]) == ["b"]
+    assert list(read_artifact(str(source), artifact)["monsters"]) == ["b"]
+
+
+@pytest.mark.unit
+def test_rulesets_compile_to_weighted_recipes():
+    compiled = compile_library("""
+rarities: {common: 10, rare: 1}
+items:
+  sword: {text: x}
+  crown: {text: x, rarity: rare}
+monsters:
+  rat: {stars: 1, health: 1, spare: 1, flee_coins: 1, spare_coins: 1, fight_coins: 1}
+  dragon: {stars: 3, health: 9, spare: 6, flee_coins: 1, spare_coins: 1, fight_coins: 9, rarity: rare}
+rulesets:
+  dragons_only: {monsters: [dragon]}
+  rat_race: {monsters: {rat: 5, dragon: 1}, items: [sword]}
+""")
+    assert compiled["rulesets"]["default"] == {"items": (["sword", "crown"], [10, 1]), "monsters": (["rat", "dragon"], [10, 1])}
+    assert compiled["rulesets"]["dragons_only"]["monsters"] == (["dragon"], [1])
+    assert compiled["rulesets"]["rat_race"] == {"items": (["sword"], [10]), "monsters": (["rat", "dragon"], [5, 1])}
+
+    with pytest.raises(ValueError, match="unknown rarity"):
+        compile_library("items: {sword: {text: x, rarity: mythic}}")
+    with pytest.raises(ValueError, match="unknown monsters ghost"):
+        compile_library("rulesets: {haunted: {monsters: [ghost]}}")
+    with pytest.raises(ValueError, match="positive weight"):
+        compile_library("items: {sword: {text: x}}\nrulesets: {broken: {items: {sword: 0}}}")
+
+
+@pytest.mark.unit
+def test_games_share_their_ruleset_tables():
+    first = GameState("1", "a", "bob", 4)
+    second = GameState("2", "b", "bob", 4)
+    assert first.deck.table is second.deck.table is RULESETS[DEFAULT_RULESET].monsters
+    assert first.shop.table is second.shop.table is RULESETS[DEFAULT_RULESET].items
+    assert first.get_replay_header()["ruleset"] == DEFAULT_RULESET
+
+    monsters = [next(iter(MONSTER_TEMPLATES))]
+    restricted = GameState("3", "c", "bob", 4, allowed_monsters=monsters)
+    assert restricted.deck.table is card_table("monsters", tuple(monsters))
+
+    with pytest.raises(ValueError, match="unknown ruleset"):
+        GameState("4", "d", "bob", 4, ruleset="no such ruleset")
@@ -0,0 +1,63 @@
+import random
+from collections import Counter
+import pytest
+from alias_table import AliasTable
+from card_pile import CardPile
+from gamestate import GameState
+from api_wrapper import PlayerActionChoice
+from app_logging import NullLogger
+
+
+@pytest.mark.unit
+def test_cards_are_built_only_when_drawn():
+    built = []
+    def build(name):
+        built.append(name)
+        return name.upper()
+
+    pile = CardPile(AliasTable(["a", "b", "c"]), build, random.Random(1), size=5)
+    assert len(pile) == 0
+    pile.refill()
+    assert len(pile) == 5 and built == []
+
+    top = pile.names()
+    assert pile.draw(2) == [name.upper() for name in top[:2]]
+    assert built == top[:2] and pile.names() == top[2:]
+
+    # not enough cards left, the pile refills before drawing
+    drawn = pile.draw(4)
+    assert len(drawn) == 4 and len(pile) == 1
+
+    pile.load(["c", "a"])
+    assert pile.pop() == "C" and pile.names() == ["a"]
+
+
+@pytest.mark.unit
+def test_alias_table_draws_by_weight():
+    table = AliasTable(["common", "uncommon", "rare", "never"], [60, 30, 9.99, 0.01])
+    counts = Counter(table.types[i] for i in table.sample(random.Random(3), 100000))
+    for name in table.types:
+        assert counts[name] / 100000 == pytest.approx(table.probability(name), abs=0.005)
+
+    # equal weights draw exactly like random.choices, so uniform decks are unchanged
+    uniform = AliasTable(["a", "b", "c"])
+    assert list(uniform.sample(random.Random(4), 50)) == random.Random(4).choices(range(3), k=50)
+
+    with pytest.raises(ValueError):
+        AliasTable(["a", "b"], [1, 0])
+    with pytest.raises(ValueError):
+        AliasTable([])
+
+
+@pytest.mark.unit
+def test_shop_refills_when_bought_out():
+    game = GameState("123", "test", "bob", 4, logger=NullLogger(), seed=2)
+    game.add_player("bob", "aaa")
+    game.start()
+    bob = game.players["bob"]
+    for _ in range(game.shop.size + 5):
+        bob.coins = 2 # buying ends the turn, and bob is the only player
+        bob.items.clear()
+        game.player_action("bob", PlayerActionChoice.SHOP)
+    assert len(game.shop) == game.shop.size - 5
+    assert len(game.action_log) == 2 + game.shop.size + 5
@@ -0,0 +1,86 @@
+import asyncio
+import random
+import pytest
+from api_wrapper import GameStatus
+from app_logging import NullLogger
+from checkpoint import Checkpointer, MAGIC, dump_game, dumps, loads, restore
+from gamestate import GameState
+from replay import state_digest
+from simulator import new_game, POLICIES
+
+
+def play(game: GameState, steps: int, rng: random.Random):
+    for _ in range(steps):
+        player = game.get_active_player()
+        POLICIES["random"](game, player, rng)
+
+
+@pytest.mark.unit
+def test_restored_games_play_on_identically():
+    games = []
+    for seed in range(30):
+        game = new_game(f'g{seed}', 3, seed=seed)
+        play(game, seed * 2, random.Random(seed))
+        games.append(game)
+    games[0].remove_player("p1")
+    lobby = GameState("lobby", "lobby", "bob", 4, logger=NullLogger(), seed=1)
+    lobby.add_player("bob", "aaa")
+    games.append(lobby)
+
+    restored = restore(dumps([dump_game(game) for game in games]), NullLogger())
+    assert [game._id for game in restored] == [game._id for game in games]
+    assert list(restored[0]._left_players) == ["p1"]
+    assert restored[-1].status == GameStatus.LOBBY and restored[-1].players["bob"].sid == "aaa"
+    for game, copy in zip(games, restored):
+        assert state_digest(copy) == state_digest(game)
+        assert copy.action_log == game.action_log
+
+    # the seeded generator picks up where it left off
+    for game, copy in zip(games[1:-1], restored[1:-1]):
+        play(game, 40, random.Random(1))
+        play(copy, 40, random.Random(1))
+        assert state_digest(copy) == state_digest(game)
+
+
+@pytest.mark.unit
+def test_loads_rejects_other_files():
+    with pytest.raises(ValueError):
+        loads(b"not a checkpoint")
+    with pytest.raises(ValueError):
+        loads(MAGIC + b"\xff\xff" + b"data")
+
+
+@pytest.mark.unit
+def test_checkpointer_writes_and_loads(tmp_path):
+    checkpointer = Checkpointer(str(tmp_path / "checkpoints" / "games.ckpt"))
+    assert checkpointer.load() == []
+
+    game = new_game("g", 2, seed=3)
+    games = {game._id: game}
+    first = checkpointer.snapshot(games)
+    assert checkpointer.snapshot(games)[0] is first[0] # unchanged games are not dumped again
+    play(game, 5, random.Random(3))
+    assert checkpointer.snapshot(games)[0] is not first[0]
+
+    asyncio.run(checkpointer.save(games))
+    [loaded] = checkpointer.load()
+    assert state_digest(loaded) == state_digest(game)
+
+    # a late write of an older checkpoint does not replace a newer one
+    assert checkpointer._write(0, first) is None
+    assert state_digest(checkpointer.load()[0]) == state_digest(game)
+
+
+@pytest.mark.unit
+def test_restored_players_rejoin_their_seats():
+    game = new_game("g", 3, seed=2)
+    play(game, 10, random.Random(2))
+    [copy] = restore(dumps([dump_game(game)]), NullLogger())
+    before = state_digest(copy)
+
+    for name in ("p0", "p1", "p2"):
+        player = copy.players[name]
+        copy.add_player(name, f'new_{name}')
+        assert copy.players[name] is player and player.sid == f'new_{name}'
+    assert copy._turn_order == game._turn_order
+    assert state_digest(copy) == before
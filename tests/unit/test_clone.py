@@ -0,0 +1,56 @@
+import copy
+import random
+import pytest
+from replay import state_digest
+from simulator import new_game, random_policy
+
+
+def play(game, steps: int, seed: int):
+    rng = random.Random(seed)
+    for _ in range(steps):
+        random_policy(game, game.get_active_player(), rng)
+
+
+@pytest.mark.unit
+def test_clones_play_on_without_touching_the_original():
+    in_combat = 0
+    for seed in range(30):
+        game = new_game(f'g{seed}', 3, seed=seed)
+        play(game, seed * 2, seed)
+        in_combat += game._combat_substate is not None
+        before = state_digest(game)
+
+        # branches see the same future as the game itself, twice from the cached generator state
+        branches = [game.clone(), game.clone()]
+        for branch in branches:
+            assert state_digest(branch) == before
+            play(branch, 20, seed + 1)
+        assert state_digest(game) == before
+        assert state_digest(branches[0]) == state_digest(branches[1])
+
+        play(game, 20, seed + 1)
+        assert state_digest(game) == state_digest(branches[0])
+        assert branches[0].action_log == game.action_log[-len(branches[0].action_log):]
+    assert in_combat > 0
+
+
+@pytest.mark.unit
+def test_clones_share_only_what_never_changes():
+    game, rng = new_game("g", 3, seed=4), random.Random(4)
+    for _ in range(100):
+        random_policy(game, game.get_active_player(), rng)
+        if game._combat_substate is not None and game.players[game._combat_substate.player.name].items:
+            break
+    branch = game.clone()
+
+    assert branch.players.keys() == game.players.keys()
+    for name, player in game.players.items():
+        assert branch.players[name] is not player and branch.players[name].items == player.items
+    combat, branch_combat = game._combat_substate, branch._combat_substate
+    assert type(branch_combat) is type(combat) and branch_combat.player is branch.players[combat.player.name]
+    assert all(m is not n and m.template is n.template for m, n in zip(branch_combat.monsters, combat.monsters))
+    assert branch.deck.table is game.deck.table and branch.deck._rng is branch._rng is not game._rng
+    assert branch._event_bus.listeners == {} and branch.action_log == []
+
+    # the card templates are shared by deep copies too
+    assert copy.deepcopy(game).deck.draw(1)[0].template is game.deck.draw(1)[0].template
@@ -0,0 +1,46 @@
+import pytest
+np = pytest.importorskip("numpy")
+from alias_table import AliasTable
+from card_library import RULESETS, DEFAULT_RULESET
+from combat_kernel import CardArrays, CombatBatch, FIGHT, SPARE, FLEE, resolve, sample_alias, sweep, validate
+
+
+@pytest.mark.unit
+def test_kernel_matches_gamestate():
+    cards = CardArrays.from_ruleset(RULESETS[DEFAULT_RULESET])
+    assert validate(cards, 300, seed=1) == 0
+
+    tally, _ = sweep(cards, 10000, seed=2, chunk=4096)
+    assert tally.combats == 10000
+    assert sum(row["drawn"] for row in tally.monster_rows()) == pytest.approx(1)
+
+
+@pytest.mark.unit
+def test_resolve_mirrors_the_engine_arithmetic():
+    monsters, items = AliasTable(["rat", "dragon"]), AliasTable(["dagger", "axe"])
+    stat = lambda *values: np.array(values, dtype=np.int16)
+    cards = CardArrays("test", monsters, items, stars=stat(1, 3), health=stat(2, 9), spare=stat(3, 6),
+                       flee_coins=stat(1, 2), spare_coins=stat(2, 3), fight_coins=stat(4, 8), damage=np.array([1, 6, 0], dtype=np.int32))
+    hand = np.full((5, 6), -1, dtype=np.int16)
+    hand[:2, 0] = [0, 0] # two daggers kill the rat
+    hand[:2, 1] = [0, 1] # dagger and axe fall short of the dragon
+    batch = CombatBatch(
+        monster=stat(0, 1, 0, 0, 1, 1),
+        health=stat(3, 3, 3, 1, 2, 2),
+        hand=hand,
+        choice=np.array([FIGHT, FIGHT, SPARE, SPARE, SPARE, FLEE], dtype=np.int8),
+        roll=np.array([1, 1, 3, 2, 5, 1], dtype=np.int8),
+    )
+    outcome = resolve(cards, batch)
+    assert outcome.won.tolist() == [True, False, True, False, False, False]
+    # a failed spare costs a point in spare_monster and another in _deal_damage, but never goes below 0
+    assert outcome.health.tolist() == [3, 2, 3, 0, 0, 2]
+    assert outcome.coins.tolist() == [4, 0, 2, 0, 0, 2]
+    assert outcome.stars.tolist() == [1, 0, 1, 0, 0, 0]
+
+
+@pytest.mark.unit
+def test_alias_sampling_matches_the_table():
+    table = AliasTable(["common", "uncommon", "rare"], [10, 4, 1])
+    drawn = sample_alias(table, np.random.default_rng(3), 300000)
+    assert np.bincount(drawn, minlength=3) / len(drawn) == pytest.approx([table.probability(n) for n in table.types], abs=0.005)
@@ -0,0 +1,56 @@
+import random
+import pytest
+import combat_odds as odds_module
+from card_library import MonsterTemplate
+from combat_odds import combat_odds, combat_odds_json
+from simulator import new_game, random_policy
+
+
+@pytest.fixture
+def orc(monkeypatch):
+    # 2 stars, 5 health, spared on a 4 or more, 1/2/4 coins for fleeing/sparing/fighting
+    templates = dict(odds_module.MONSTER_TEMPLATES, test_orc=MonsterTemplate.from_compiled("test_orc", (2, 5, 4, 1, 2, 4, "common")))
+    monkeypatch.setattr(odds_module, "MONSTER_TEMPLATES", templates)
+    combat_odds.cache_clear()
+    combat_odds_json.cache_clear()
+    yield "test_orc"
+    combat_odds.cache_clear()
+    combat_odds_json.cache_clear()
+
+
+@pytest.mark.unit
+def test_odds_of_each_choice(orc):
+    odds = combat_odds(orc, 5, 3, ("dev_item",), False)
+    assert (odds.fight.success, odds.fight.coins, odds.fight.stars, odds.fight.health) == (1, 4, 2, 0)
+    assert (odds.spare.success, odds.spare.coins, odds.spare.stars) == (0.5, 1, 1)
+    # a failed spare costs a point and the monster's hit after it
+    assert odds.spare.health == pytest.approx(-1)
+    assert (odds.flee.success, odds.flee.coins, odds.flee.health) == (1, 1, 0)
+
+    hurt = combat_odds(orc, 6, 1, (), True)
+    assert (hurt.fight.success, hurt.fight.coins, hurt.fight.health) == (0, 0, -1)
+    assert hurt.spare.health == pytest.approx(-0.5)
+    assert hurt.flee.coins == 0
+
+
+@pytest.mark.unit
+def test_game_odds_are_memoized():
+    game, rng = new_game("g", 3, seed=4), random.Random(4)
+    for _ in range(200):
+        random_policy(game, game.get_active_player(), rng)
+        if game._combat_substate is not None:
+            break
+    combat = game._combat_substate
+    assert combat is not None
+    player = combat.player.name
+
+    assert game.get_combat_odds(player, len(combat.monsters)) is None
+    assert game.get_combat_odds("nobody", 0) is None
+    combat_odds_json.cache_clear()
+    first = game.get_combat_odds(player, 0, encoded=True)
+    assert first["monster"] == 0 and set(first) == {"monster", "fight", "spare", "flee"}
+    assert game.get_combat_odds(player, 0, encoded=True) == first
+    assert combat_odds_json.cache_info().hits == 1
+
+    odds = game.get_combat_odds(player, 0)
+    assert odds.monster == 0 and odds.model_dump(mode='json') == first
@@ -0,0 +1,63 @@
+import pytest
+from pydantic import ValidationError
+from api_wrapper import CompoundRequest, CompoundStep, PlayerActionChoice, PlayerCombatChoice, TurnPhase
+from card_library import ITEM_TEMPLATES
+from gamestate import Item
+from replay import state_digest
+from simulator import new_game
+
+
+def fight(monster: int, items: list[int]) -> list[CompoundStep]:
+    return [
+        CompoundStep(combat=PlayerCombatChoice.SELECT, target=monster),
+        CompoundStep(combat=PlayerCombatChoice.FIGHT, target=monster),
+        CompoundStep(items=items),
+        CompoundStep(combat=PlayerCombatChoice.FIGHT, target=monster),
+    ]
+
+def in_combat(seed: int):
+    game = new_game("g", 3, seed=seed)
+    game.players["p0"].items = [Item(ITEM_TEMPLATES["dev_item"]) for _ in range(3)]
+    game.player_action("p0", PlayerActionChoice.COMBAT)
+    assert game.turn_phase == TurnPhase.COMBAT_SELECT
+    return game
+
+
+@pytest.mark.unit
+def test_compound_fight_plays_like_its_steps():
+    for seed in range(5):
+        game = in_combat(seed)
+        one_by_one = game.clone()
+        one_by_one.player_select_monster("p0", 1, PlayerCombatChoice.SELECT)
+        one_by_one.player_select_monster("p0", 1, PlayerCombatChoice.FIGHT)
+        one_by_one.player_select_item("p0", 0)
+        one_by_one.player_select_item("p0", 2)
+        one_by_one.player_select_monster("p0", 1, PlayerCombatChoice.FIGHT)
+
+        log = len(game.action_log)
+        assert game.play_steps("p0", fight(1, [2, 0])) == 4
+        assert state_digest(game) == state_digest(one_by_one)
+        assert game.action_log[log:] == one_by_one.action_log
+        assert len(game.players["p0"].items) == 1
+
+
+@pytest.mark.unit
+def test_compound_stops_at_the_first_illegal_step():
+    game = in_combat(1)
+    version, log = game.get_state_version(), len(game.action_log)
+    assert game.play_steps("p1", fight(0, [0])) == 0 # out of turn
+    assert game.play_steps("p0", [CompoundStep(items=[0])] + fight(0, [0])) == 0 # no fight started yet
+    assert game.get_state_version() == version and len(game.action_log) == log
+
+    # hand position 5 does not exist, so the fight is started but not fought
+    assert game.play_steps("p0", fight(0, [0, 5])) == 2
+    assert game.turn_phase == TurnPhase.COMBAT_FIGHT and game._combat_substate.selected_items == [False] * 3
+    assert len(game.action_log) == log + 2
+    assert game.play_steps("p0", fight(0, [0])[2:]) == 2
+
+    with pytest.raises(ValidationError):
+        CompoundStep(action=PlayerActionChoice.END, combat=PlayerCombatChoice.FIGHT, target=0)
+    with pytest.raises(ValidationError):
+        CompoundStep(combat=PlayerCombatChoice.FIGHT)
+    with pytest.raises(ValidationError):
+        CompoundRequest(steps=[])
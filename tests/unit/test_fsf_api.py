@@ -0,0 +1,128 @@
+import asyncio
+import pytest
+from api_wrapper import *
+
+
+class RecordingServer:
+    def __init__(self):
+        self.sent = []
+
+    def on(self, event, handler):
+        pass
+
+    async def emit(self, event, data=None, to=None, skip_sid=None):
+        self.sent.append((event, to, data))
+
+
+bob = PlayerInfo(name="bob", ready=True, coins=0, captured_stars=[], num_items=0, health=4)
+god = PlayerInfo(name="god", ready=True, coins=0, captured_stars=[], num_items=0, health=4)
+
+
+async def settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.unit
+def test_state_updates_coalesce_per_recipient():
+    async def run():
+        server = RecordingServer()
+        api = FsfApi(server)
+        api.emit_players_event("game", [bob])
+        api.emit_turn_event("game", active="bob", phase=TurnPhase.CHOOSING_ACTION)
+        api.emit_players_event("game", [bob.model_copy(update={"coins": 2})])
+        api.emit_hand_event("sid_bob", [], [])
+        await settle()
+        return server.sent
+
+    sent = asyncio.run(run())
+    assert [(event, to) for event, to, _ in sent] == [("STATE_PATCH", "game"), ("STATE_PATCH", "sid_bob")]
+    room_patch, hand_patch = sent[0][2], sent[1][2]
+    assert room_patch["players"] == {"seq": 1, "full": [bob.model_dump(mode='json') | {"coins": 2}]}
+    assert room_patch["turn"] == {"active": "bob", "phase": "CHOOSING_ACTION"}
+    assert "hand" not in room_patch
+    assert hand_patch["hand"] == {"items": [], "selected_items": []}
+    assert room_patch["version"] < hand_patch["version"]
+
+
+@pytest.mark.unit
+def test_state_version_increases_across_ticks():
+    async def run():
+        server = RecordingServer()
+        api = FsfApi(server)
+        api.emit_turn_event("game", active="bob", phase=TurnPhase.CHOOSING_ACTION)
+        await settle()
+        api.emit_turn_event("game", active="god", phase=TurnPhase.CHOOSING_ACTION)
+        await settle()
+        return server.sent
+
+    first, second = asyncio.run(run())
+    assert first[2]["version"] < second[2]["version"]
+    assert second[2]["turn"]["active"] == "god"
+
+
+@pytest.mark.unit
+def test_players_and_board_are_delta_encoded():
+    async def run():
+        server = RecordingServer()
+        api = FsfApi(server)
+        hidden = MonsterInfo(id=7, stars=1)
+        api.emit_players_event("game", [bob, god])
+        api.emit_board_event("game", deck_size=40, shop_size=40, monsters=[hidden])
+        await settle()
+        api.emit_players_event("game", [bob.model_copy(update={"coins": 2}), god])
+        api.emit_board_event("game", deck_size=40, shop_size=39, monsters=[hidden.model_copy(update={"health": 3})], selected_monster=0)
+        await settle()
+        api.emit_players_event("game", [god])
+        api.emit_board_event("game", deck_size=40, shop_size=39, monsters=[hidden.model_copy(update={"health": 3})], selected_monster=0)
+        await settle()
+        api.emit_resync("sid_bob", source="game", sections=["players"])
+        await settle()
+        return server.sent
+
+    first, second, third, resync = [data for _, _, data in asyncio.run(run())]
+    assert first["players"]["seq"] == 1 and "full" in first["players"]
+    assert second["players"] == {"seq": 2, "base": 1, "delta": {"changed": {"bob": {"coins": 2}}}}
+    assert second["board"] == {"seq": 2, "base": 1, "delta": {
+        "fields": {"shop_size": 39, "selected_monster": 0},
+        "monsters": {"changed": {7: {"health": 3}}},
+    }}
+    assert third["players"] == {"seq": 3, "base": 2, "delta": {"removed": ["bob"], "order": ["god"]}}
+    assert "board" not in third # unchanged sections are dropped
+    assert resync["players"] == {"seq": 3, "full": [god.model_dump(mode='json')]}
+
+
+@pytest.mark.unit
+def test_full_sections_without_delta():
+    async def run():
+        server = RecordingServer()
+        api = FsfApi(server, delta=False)
+        api.emit_players_event("game", [bob])
+        await settle()
+        api.emit_players_event("game", [bob])
+        await settle()
+        return server.sent
+
+    first, second = [data for _, _, data in asyncio.run(run())]
+    assert second["players"] == {"seq": 2, "full": first["players"]["full"]}
+
+
+@pytest.mark.unit
+def test_forget_drops_a_rooms_sections():
+    async def run():
+        server = RecordingServer()
+        api = FsfApi(server)
+        api.emit_players_event("game", [bob])
+        api.emit_players_event("other", [god])
+        await settle()
+        api.forget("game")
+        assert api._sent_sections.keys() == {"other"}
+
+        api.emit_players_event("game", [bob])
+        api.forget("game") # queued but not flushed yet
+        await settle()
+        assert api._sent_sections.keys() == {"other"}
+        return server.sent
+
+    sent = asyncio.run(run())
+    assert [to for _, to, _ in sent] == ["game", "other"]
@@ -66,3 +66,52 @@ def test_game():
 
     
 
+@pytest.mark.unit
+def test_state_versions():
+    game = GameState("123", "test", "god", 4)
+    game.add_player("bob", "aaa")
+    game.add_player("god", "bbb")
+    game.start()
+
+    players, turn, board = game.get_players_version(), game.get_turn_version(), game.get_board_version()
+    bob_hand, god_hand = game.get_hand_version("bob"), game.get_hand_version("god")
+
+    game.player_action("bob", PlayerActionChoice.COINS)
+    assert game.get_players_version() != players
+    assert game.get_turn_version() != turn
+    assert game.get_board_version() == board
+    assert game.get_hand_version("bob") == bob_hand
+
+    players, board = game.get_players_version(), game.get_board_version()
+    game.player_action("god", PlayerActionChoice.COINS)
+    game.player_action("bob", PlayerActionChoice.SHOP)
+    assert game.get_board_version() != board
+    assert game.get_hand_version("bob") != bob_hand
+    assert game.get_hand_version("god") == god_hand
+
+    board, turn = game.get_board_version(), game.get_turn_version()
+    game.player_action("bob", PlayerActionChoice.COINS) # out of turn, nothing changes
+    assert game.get_board_version() == board
+    assert game.get_turn_version() == turn
+
+@pytest.mark.unit
+def test_encoded_status_cache():
+    game = GameState("123", "test", "god", 4)
+    game.add_player("bob", "aaa")
+    game.add_player("god", "bbb")
+    game.start()
+    bob = game.players["bob"]
+
+    encoded = bob.get_status_public_json()
+    assert encoded == bob.get_status_public().model_dump(mode='json')
+    assert bob.get_status_public_json() is encoded # unchanged players are not encoded again
+
+    game.player_action("bob", PlayerActionChoice.COINS)
+    assert bob.get_status_public_json() is not encoded
+    assert bob.get_status_public_json()["coins"] == 2
+
+    game.player_action("god", PlayerActionChoice.COMBAT)
+    game.player_select_monster("god", 0, PlayerCombatChoice.SELECT)
+    board = game.get_status_board(encoded=True)
+    assert board["monsters"] == [mon.model_dump(mode='json') for mon in game.get_status_board()["monsters"]]
+    assert board["monsters"][0]["name"] is not None # revealed by the selection
@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from gamestate import GameState
+from game_actor import GameActor
+from api_wrapper import *
+
+
+@pytest.mark.unit
+def test_actor_applies_requests_in_order():
+    async def run():
+        game = GameState("123", "test", "god", 4)
+        actor = GameActor(game, mailbox_size=2)
+        actor.start()
+        results = await asyncio.gather(
+            actor.submit(lambda g: g.add_player("bob", "aaa")),
+            actor.submit(lambda g: g.add_player("god", "bbb")),
+            actor.submit(lambda g: g.start()),
+            actor.submit(lambda g: g.get_active_player()),
+        )
+        await actor.stop()
+        return results
+
+    assert asyncio.run(run())[-1] == "bob"
+
+
+@pytest.mark.unit
+def test_actor_propagates_errors():
+    async def run():
+        actor = GameActor(GameState("123", "test", "god", 4))
+        actor.start()
+        with pytest.raises(KeyError):
+            await actor.submit(lambda g: g.players["nobody"])
+        assert await actor.submit(lambda g: g.status) == GameStatus.LOBBY
+        await actor.stop()
+
+    asyncio.run(run())
+
+
+@pytest.mark.unit
+def test_actor_mailbox_backpressure():
+    async def run():
+        actor = GameActor(GameState("123", "test", "god", 4), mailbox_size=1)
+        first = asyncio.create_task(actor.submit(lambda g: 1))
+        second = asyncio.create_task(actor.submit(lambda g: 2))
+        await asyncio.sleep(0)
+        assert actor.backlog() == 1 # second submit is waiting for room in the mailbox
+        actor.start()
+        assert await first == 1 and await second == 2
+        await actor.stop()
+
+    asyncio.run(run())
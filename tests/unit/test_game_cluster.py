@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from game_cluster import HashRing, ShardRouter
+
+
+@pytest.mark.unit
+def test_hash_ring_spreads_and_is_stable():
+    ring = HashRing(["shard0", "shard1", "shard2"])
+    games = [f'game{i}' for i in range(3000)]
+    owners = {game: ring.node_for(game) for game in games}
+
+    assert owners == {game: HashRing(["shard2", "shard0", "shard1"]).node_for(game) for game in games}
+    for shard in ring.nodes():
+        assert 600 < list(owners.values()).count(shard) < 1400
+
+
+@pytest.mark.unit
+def test_hash_ring_moves_only_keys_of_changed_node():
+    ring = HashRing(["shard0", "shard1", "shard2"])
+    games = [f'game{i}' for i in range(3000)]
+    before = {game: ring.node_for(game) for game in games}
+
+    ring.add("shard3")
+    moved = [game for game in games if ring.node_for(game) != before[game]]
+    assert all(ring.node_for(game) == "shard3" for game in moved)
+    assert len(moved) < 1200
+
+    ring.remove("shard3")
+    assert {game: ring.node_for(game) for game in games} == before
+
+    with pytest.raises(LookupError):
+        HashRing().node_for("game0")
+
+
+@pytest.mark.unit
+def test_router_binds_connections_on_join():
+    class Inbox:
+        def __init__(self, shard):
+            self.shard = shard
+        def put(self, message):
+            sent.append((self.shard, message))
+
+    router = ShardRouter(4)
+    sent = []
+    router._inboxes = {shard: Inbox(shard) for shard in router.shards}
+
+    router.forward_event("CHAT", "s1", {"text": "hi"})
+    router.forward_event("JOIN", "s1", {"game_id": "g1", "player_name": "bob"})
+    router.forward_event("CHAT", "s1", {"text": "hi"})
+    router.forward_disconnect("s1")
+    router.forward_event("CHAT", "s1", {"text": "hi"})
+
+    owner = router.shard_for("g1")
+    assert [message[1] for _, message in sent] == ["JOIN", "CHAT", "disconnect"]
+    assert all(shard == owner for shard, _ in sent)
+
+
+@pytest.mark.unit
+def test_router_sends_requests_to_the_owner_and_sums_loads():
+    async def run():
+        router = ShardRouter(3)
+        sent = []
+
+        class Inbox:
+            def __init__(self, shard):
+                self.shard = shard
+            def put(self, message):
+                _, request_id, name, args = message
+                sent.append((self.shard, name, args))
+                body = {"games": 2, "connections": 5} if name == "load" else {"response": "Success"}
+                asyncio.get_running_loop().call_soon(asyncio.ensure_future, router._perform(("reply", request_id, 200, body)))
+
+        router._inboxes = {shard: Inbox(shard) for shard in router.shards}
+        deleted = await router.request("g1", "delete")
+        odds = await router.request("g1", "odds", "bob", None)
+        load = await router.load()
+        return router, sent, deleted, odds, load
+
+    router, sent, deleted, odds, load = asyncio.run(run())
+    owner = router.shard_for("g1")
+    assert sent[:2] == [(owner, "delete", ["g1"]), (owner, "odds", ["g1", "bob", None])]
+    assert deleted == odds == (200, {"response": "Success"})
+    assert sorted(shard for shard, name, _ in sent[2:]) == router.shards
+    assert load["games"] == 6 and load["connections"] == 15 and load["loop_lag"] >= 0
+    assert router._replies == {}
@@ -0,0 +1,59 @@
+import json
+import pytest
+from game_meta import GameMetadata
+from game_list import GameListCache
+from api_wrapper import GameStatus
+
+
+def make_games(cache, count):
+    games = []
+    for i in range(count):
+        game = GameMetadata(name=f'game{i}', owner="bob", max_players=4)
+        game.num_players = i % 5
+        if i % 3 == 0:
+            game.status = GameStatus.GAME
+        cache.put(game)
+        games.append(game)
+    return games
+
+
+@pytest.mark.unit
+def test_game_list_filters_and_pages():
+    cache = GameListCache()
+    games = make_games(cache, 20)
+
+    body, next_cursor = cache.query()
+    assert [g["id"] for g in json.loads(body)] == [g.id for g in games]
+    assert next_cursor is None
+
+    body, _ = cache.query(status=GameStatus.LOBBY, open_seats=2)
+    expected = [g.id for g in games if g.status == GameStatus.LOBBY and g.max_players - g.num_players >= 2]
+    assert [g["id"] for g in json.loads(body)] == expected
+
+    paged, cursor = [], None
+    while True:
+        body, cursor = cache.query(status=GameStatus.LOBBY, cursor=cursor, limit=3)
+        paged += [g["id"] for g in json.loads(body)]
+        if cursor is None:
+            break
+    assert paged == [g.id for g in games if g.status == GameStatus.LOBBY]
+
+
+@pytest.mark.unit
+def test_game_list_versions_and_memoizes():
+    cache = GameListCache()
+    games = make_games(cache, 5)
+    etag = cache.etag()
+
+    first, _ = cache.query()
+    assert cache.query()[0] is first
+    assert cache.etag() == etag
+
+    games[1].num_players = 4
+    cache.put(games[1])
+    cache.remove(games[0].id)
+    assert cache.etag() != etag
+    listed = json.loads(cache.query()[0])
+    assert [g["id"] for g in listed] == [g.id for g in games[1:]]
+    assert listed[0]["num_players"] == 4
+    assert json.loads(cache.query(open_seats=1)[0])[0]["id"] == games[2].id
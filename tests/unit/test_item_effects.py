@@ -0,0 +1,71 @@
+import pytest
+from card_library import ItemTemplate, MONSTER_TEMPLATES, compile_library
+from gamestate import Item, Monster, Player
+
+LIBRARY = """
+items:
+  dagger: {text: x, effect: {id: DIRECT_DAMAGE, params: {amount: 2}}}
+  flurry:
+    text: x
+    effect: {all: [{id: DIRECT_DAMAGE, params: {amount: 1}}, {id: DIRECT_DAMAGE, params: {amount: 2}}]}
+  finisher:
+    text: x
+    effect:
+      if: {health_at_most: 3}
+      then: {id: DIRECT_DAMAGE, params: {amount: 9}}
+      else: {id: DIRECT_DAMAGE, params: {amount: 1}}
+  trinket: {text: x}
+"""
+
+
+@pytest.fixture
+def templates() -> dict[str, ItemTemplate]:
+    return {name: ItemTemplate.from_compiled(name, data) for name, data in compile_library(LIBRARY)["items"].items()}
+
+
+def monster(health: int) -> Monster:
+    mon = Monster(next(iter(MONSTER_TEMPLATES.values())))
+    mon.health = health
+    return mon
+
+
+@pytest.mark.unit
+def test_effects_compile_to_programs(templates):
+    # fixed damage stays a number, lists of it add up
+    assert (templates["dagger"].effect.damage, templates["dagger"].effect.apply) == (2, None)
+    assert (templates["flurry"].effect.damage, templates["flurry"].effect.apply) == (3, None)
+    assert templates["finisher"].effect.apply is not None
+    assert templates["trinket"].effect is None
+
+    for health, left in ((3, -6), (5, 4)):
+        target = monster(health)
+        templates["finisher"].effect(target)
+        assert target.health == left
+
+    with pytest.raises(ValueError, match="bad condition"):
+        compile_library("items: {bad: {text: x, effect: {if: {health_is: 1}, then: {id: DIRECT_DAMAGE, params: {amount: 1}}}}}")
+    with pytest.raises(ValueError, match="list of effects"):
+        compile_library("items: {bad: {text: x, effect: {all: []}}}")
+    with pytest.raises(ValueError, match="unknown effect"):
+        compile_library("items: {bad: {text: x, effect: {all: [{id: NOPE}]}}}")
+
+
+@pytest.mark.unit
+def test_batches_resolve_like_items_one_by_one(templates):
+    # the finisher sees the health the daggers before it left
+    for batch in (["dagger", "finisher"], ["finisher", "dagger"], ["flurry", "dagger", "finisher", "dagger"]):
+        player, one_by_one = Player("bob", "aaa"), monster(5)
+        player.items = [Item(templates[name]) for name in batch]
+        for item in player.items:
+            item.activate(one_by_one)
+
+        together, version = monster(5), player.hand_version
+        player.use_items(list(range(len(batch))), target=together)
+        assert together.health == one_by_one.health
+        assert player.items == [] and player.hand_version != version
+
+    player, target = Player("bob", "aaa"), monster(5)
+    player.items = [Item(templates["dagger"]), Item(templates["trinket"])]
+    with pytest.raises(TypeError):
+        player.use_items([0, 1], target=target)
+    assert target.health == 5 and len(player.items) == 2
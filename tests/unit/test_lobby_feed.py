@@ -0,0 +1,57 @@
+import json
+import asyncio
+import pytest
+from lobby_feed import LobbyFeed
+
+
+def parse(frame):
+    event, data = frame.strip().split("\n")
+    return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+@pytest.mark.unit
+def test_feed_sends_snapshot_then_diffs():
+    async def run():
+        games = {"a": {"id": "a", "num_players": 0}}
+        feed = LobbyFeed(lambda: list(games.values()))
+        stream = feed.stream()
+
+        first = await anext(stream)
+        games["b"] = {"id": "b", "num_players": 1}
+        feed.publish("create", games["b"])
+        feed.publish("delete", {"id": "a"})
+        frames = [first, await anext(stream), await anext(stream)]
+
+        assert feed.subscriber_count() == 1
+        await stream.aclose()
+        assert feed.subscriber_count() == 0
+        return frames
+
+    assert [parse(frame) for frame in asyncio.run(run())] == [
+        ("snapshot", [{"id": "a", "num_players": 0}]),
+        ("create", {"id": "b", "num_players": 1}),
+        ("delete", {"id": "a"}),
+    ]
+
+
+@pytest.mark.unit
+def test_feed_caches_snapshot_and_drops_slow_subscribers():
+    async def run():
+        builds = []
+        feed = LobbyFeed(lambda: builds.append(1) or [])
+        feed.QUEUE_SIZE = 2
+        streams = [feed.stream() for _ in range(3)]
+        for stream in streams:
+            await anext(stream)
+        assert len(builds) == 1
+
+        for i in range(3):
+            feed.publish("update", {"id": str(i)})
+        assert feed.subscriber_count() == 0
+        with pytest.raises(StopAsyncIteration):
+            await anext(streams[0])
+
+        await anext(feed.stream())
+        assert len(builds) == 2
+
+    asyncio.run(run())
@@ -0,0 +1,130 @@
+import asyncio
+import pytest
+from game_meta import GameMetadata
+from matchmaking import SeatIndex, MatchQueue
+from api_wrapper import GameStatus
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+
+def lobby(num_players, max_players=4):
+    game = GameMetadata(name="test", owner="bob", max_players=max_players)
+    game.num_players = num_players
+    return game
+
+
+@pytest.mark.unit
+def test_seat_index_fills_fullest_lobby_first():
+    clock = Clock()
+    seats = SeatIndex(clock=clock)
+    empty, almost_full, full = lobby(0), lobby(3), lobby(4)
+    for game in (empty, almost_full, full):
+        seats.update(game)
+    assert len(seats) == 2
+
+    assert seats.claim() == almost_full.id
+    assert seats.claim() == empty.id
+    assert seats.free_seats(empty.id) == 3
+
+    # the join report uses up the reservation instead of freeing another seat
+    empty.num_players = 1
+    seats.update(empty)
+    assert seats.free_seats(empty.id) == 3
+
+    # reservations of players that never joined expire
+    clock.now += SeatIndex.RESERVATION_TTL + 1
+    seats.update(almost_full)
+    assert seats.free_seats(almost_full.id) == 1
+
+    almost_full.status = GameStatus.GAME
+    seats.update(almost_full)
+    assert seats.free_seats(almost_full.id) == 0
+    assert len(seats) == 1
+
+
+@pytest.mark.unit
+def test_claim_gives_back_expired_reservations():
+    clock = Clock()
+    seats = SeatIndex(clock=clock)
+    game = lobby(2)
+    seats.update(game)
+    assert [seats.claim(), seats.claim(), seats.claim()] == [game.id, game.id, None]
+
+    # the reserved players never joined and the game server reported nothing since
+    clock.now += SeatIndex.RESERVATION_TTL + 1
+    assert seats.claim() == game.id
+    assert seats.free_seats(game.id) == 1
+
+    seats.remove(game.id)
+    clock.now += SeatIndex.RESERVATION_TTL + 1
+    assert seats.claim() is None and len(seats) == 0
+
+
+@pytest.mark.unit
+def test_match_queue_places_batch_then_creates_games():
+    async def run():
+        seats = SeatIndex()
+        games = {}
+        existing = lobby(2)
+        games[existing.id] = existing
+        seats.update(existing)
+
+        created = []
+        async def create_game(owner):
+            game = GameMetadata(name="quick", owner=owner, max_players=4)
+            games[game.id] = game
+            created.append(game)
+            return game
+
+        queue = MatchQueue(seats, create_game, games)
+        placed = await asyncio.gather(*(queue.join(f'p{i}') for i in range(7)))
+        return existing, created, placed
+
+    existing, created, placed = asyncio.run(run())
+    assert [game.id for game in placed[:2]] == [existing.id] * 2
+    assert len(created) == 2 and created[0].owner == "p2"
+    assert [game.id for game in placed[2:]] == [created[0].id] * 4 + [created[1].id]
+
+
+@pytest.mark.unit
+def test_match_queue_fails_waiting_players_when_placing_fails():
+    async def run():
+        calls = []
+        async def create_game(owner):
+            calls.append(owner)
+            if len(calls) == 1:
+                raise ConnectionError("lobby unreachable")
+            return GameMetadata(name="quick", owner=owner, max_players=4) # never registered in games
+
+        queue = MatchQueue(SeatIndex(), create_game, {})
+        first = await asyncio.wait_for(asyncio.gather(queue.join("p0"), queue.join("p1"), return_exceptions=True), 1)
+        second = await asyncio.wait_for(asyncio.gather(queue.join("p2"), return_exceptions=True), 1)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert [type(error) for error in first] == [ConnectionError] * 2
+    assert [type(error) for error in second] == [KeyError]
+
+
+@pytest.mark.unit
+def test_match_queue_places_a_full_batch_without_waiting():
+    async def run():
+        seats, games = SeatIndex(), {}
+        async def create_game(owner):
+            game = GameMetadata(name="quick", owner=owner, max_players=4)
+            games[game.id] = game
+            return game
+
+        queue = MatchQueue(seats, create_game, games)
+        queue.BATCH_WINDOW, queue.BATCH_SIZE = 60, 3
+        first = asyncio.ensure_future(queue.join("p0"))
+        await asyncio.sleep(0) # the flush is now waiting out the window
+        return await asyncio.wait_for(asyncio.gather(first, queue.join("p1"), queue.join("p2")), 1)
+
+    placed = asyncio.run(run())
+    assert len({game.id for game in placed}) == 1
@@ -0,0 +1,41 @@
+import random
+import pytest
+from gamestate import GameState, LOG_JOIN, LOG_START, LOG_ACTION
+from api_wrapper import PlayerActionChoice
+from replay import replay, state_digest
+from simulator import new_game, POLICIES
+from app_logging import NullLogger
+
+
+def play(game: GameState, steps: int, seed: int):
+    rng = random.Random(seed)
+    policies = [POLICIES["greedy"], POLICIES["random"]]
+    for _ in range(steps):
+        player = game.get_active_player()
+        policies[game._turn_order.index(player) % 2](game, player, rng)
+
+
+@pytest.mark.unit
+def test_replay_rebuilds_game_from_seed_and_log():
+    for seed in range(20):
+        game = new_game(f'g{seed}', 3, seed=seed)
+        play(game, 60, seed)
+
+        rebuilt = replay(game.get_replay_header(), game.action_log)
+        assert state_digest(rebuilt) == state_digest(game)
+        assert rebuilt.action_log == game.action_log
+
+
+@pytest.mark.unit
+def test_action_log_keeps_only_accepted_actions():
+    game = GameState("123", "test", "bob", 4, logger=NullLogger(), seed=5)
+    game.add_player("bob", "aaa")
+    game.add_player("god", "bbb")
+    game.start()
+    game.player_action("god", PlayerActionChoice.COINS) # out of turn, rejected
+    game.player_action(player="bob", action=PlayerActionChoice.COINS)
+
+    assert [entry[0] for entry in game.action_log] == [LOG_JOIN, LOG_JOIN, LOG_START, LOG_ACTION]
+    assert game.action_log[-1] == (LOG_ACTION, "bob", "COINS")
+
+    assert game.seed == 5 and game.get_replay_header()["seed"] == 5
@@ -0,0 +1,44 @@
+import pytest
+from server_registry import ServerRegistry
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.unit
+def test_registry_picks_least_loaded():
+    registry = ServerRegistry(clock=Clock())
+    assert registry.pick() is None
+
+    registry.heartbeat("a", "http://a:5001", games=3, connections=10, loop_lag=0.0)
+    registry.heartbeat("b", "http://b:5001", games=1, connections=4, loop_lag=0.0)
+    assert registry.pick().id == "b"
+
+    # placements count until the next heartbeat
+    for _ in range(5):
+        registry.placed(registry.servers["b"])
+    assert registry.pick().id == "a"
+    registry.heartbeat("b", "http://b:5001", games=1, connections=4, loop_lag=0.0)
+    assert registry.pick().id == "b"
+
+
+@pytest.mark.unit
+def test_registry_skips_unhealthy_servers():
+    clock = Clock()
+    registry = ServerRegistry(clock=clock)
+    registry.heartbeat("a", "http://a:5001", games=9, connections=30, loop_lag=0.0)
+    registry.heartbeat("b", "http://b:5001", games=0, connections=0, loop_lag=1.0)
+    assert registry.pick().id == "a"
+
+    clock.now += ServerRegistry.HEARTBEAT_TIMEOUT + 1
+    assert registry.pick() is None
+
+    registry.heartbeat("b", "http://b:5001", games=0, connections=0, loop_lag=0.0)
+    registry.failed(registry.servers["b"])
+    assert registry.pick() is None
+    registry.heartbeat("b", "http://b:5001", games=0, connections=0, loop_lag=0.0, public_address="ws://b")
+    assert registry.pick().public_address == "ws://b"
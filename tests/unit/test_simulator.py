@@ -0,0 +1,29 @@
+import pytest
+from app_logging import NullLogger
+from simulator import simulate, simulate_game, new_game
+
+
+@pytest.mark.unit
+def test_simulated_games_are_reproducible():
+    first = simulate_game(7, ["greedy", "random", "random"], rounds=3)
+    assert first == simulate_game(7, ["greedy", "random", "random"], rounds=3)
+    assert first["turns"] == 9 and not first["stuck"] and first["error"] is None
+    assert first["winners"] and all(first["stars"][w] == max(first["stars"]) for w in first["winners"])
+
+
+@pytest.mark.unit
+def test_simulate_reports_outcomes():
+    report = simulate(6, ["greedy", "random"], rounds=3, workers=1, seed=3)
+    assert report["games"] == 6
+    assert report["turns_mean"] == 6
+    assert report["draws"] + sum(report["wins"].values()) == 6
+    assert list(report["wins"]) == ["p0 (greedy)", "p1 (random)"]
+
+    with pytest.raises(ValueError):
+        simulate(1, ["nope"], workers=1)
+
+
+@pytest.mark.unit
+def test_headless_games_do_not_log():
+    game = new_game("quiet", 2)
+    assert isinstance(game._logger, NullLogger)
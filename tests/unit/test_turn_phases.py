@@ -0,0 +1,58 @@
+import random
+import pytest
+from api_wrapper import LegalActions, PlayerActionChoice, PlayerCombatChoice, TurnPhase
+from gamestate import ITEM_REQUEST, PLAYER_REQUEST, TURN_PHASES
+from simulator import new_game, random_policy
+
+
+def requests(legal: LegalActions) -> set[tuple]:
+    '''every (request, target) pair legal allows'''
+    pairs = {(action, None) for action in legal.actions}
+    pairs |= {(choice, monster) for choice in legal.combat for monster in legal.monsters}
+    pairs |= {(ITEM_REQUEST, item) for item in legal.items}
+    pairs |= {(PLAYER_REQUEST, player) for player in legal.players}
+    return pairs
+
+
+@pytest.mark.unit
+def test_every_phase_is_declared():
+    assert TURN_PHASES.keys() == set(TurnPhase)
+
+
+@pytest.mark.unit
+def test_legal_actions_match_the_transition_table():
+    game, rng = new_game("g", 3, seed=5), random.Random(5)
+    everything = [(action, None) for action in PlayerActionChoice] + [(ITEM_REQUEST, i) for i in range(-1, 6)]
+    everything += [(choice, monster) for choice in PlayerCombatChoice for monster in range(-1, 4)]
+    phases = set()
+    for _ in range(300):
+        active = game.get_active_player()
+        phases.add(game.turn_phase)
+        legal = game.legal_actions(active)
+        assert game.legal_actions(active, encoded=True) == legal.model_dump(mode='json')
+        assert requests(legal) == {pair for pair in everything if game.is_legal(active, *pair)}
+        idle = next(name for name in game.players if name != active)
+        assert game.legal_actions(idle) == LegalActions()
+        assert not any(game.is_legal(idle, *pair) for pair in everything)
+        random_policy(game, active, rng)
+    assert {TurnPhase.CHOOSING_ACTION, TurnPhase.COMBAT_SELECT, TurnPhase.COMBAT_ACTION, TurnPhase.COMBAT_FIGHT} <= phases
+
+
+@pytest.mark.unit
+def test_illegal_requests_change_nothing():
+    game = new_game("g", 2, seed=1)
+    game.player_action("p0", PlayerActionChoice.COMBAT)
+    assert game.turn_phase == TurnPhase.COMBAT_SELECT
+    version, log = game.get_state_version(), len(game.action_log)
+
+    game.player_action("p0", PlayerActionChoice.END) # no walking away from combat
+    game.player_select_monster("p0", 1, PlayerCombatChoice.FIGHT) # nothing selected yet
+    game.player_select_monster("p0", 7, PlayerCombatChoice.SELECT)
+    game.player_select_item("p0", 0)
+    game.player_select_player("p0", "p1")
+    assert game.get_state_version() == version and len(game.action_log) == log
+
+    turn = game.get_turn_version()
+    game.player_select_monster("p0", 1, PlayerCombatChoice.SELECT)
+    assert game.turn_phase == TurnPhase.COMBAT_ACTION and game.get_turn_version() != turn
+    assert game.legal_actions("p0").monsters == [1]